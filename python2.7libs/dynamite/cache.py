@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# ===== cache.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module implements the geometry cache, which keeps results of expensive geometric computations
+(e.g. smoothed normals) keyed by content hashes of their inputs. Entries are dictionaries of NumPy arrays.
+They are kept in memory up to a size limit and, if the DYNAMITE_CACHE_DIR environment variable is set,
+also stored on disk as .npz files, so that they survive between Houdini sessions.
+"""
+import collections
+import os
+import threading
+import numpy as np
+
+CACHE_DIR_VARIABLE = 'DYNAMITE_CACHE_DIR'
+CACHE_SIZE_VARIABLE = 'DYNAMITE_CACHE_SIZE'
+DEFAULT_CACHE_SIZE = 1024  # In megabytes.
+
+
+class GeometryCache(object):
+    """Least recently used cache of NumPy array dictionaries with an optional on-disk layer. Thread-safe.
+    Arguments:
+        directory - directory of .npz files or None to keep entries in memory only.
+        max_bytes - size limit of entries kept in memory."""
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_SIZE << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the entry stored under a given key, or None.
+        :type key: str
+        :rtype: dict"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            self._store(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        """Stores an entry under a given key.
+        :type key: str
+        :type entry: dict"""
+        entry = dict((name, np.asarray(array)) for name, array in entry.items())
+        self._store(key, entry)
+        self._save(key, entry)
+
+    def clear(self):
+        """Removes all entries kept in memory. Files on disk are left intact."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _store(self, key, entry):
+        size = sum(array.nbytes for array in entry.values())
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= sum(array.nbytes for array in previous.values())
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= sum(array.nbytes for array in evicted.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s.npz' % key)
+
+    def _load(self, key):
+        if self.directory is None or not os.path.isfile(self._path(key)):
+            return None
+        try:
+            with np.load(self._path(key)) as archive:
+                return dict((name, archive[name]) for name in archive.files)
+        except (IOError, ValueError):
+            return None
+
+    def _save(self, key, entry):
+        if self.directory is None:
+            return
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            # Write to a temporary file first, so that an interrupted write never leaves a truncated entry.
+            temp_path = '%s.%d.tmp' % (self._path(key), threading.current_thread().ident)
+            with open(temp_path, 'wb') as temp_file:
+                np.savez(temp_file, **entry)
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+            os.rename(temp_path, self._path(key))
+        except (IOError, OSError):
+            pass
+
+
+_shared_cache = None
+
+
+def shared_cache():
+    """Returns the geometry cache shared by all Dynamite networks of the session.
+    :rtype: GeometryCache"""
+    global _shared_cache
+    if _shared_cache is None:
+        size = int(os.environ.get(CACHE_SIZE_VARIABLE, DEFAULT_CACHE_SIZE))
+        _shared_cache = GeometryCache(os.environ.get(CACHE_DIR_VARIABLE) or None, size << 20)
+    return _shared_cache
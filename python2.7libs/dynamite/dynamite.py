@@ -20,11 +20,26 @@
 for texture baking by exploding the geometry and creating bake cages.
 """
 import hou
-import topo_match
+import cache
+import folds
+import geo_io
+import mesh
+import preview
+import numpy as np
+import snapshot
+import triangulate
+import writers
+import base64
+import fnmatch
+import hashlib
+import json
 import os
+import re
 import sys
 import time
 import toolutils
+import zlib
+from multiprocessing.pool import ThreadPool
 
 __version__ = '1.0.0'
 
@@ -36,9 +51,30 @@ class Dynamite(object):
     RETOPO_OUTPUT_OBJ_NAME = 'retopo_output'
     REFERENCE_OUTPUT_OBJ_NAME = 'reference_output'
     CAGE_OUTPUT_OBJ_NAME = 'cage_output'
+    REFERENCE_DISPLAY_OBJ_NAME = 'reference_display'
+    CAGE_DISPLAY_OBJ_NAME = 'cage_display'
     RETOPO_GROUP = 'retopo'
     REFERENCE_GROUP = 'reference'
     CAGE_GROUP = 'cage'
+    MANIFEST_USER_DATA = 'dynamite_manifest'
+    OFFSETS_USER_DATA = 'dynamite_offsets'
+    EDITING_USER_DATA = 'dynamite_editing'
+    FOLDS_GROUP = 'dynamite_folds'
+    # Attributes of Crease SOPs, which change how the cage is subdivided.
+    SUBDIVISION_ATTRIBS = ('creaseweight', 'cornerweight')
+    BUDGET_SNIPPET = """string proxies[] = split(chs("proxies"));
+string path[] = split(s@path, "/");
+if (len(path) && find(proxies, path[-1]) >= 0) setprimintrinsic(0, "viewportlod", @primnum, "box");"""
+    SHARD_PREFIX = 'shard_'
+    DEFAULT_SHARD = 'misc'
+    # Update cost estimates used until the network has timings of its own updates.
+    SECONDS_PER_BUNDLE = 0.1
+    SECONDS_PER_POLYGON = 2e-5
+    # Network editor grid used for deterministic node placement.
+    OBJ_COLUMN_WIDTH = 3.0
+    OBJ_ROW_HEIGHT = 1.0
+    SOP_COLUMN_WIDTH = 2.5
+    SOP_ROW_HEIGHT = 1.0
 
 
 class DynamiteColor(object):
@@ -54,6 +90,67 @@ class DynamiteColor(object):
     RED = hou.Color((0.50, 0, 0))
 
 
+class NetworkTransaction(object):
+    """Context manager shared by operations which build or rewire the Dynamite network.
+    While it is active, the update mode is set to manual, so that no intermediate state of the network is cooked
+    by the viewport, and all changes are collected in a single undo entry. On commit, only nodes registered with
+    cook_on_commit() are cooked, once. If an exception is raised (including SystemExit and interrupted operations),
+    the entry is undone, but only if undos are enabled and the entry recorded any changes, so that an unrelated
+    previous action of the user is never undone. Nested transactions join the outermost one.
+    Parameter script callbacks are not suppressed: a callback which runs inside a transaction (e.g. from
+    hou.Parm.pressButton()) cooks and records its changes as usual."""
+    _depth = 0
+    _pending_cooks = []
+
+    def __init__(self, name):
+        """:type name: str"""
+        self.name = name
+        self._update_mode = None
+        self._undo_group = None
+        self._undo_labels = None
+
+    def __enter__(self):
+        if NetworkTransaction._depth == 0:
+            NetworkTransaction._pending_cooks = []
+            self._update_mode = hou.updateModeSetting()
+            hou.setUpdateMode(hou.updateMode.Manual)
+            self._undo_labels = hou.undos.undoLabels()
+            self._undo_group = hou.undos.group(self.name)
+            self._undo_group.__enter__()
+        NetworkTransaction._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        NetworkTransaction._depth -= 1
+        if NetworkTransaction._depth > 0:
+            return False
+        pending_cooks = NetworkTransaction._pending_cooks
+        NetworkTransaction._pending_cooks = []
+        try:
+            self._undo_group.__exit__(exc_type, exc_value, traceback)
+            # Roll back everything that was done inside the transaction. An empty group leaves no undo entry, so
+            # the undo stack is unchanged unless the transaction recorded something.
+            if exc_type is not None and hou.undos.areEnabled() and hou.undos.undoLabels() != self._undo_labels:
+                hou.undos.performUndo()
+        finally:
+            hou.setUpdateMode(self._update_mode)
+        if exc_type is None:
+            for node in pending_cooks:
+                # Nodes could have been destroyed after they were registered.
+                try:
+                    node.cook()
+                except hou.ObjectWasDeleted:
+                    pass
+        return False
+
+    def cook_on_commit(self, *nodes):
+        """Registers nodes which will be cooked once the outermost transaction is committed.
+        :type nodes: hou.Node"""
+        for node in nodes:
+            if node is not None and node not in NetworkTransaction._pending_cooks:
+                NetworkTransaction._pending_cooks.append(node)
+
+
 def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
                         in_reference='`op:/obj/bake_geo/OUT_HIPOLY`',
                         out_retopo='$HIP/geo/bake/retopo.fbx',
@@ -136,6 +233,28 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
     help = "Smooth reference normals."
     smooth_normals = hou.ToggleParmTemplate('smooth_normals', 'Smooth Normals', True, help=help)
 
+    help = "Organizes bake groups into subnets, so that the top-level network stays small on large assets.%s" \
+        "Flat: all bake groups are created next to the control node.%s" \
+        "Group Name Prefix: groups are sharded by the part of their name preceding the separator.%s" \
+        "Category: groups are sharded by the first matching rule in Shard Categories." % (
+            os.linesep, os.linesep, os.linesep)
+    disable_when = '{ network_exists == 1 }'
+    shard_mode = hou.MenuParmTemplate('shard_mode', 'Shard Bake Groups', ('flat', 'prefix', 'category'),
+                                      menu_labels=('Flat', 'Group Name Prefix', 'Category'), default_value=0,
+                                      disable_when=disable_when, help=help)
+
+    help = "Group names are sharded by the part of their name preceding the first occurence of this separator."
+    disable_when = '{ network_exists == 1 } { shard_mode != \"prefix\" }'
+    shard_separator = hou.StringParmTemplate('shard_separator', 'Shard Separator', 1, default_value=('_',),
+                                             disable_when=disable_when, help=help)
+
+    help = "One rule per line: a group name pattern followed by a category name, for example 'arm* limbs'.%s" \
+        "The first matching rule wins. Groups that don't match any rule go to the '%s' category." % (
+            os.linesep, Dynamite.DEFAULT_SHARD)
+    disable_when = '{ network_exists == 1 } { shard_mode != \"category\" }'
+    shard_categories = hou.StringParmTemplate('shard_categories', 'Shard Categories', 1,
+                                              disable_when=disable_when, tags={'editor': '1'}, help=help)
+
     script_callback = '%s;dynamite.create_network(hou.pwd())' % Dynamite.MODULE_IMPORT
     help = "Creates bake groups for each retopo object/primitive group."
     disable_when = '{ network_exists == 1 }'
@@ -144,8 +263,9 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
                                                    script_callback_language=hou.scriptLanguage.Python,
                                                    disable_when=disable_when, join_with_next=True, help=help)
 
-    script_callback = '%s;dynamite.update_network(hou.pwd())' % Dynamite.MODULE_IMPORT
-    help = "Updates the network. Required on each asset iteration."
+    script_callback = '%s;dynamite.review_update(hou.pwd())' % Dynamite.MODULE_IMPORT
+    help = ("Updates the network. Required on each asset iteration. Shows a plan of added, removed and changed "
+            "bundles with an estimated duration first, which can be applied or cancelled.")
     disable_when = '{ network_exists == 0 }'
     update_network_button = hou.ButtonParmTemplate('update_network', 'Update Network',
                                                    script_callback=script_callback,
@@ -172,11 +292,17 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
     menu_items = ('FBX | FBX201600', 'FBX | FBX201400', 'FBX | FBX201300', 'FBX | FBX201200', 'FBX | FBX201100',
                   'FBX 6.0 | FBX201000', 'FBX 6.0 | FBX200900', 'FBX 6.0 | FBX200611')
     fbx_sdk_version = hou.MenuParmTemplate('sdk_version', 'FBX SDK Version',
-                                           menu_items=menu_items, menu_labels=menu_items, help=help)
+                                           menu_items=menu_items, menu_labels=menu_items,
+                                           disable_when='{ export_writer == direct }', help=help)
 
     help = "Should the FBX be exported in ASCII format?"
     fbx_ascii = hou.ToggleParmTemplate('fbx_ascii', 'FBX ASCII Export', default_value=False, help=help)
 
+    help = ("Direct writes OBJ and FBX files straight from bundle geometry, without temporary nodes. "
+            "Houdini ROP uses the Geometry and FilmBox ROPs, which also support other formats and FBX versions.")
+    export_writer = hou.MenuParmTemplate('export_writer', 'Writer', ('direct', 'rop'),
+                                         menu_labels=('Direct', 'Houdini ROP'), default_value=0, help=help)
+
     help = "Output will be scaled by this factor. Use if you encounter some bake artifacts because of object scale."
     export_scale = hou.FloatParmTemplate('export_scale', 'Export Scale', 1, default_value=(1.0,), help=help)
 
@@ -197,7 +323,13 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
                                               default_value=('_high',), help=help)
 
     help = "Triangulates retopo and cage outputs."
-    triangulate = hou.ToggleParmTemplate('triangulate', 'Triangulate', False, help=help)
+    triangulate_toggle = hou.ToggleParmTemplate('triangulate', 'Triangulate', False, help=help)
+
+    help = ("Triangulation method. Divide (the default) uses the Divide SOP and is the fastest. Ear Clipping "
+            "handles concave polygons. Delaunay also avoids thin triangles where possible.")
+    triangulate_mode = hou.MenuParmTemplate('triangulate_mode', 'Triangulation', ('fan', 'ear_clipping', 'delaunay'),
+                                            menu_labels=('Divide', 'Ear Clipping', 'Delaunay'), default_value=0,
+                                            disable_when='{ triangulate == 0 }', help=help)
 
     help = "Export retopo and cage objects."
     script_callback = "%s;dynamite.export(True, False, True, hou.node('%s'))" % (
@@ -225,6 +357,178 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
                                            script_callback_language=hou.scriptLanguage.Python, join_with_next=True,
                                            help=help)
 
+    help = "Directory of preview bakes. Every bundle gets a normal map and a mask of texels which rays missed."
+    preview_path = hou.StringParmTemplate('preview_path', 'Preview Directory', 1,
+                                          string_type=hou.stringParmType.FileReference,
+                                          file_type=hou.fileType.Directory,
+                                          default_value=('$HIP/geo/bake/preview',), help=help)
+
+    help = "Width and height of preview bakes."
+    preview_resolution = hou.MenuParmTemplate('preview_resolution', 'Preview Resolution', ('128', '256', '512', '1024'),
+                                              default_value=1, help=help)
+
+    help = "Bakes low-resolution normal maps of all bundles, in order to find cage problems before exporting."
+    script_callback = "%s;dynamite.preview_bake(hou.pwd())" % (Dynamite.MODULE_IMPORT,)
+    preview_bake_button = hou.ButtonParmTemplate('preview_bake', 'Preview Bake', disable_when=disable_when,
+                                                 script_callback=script_callback,
+                                                 script_callback_language=hou.scriptLanguage.Python, help=help)
+
+    # Create parameters for edit tab. A single set of controls is bound to the active bundle, values of all bundles
+    # are stored on their retopo objects.
+    help = "Bake bundle which is edited by the parameters below."
+    script_callback = '%s;dynamite.load_active_bundle(hou.pwd())' % Dynamite.MODULE_IMPORT
+    item_generator_script = "%s%sreturn dynamite.bundle_menu_items(hou.pwd())" % (Dynamite.MODULE_IMPORT, os.linesep)
+    disable_when = '{ network_exists == 0 }'
+    active_bundle = hou.StringParmTemplate('active_bundle', 'Bundle', 1, menu_type=hou.menuType.Normal,
+                                           item_generator_script=item_generator_script,
+                                           item_generator_script_language=hou.scriptLanguage.Python,
+                                           script_callback=script_callback,
+                                           script_callback_language=hou.scriptLanguage.Python,
+                                           disable_when=disable_when, help=help)
+
+    script_callback = '%s;dynamite.store_active_bundle(hou.pwd())' % Dynamite.MODULE_IMPORT
+
+    help = "How many iterations to subdivide, higher numbers give a smoother surface."
+    disable_when = '{ subdivide == 0 } { network_exists == 0 }'
+    active_iterations = hou.IntParmTemplate('active_iterations', 'Iterations', 1, default_value=(0,),
+                                            script_callback=script_callback,
+                                            script_callback_language=hou.scriptLanguage.Python,
+                                            disable_when=disable_when, help=help)
+    active_iterations.setConditional(hou.parmCondType.HideWhen, '{ subdivide == 0 }')
+
+    help = "Translates the whole bake group."
+    disable_when = '{ network_exists == 0 }'
+    active_translate = hou.FloatParmTemplate('active_translate', 'Translate', 3, default_value=(0, 0, 0),
+                                             script_callback=script_callback,
+                                             script_callback_language=hou.scriptLanguage.Python,
+                                             disable_when=disable_when, join_with_next=True, help=help)
+
+    help = "Takes you to predefined Edit SOP of the current cage object."
+    edit_cage_button = hou.ButtonParmTemplate(
+        'edit_cage', 'Edit Cage',
+        script_callback="%s;dynamite.edit_cage(hou.pwd().parm('active_bundle').eval(), hou.pwd())" % (
+            Dynamite.MODULE_IMPORT,),
+        script_callback_language=hou.scriptLanguage.Python, disable_when=disable_when, help=help)
+
+    help = "Offset distance of the cage from the retopo surface."
+    active_peak_dist = hou.FloatParmTemplate('active_peak_dist', 'Peak Distance', 1, max=1.0,
+                                             script_callback=script_callback,
+                                             script_callback_language=hou.scriptLanguage.Python,
+                                             disable_when=disable_when, help=help)
+
+    help = "How many times to relax the cage, smoothing out crumpled regions while keeping its topology."
+    active_relax_iterations = hou.IntParmTemplate('active_relax_iterations', 'Relax Iterations', 1, max=50,
+                                                  default_value=(0,), script_callback=script_callback,
+                                                  script_callback_language=hou.scriptLanguage.Python,
+                                                  disable_when=disable_when, help=help)
+
+    help = "How much every relax iteration smooths the cage."
+    active_relax_strength = hou.FloatParmTemplate('active_relax_strength', 'Relax Strength', 1, default_value=(0.5,),
+                                                  min=0.0, max=1.0, min_is_strict=True, max_is_strict=True,
+                                                  script_callback=script_callback,
+                                                  script_callback_language=hou.scriptLanguage.Python,
+                                                  disable_when=disable_when, help=help)
+
+    script_callback = '%s;dynamite.store_active_display(hou.pwd())' % Dynamite.MODULE_IMPORT
+    active_display_toggles = []
+    for group_type, label in (('retopo', 'Show Retopo'), ('reference', 'Show Reference'), ('cage', 'Show Cage')):
+        help = "Show %s object of the bundle." % (group_type,)
+        active_display_toggles.append(hou.ToggleParmTemplate(
+            'active_%s_display' % group_type, label, default_value=False, script_callback=script_callback,
+            script_callback_language=hou.scriptLanguage.Python, disable_when=disable_when, help=help))
+
+    help = "Restores the cage object to default."
+    script_callback = "%s;dynamite.reset_cage(hou.pwd().parm('active_bundle').eval(), hou.pwd())" % (
+        Dynamite.MODULE_IMPORT,)
+    reset_changes_button = hou.ButtonParmTemplate('reset_changes', 'Reset Changes', join_with_next=True,
+                                                  script_callback=script_callback,
+                                                  script_callback_language=hou.scriptLanguage.Python,
+                                                  disable_when=disable_when, help=help)
+
+    help = "Shows reference and cage objects of all bake groups."
+    script_callback = "%s;dynamite.show_all(True, True, hou.pwd())" % (Dynamite.MODULE_IMPORT,)
+    show_reference_cages_button = hou.ButtonParmTemplate('show_ref_cages', 'Show Reference and Cages',
+                                                         join_with_next=True, script_callback=script_callback,
+                                                         script_callback_language=hou.scriptLanguage.Python,
+                                                         disable_when=disable_when, help=help)
+
+    help = "Shows cage objects of all bake groups."
+    script_callback = "%s;dynamite.show_all(False, True, hou.pwd())" % (Dynamite.MODULE_IMPORT,)
+    show_cages_only = hou.ButtonParmTemplate('show_cages_only', 'Show Cages Only', join_with_next=True,
+                                             script_callback=script_callback,
+                                             script_callback_language=hou.scriptLanguage.Python,
+                                             disable_when=disable_when, help=help)
+
+    help = "Isolates the reference and cage objects of the current bake group."
+    script_callback = "%s;dynamite.isolate_group(hou.pwd().parm('active_bundle').eval(), hou.pwd())" % (
+        Dynamite.MODULE_IMPORT,)
+    isolate_button = hou.ButtonParmTemplate('isolate', 'Isolate', script_callback=script_callback,
+                                            script_callback_language=hou.scriptLanguage.Python,
+                                            disable_when=disable_when, help=help)
+
+    help = ("Maximum number of reference and cage polygons drawn by Show Reference and Cages and Show Cages Only. "
+            "The active bundle and bundles largest on screen are drawn first, the rest as bounding boxes. "
+            "0 draws everything.")
+    polygon_budget = hou.IntParmTemplate('polygon_budget', 'Polygon Budget', 1, default_value=(10000000,), min=0,
+                                         max=50000000, min_is_strict=True, disable_when=disable_when, help=help)
+
+    help = ("Marks self-intersecting polygons of cages and polygons facing away from the retopo with the "
+            "'%s' primitive group." % Dynamite.FOLDS_GROUP)
+    detect_folds = hou.ToggleParmTemplate('detect_folds', 'Mark Folds', default_value=False,
+                                          disable_when=disable_when, join_with_next=True, help=help)
+
+    help = "Checks cages of all bundles for folds and lists the bundles which have them."
+    script_callback = "%s;dynamite.check_cages(hou.pwd())" % (Dynamite.MODULE_IMPORT,)
+    check_cages_button = hou.ButtonParmTemplate('check_cages', 'Check Cages', script_callback=script_callback,
+                                                script_callback_language=hou.scriptLanguage.Python,
+                                                disable_when=disable_when, help=help)
+
+    help = "Snapshot file with the cage work (peak, translation, iterations and edits) of all bundles."
+    cage_state_path = hou.StringParmTemplate('cage_state_path', 'Cage State File', 1,
+                                             string_type=hou.stringParmType.FileReference,
+                                             default_value=('$HIP/geo/bake/cage_state.npz',), help=help)
+
+    help = "Saves the cage work of all bundles to the cage state file."
+    script_callback = "%s;dynamite.save_cage_state(hou.pwd())" % (Dynamite.MODULE_IMPORT,)
+    save_cage_state_button = hou.ButtonParmTemplate('save_cage_state', 'Save Cage State', join_with_next=True,
+                                                    script_callback=script_callback,
+                                                    script_callback_language=hou.scriptLanguage.Python,
+                                                    disable_when=disable_when, help=help)
+
+    help = ("Restores the cage work of all bundles from the cage state file. Bundles with a different topology are "
+            "skipped.")
+    script_callback = "%s;dynamite.load_cage_state(hou.pwd())" % (Dynamite.MODULE_IMPORT,)
+    load_cage_state_button = hou.ButtonParmTemplate('load_cage_state', 'Load Cage State',
+                                                    script_callback=script_callback,
+                                                    script_callback_language=hou.scriptLanguage.Python,
+                                                    disable_when=disable_when, help=help)
+
+    # Create parameters for stats tab.
+    help = "Order of bundles in the statistics table and in the bundle menu of the edit tab."
+    script_callback = '%s;dynamite.show_bundle_stats(hou.pwd())' % Dynamite.MODULE_IMPORT
+    stats_sort = hou.MenuParmTemplate('stats_sort', 'Sort By', ('name', 'polygons', 'memory', 'cook'),
+                                      menu_labels=('Name', 'Polygons', 'Memory', 'Cook Time'), default_value=0,
+                                      script_callback=script_callback,
+                                      script_callback_language=hou.scriptLanguage.Python, join_with_next=True,
+                                      help=help)
+
+    help = "Updates statistics of bundles whose geometry has changed since they were last computed."
+    script_callback = '%s;dynamite.refresh_bundle_stats(hou.pwd())' % Dynamite.MODULE_IMPORT
+    refresh_stats_button = hou.ButtonParmTemplate('refresh_stats', 'Refresh', script_callback=script_callback,
+                                                  script_callback_language=hou.scriptLanguage.Python,
+                                                  disable_when='{ network_exists == 0 }', help=help)
+
+    help = ("Lists memory held by cached geometry of all nodes of the network per bundle and per node, and stages "
+            "which hold copies of the same geometry. Offers to unload intermediate stages of the sources.")
+    script_callback = '%s;dynamite.audit_memory(hou.pwd())' % Dynamite.MODULE_IMPORT
+    audit_memory_button = hou.ButtonParmTemplate('audit_memory', 'Audit Memory', script_callback=script_callback,
+                                                 script_callback_language=hou.scriptLanguage.Python,
+                                                 disable_when='{ network_exists == 0 }', help=help)
+
+    help = "Polygon counts, memory use and cook times of all bundles. Details are kept in the bundle manifest."
+    bundle_stats = hou.StringParmTemplate('bundle_stats', 'Bundles', 1, tags={'editor': '1', 'editorlines': '20'},
+                                          help=help)
+
     # Create parameters for data tab.
     network_exists = hou.ToggleParmTemplate('network_exists', 'Network Exists', False)
 
@@ -273,6 +577,12 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
     cage_output = hou.StringParmTemplate('cage_output_obj', 'Cage Output ObjNode', 1,
                                          string_type=hou.stringParmType.NodeReference)
 
+    reference_display = hou.StringParmTemplate('reference_display_obj', 'Reference Display ObjNode', 1,
+                                               string_type=hou.stringParmType.NodeReference)
+
+    cage_display = hou.StringParmTemplate('cage_display_obj', 'Cage Display ObjNode', 1,
+                                          string_type=hou.stringParmType.NodeReference)
+
     retopo_material = hou.StringParmTemplate('retopo_material', 'Retopo Material', 1,
                                              string_type=hou.stringParmType.NodeReference)
 
@@ -289,24 +599,43 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
     folder_import = hou.FolderParmTemplate('import_folder', 'Import')
     folder_export = hou.FolderParmTemplate('export_folder', 'Export')
     folder_edit = hou.FolderParmTemplate('edit_folder', 'Edit')
+    folder_stats = hou.FolderParmTemplate('stats_folder', 'Stats')
     folder_data = hou.FolderParmTemplate('date_folder', 'Data')
     parm_template_group.addParmTemplate(folder_import)
     parm_template_group.addParmTemplate(folder_export)
     parm_template_group.addParmTemplate(folder_edit)
+    parm_template_group.addParmTemplate(folder_stats)
     parm_template_group.addParmTemplate(folder_data)
 
     # Add parameter templates to folders.
     parm_template_group = append_to_folder(parm_template_group, 'Import', subdivide, subdivision_algorithm,
                                            retopo_source_path, reference_source_path,
                                            import_scale, smooth_normals,
+                                           shard_mode, shard_separator, shard_categories,
                                            create_network_button, update_network_button)
 
     parm_template_group = append_to_folder(parm_template_group, 'Export', retopo_export_path, reference_export_path,
-                                           cage_export_path, fbx_sdk_version, fbx_ascii,
+                                           cage_export_path, export_writer, fbx_sdk_version, fbx_ascii,
                                            hou.SeparatorParmTemplate('ex_sep1'), export_scale,
-                                           use_name_correspondence, retopo_suffix, reference_suffix, triangulate,
-                                           hou.SeparatorParmTemplate('ex_sep2'),
-                                           export_button, export_retopo_cage_button, export_reference_button)
+                                           use_name_correspondence, retopo_suffix, reference_suffix,
+                                           triangulate_toggle, triangulate_mode, hou.SeparatorParmTemplate('ex_sep2'),
+                                           export_button, export_retopo_cage_button, export_reference_button,
+                                           hou.SeparatorParmTemplate('ex_sep3'), preview_path, preview_resolution,
+                                           preview_bake_button)
+
+    parm_template_group = append_to_folder(parm_template_group, 'Edit', active_bundle,
+                                           hou.SeparatorParmTemplate('ed_sep1'),
+                                           active_iterations, active_translate, edit_cage_button, active_peak_dist,
+                                           active_relax_iterations, active_relax_strength,
+                                           *active_display_toggles)
+    parm_template_group = append_to_folder(parm_template_group, 'Edit', reset_changes_button,
+                                           show_reference_cages_button, show_cages_only, isolate_button,
+                                           polygon_budget, detect_folds, check_cages_button,
+                                           hou.SeparatorParmTemplate('ed_sep2'), cage_state_path,
+                                           save_cage_state_button, load_cage_state_button)
+
+    parm_template_group = append_to_folder(parm_template_group, 'Stats', stats_sort, refresh_stats_button,
+                                           bundle_stats, audit_memory_button)
 
     parm_template_group = append_to_folder(parm_template_group, 'Data', network_exists,
                                            network_location,
@@ -319,6 +648,7 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
                                            retopo_source_out, reference_source_out,
                                            hou.SeparatorParmTemplate('da_sep3'),
                                            retopo_output, reference_output, cage_output,
+                                           reference_display, cage_display,
                                            hou.SeparatorParmTemplate('da_sep4'),
                                            retopo_material, reference_material, cage_material,
                                            hou.SeparatorParmTemplate('da_sep5'),
@@ -333,108 +663,131 @@ def create_control_node(in_retopo='`op:/obj/bake_geo/OUT_LOWPOLY`',
 
 def create_network(control_node):
     """Initializes network creation."""
-    network_location = control_node.parm('network_location').eval()
-    # Create materials.
-    cage_material = create_material('cage', 'principledshader', (0.2, 0.6, 0.22), 0.6)
-    reference_material = create_material('reference', 'principledshader', (0.6, 0.2, 0.2), 0.6)
-    control_node.parm('cage_material').set(cage_material.path())
-    control_node.parm('reference_material').set(reference_material.path())
-
-    # Ensures that all source files exist.
-    if not path_exists(control_node.parm('retopo_source_path').eval()):
-        hou.ui.displayMessage("ERROR: Retopo file doesn't exist.")
-        sys.exit(1)
-    if not path_exists(control_node.parm('reference_source_path').eval()):
-        hou.ui.displayMessage("ERROR: Reference file doesn't exist.")
-        sys.exit(1)
-
-    operation = hou.InterruptableOperation('Creating Source Network', long_operation_name='Loading Geometry...',
-                                           open_interrupt_dialog=True)
-    with operation:
-        # For operation percentage calculations.
-        op_counter = 0
-
-        # Create source networks.
-        operation.updateLongProgress(long_op_status='Creating Retopo Source')
-        retopo_source_obj = create_source_network('retopo_source', control_node)
-        operation.updateLongProgress(long_op_status='Creating Reference Source')
-        reference_source_obj = create_source_network('reference_source', control_node,
-                                                     reference_material.path(), True)
-        hou.node(control_node.parm('network_location').eval()).layoutChildren()
-
-        retopo_geo = hou.node('%s/is_fbx' % control_node.parm('retopo_source').eval()).geometry()
-        reference_geo = hou.node('%s/is_fbx' % control_node.parm('reference_source').eval()).geometry()
-
-        if not primitive_groups_match(retopo_geo, reference_geo):
-            retopo_source_obj.destroy()
-            reference_source_obj.destroy()
+    transaction = NetworkTransaction('Dynamite: Create Network')
+    with transaction:
+        network_location = control_node.parm('network_location').eval()
+        # Create materials.
+        cage_material = create_material('cage', 'principledshader', (0.2, 0.6, 0.22), 0.6)
+        reference_material = create_material('reference', 'principledshader', (0.6, 0.2, 0.2), 0.6)
+        control_node.parm('cage_material').set(cage_material.path())
+        control_node.parm('reference_material').set(reference_material.path())
+
+        # Ensures that all source files exist.
+        if not path_exists(control_node.parm('retopo_source_path').eval()):
+            hou.ui.displayMessage("ERROR: Retopo file doesn't exist.")
+            sys.exit(1)
+        if not path_exists(control_node.parm('reference_source_path').eval()):
+            hou.ui.displayMessage("ERROR: Reference file doesn't exist.")
             sys.exit(1)
 
-        retopo_geo = hou.node(control_node.parm('retopo_source_out').eval()).geometry()
-        reference_geo = hou.node(control_node.parm('reference_source_out').eval()).geometry()
-
-        # Create bake groups for each primitive group.
-        sorted_retopo_prim_groups = list(sorted(retopo_geo.primGroups(), key=lambda prim_group: prim_group.name()))
-        op_percentage_full = 2 + 3 * len(sorted_retopo_prim_groups)
-
-        for retopo_prim_group in sorted_retopo_prim_groups:
-            prim_group_name = retopo_prim_group.name()
-
-            op_percentage = float(op_counter) / float(op_percentage_full)
-            operation.updateLongProgress(op_percentage, 'Creating %s_retopo group.' % prim_group_name)
-            retopo_group = create_retopo_group(retopo_prim_group, control_node)
-            op_counter += 1
-
-            reference_prim_group = reference_geo.findPrimGroup(prim_group_name)
-            op_percentage = float(op_counter) / float(op_percentage_full)
-            operation.updateLongProgress(op_percentage, 'Creating %s_reference group.' % prim_group_name)
-            reference_group = create_reference_group(reference_prim_group, control_node)
-            op_counter += 1
-
-            op_percentage = float(op_counter) / float(op_percentage_full)
-            operation.updateLongProgress(op_percentage, 'Creating %s_cage group.' % prim_group_name)
-            cage_group = create_cage_group(retopo_prim_group, control_node)
-            op_counter += 1
-
-            reference_group.setFirstInput(retopo_group)
-            cage_group.setFirstInput(reference_group)
-
-        retopo_output = create_output_group(
-            Dynamite.RETOPO_OUTPUT_OBJ_NAME, 'retopo', control_node, control_node.parm('retopo_suffix').eval())
-        control_node.parm('retopo_output_obj').set(retopo_output.path())
-        reference_output = create_output_group(
-            Dynamite.REFERENCE_OUTPUT_OBJ_NAME, 'reference', control_node, control_node.parm('reference_suffix').eval())
-        control_node.parm('reference_output_obj').set(reference_output.path())
-        cage_output = create_output_group(Dynamite.CAGE_OUTPUT_OBJ_NAME, 'cage', control_node)
-        control_node.parm('cage_output_obj').set(cage_output.path())
-
-        # Update control node parameters.
-        # Add script callback for retopo and reference suffixes.
-        retopo_suffix_sop = hou.node('%s/add_suffix' % retopo_output.path())
-        reference_suffix_sop = hou.node('%s/add_suffix' % reference_output.path())
-
-        parm_template_group = control_node.parmTemplateGroup()
-        retopo_suffix = parm_template_group.find('retopo_suffix')
-        reference_suffix = parm_template_group.find('reference_suffix')
-
-        script_callback = "%s;hou.node('%s').parm('newname1').set('*_' + hou.pwd().parm('retopo_suffix').eval())" % (
-            Dynamite.MODULE_IMPORT, retopo_suffix_sop.path())
-        retopo_suffix.setScriptCallback(script_callback)
-        retopo_suffix.setScriptCallbackLanguage(hou.scriptLanguage.Python)
-
-        script_callback = "%s;hou.node('%s').parm('newname1').set('*_' + hou.pwd().parm('reference_suffix').eval())" % (
-            Dynamite.MODULE_IMPORT, reference_suffix_sop.path())
-        reference_suffix.setScriptCallback(script_callback)
-        reference_suffix.setScriptCallbackLanguage(hou.scriptLanguage.Python)
-
-        parm_template_group.replace('retopo_suffix', retopo_suffix)
-        parm_template_group.replace('reference_suffix', reference_suffix)
-        control_node.setParmTemplateGroup(parm_template_group)
-
-        # Tidy up.
-        hou.node(network_location).layoutChildren()
-        control_node.parm('network_exists').set(True)
-        home_network(network_location)
+        operation = hou.InterruptableOperation('Creating Source Network', long_operation_name='Loading Geometry...',
+                                               open_interrupt_dialog=True)
+        with operation:
+            # For operation percentage calculations.
+            op_counter = 0
+
+            # Create source networks.
+            operation.updateLongProgress(long_op_status='Creating Retopo Source')
+            retopo_source_obj = create_source_network('retopo_source', control_node)
+            operation.updateLongProgress(long_op_status='Creating Reference Source')
+            reference_source_obj = create_source_network('reference_source', control_node,
+                                                         reference_material.path(), True)
+
+            (retopo_geo, reference_geo), _ = ingest_sources(
+                [hou.node('%s/is_fbx' % control_node.parm('%s_source' % group_type).eval())
+                 for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP)],
+                (False, bool(control_node.parm('smooth_normals').eval())))
+
+            if not primitive_groups_match(retopo_geo, reference_geo):
+                retopo_source_obj.destroy()
+                reference_source_obj.destroy()
+                sys.exit(1)
+
+            retopo_geo = hou.node(control_node.parm('retopo_source_out').eval()).geometry()
+            reference_geo = hou.node(control_node.parm('reference_source_out').eval()).geometry()
+
+            # Create bake groups for each primitive group.
+            sorted_retopo_prim_groups = list(sorted(retopo_geo.primGroups(), key=lambda prim_group: prim_group.name()))
+            op_percentage_full = 2 + 3 * len(sorted_retopo_prim_groups)
+            set_manifest(control_node, {'bundles': {}, 'shards': {}})
+            for shard_name in register_bundles([prim_group.name() for prim_group in sorted_retopo_prim_groups],
+                                               control_node):
+                create_shard(shard_name, control_node)
+
+            retopo_output = create_output_group(
+                Dynamite.RETOPO_OUTPUT_OBJ_NAME, 'retopo', control_node, control_node.parm('retopo_suffix').eval())
+            control_node.parm('retopo_output_obj').set(retopo_output.path())
+            reference_output = create_output_group(Dynamite.REFERENCE_OUTPUT_OBJ_NAME, 'reference', control_node,
+                                                   control_node.parm('reference_suffix').eval())
+            control_node.parm('reference_output_obj').set(reference_output.path())
+            cage_output = create_output_group(Dynamite.CAGE_OUTPUT_OBJ_NAME, 'cage', control_node)
+            control_node.parm('cage_output_obj').set(cage_output.path())
+
+            # Merged whole-asset display objects.
+            reference_display = create_display_group(Dynamite.REFERENCE_DISPLAY_OBJ_NAME, 'reference', control_node)
+            control_node.parm('reference_display_obj').set(reference_display.path())
+            cage_display = create_display_group(Dynamite.CAGE_DISPLAY_OBJ_NAME, 'cage', control_node,
+                                                cage_material.path())
+            control_node.parm('cage_display_obj').set(cage_display.path())
+            transaction.cook_on_commit(retopo_output.displayNode(), reference_output.displayNode(),
+                                       cage_output.displayNode())
+
+
+            for retopo_prim_group in sorted_retopo_prim_groups:
+                prim_group_name = retopo_prim_group.name()
+
+                op_percentage = float(op_counter) / float(op_percentage_full)
+                operation.updateLongProgress(op_percentage, 'Creating %s_retopo group.' % prim_group_name)
+                retopo_group = create_retopo_group(retopo_prim_group, control_node)
+                op_counter += 1
+
+                reference_prim_group = reference_geo.findPrimGroup(prim_group_name)
+                op_percentage = float(op_counter) / float(op_percentage_full)
+                operation.updateLongProgress(op_percentage, 'Creating %s_reference group.' % prim_group_name)
+                reference_group = create_reference_group(reference_prim_group, control_node)
+                op_counter += 1
+
+                op_percentage = float(op_counter) / float(op_percentage_full)
+                operation.updateLongProgress(op_percentage, 'Creating %s_cage group.' % prim_group_name)
+                cage_group = create_cage_group(retopo_prim_group, control_node)
+                op_counter += 1
+
+                reference_group.setFirstInput(retopo_group)
+                cage_group.setFirstInput(reference_group)
+                place_bundle(prim_group_name, control_node)
+                add_bundle_to_outputs(prim_group_name, control_node)
+
+            # Update control node parameters.
+            # Add script callback for retopo and reference suffixes.
+            retopo_suffix_sop = hou.node('%s/add_suffix' % retopo_output.path())
+            reference_suffix_sop = hou.node('%s/add_suffix' % reference_output.path())
+
+            parm_template_group = control_node.parmTemplateGroup()
+            retopo_suffix = parm_template_group.find('retopo_suffix')
+            reference_suffix = parm_template_group.find('reference_suffix')
+
+            script_callback = "%s;hou.node('%s').parm('newname1').set('*_' + " \
+                              "hou.pwd().parm('retopo_suffix').eval())" % (
+                                  Dynamite.MODULE_IMPORT, retopo_suffix_sop.path())
+            retopo_suffix.setScriptCallback(script_callback)
+            retopo_suffix.setScriptCallbackLanguage(hou.scriptLanguage.Python)
+
+            script_callback = "%s;hou.node('%s').parm('newname1').set('*_' + " \
+                              "hou.pwd().parm('reference_suffix').eval())" % (
+                                  Dynamite.MODULE_IMPORT, reference_suffix_sop.path())
+            reference_suffix.setScriptCallback(script_callback)
+            reference_suffix.setScriptCallbackLanguage(hou.scriptLanguage.Python)
+
+            parm_template_group.replace('retopo_suffix', retopo_suffix)
+            parm_template_group.replace('reference_suffix', reference_suffix)
+            control_node.setParmTemplateGroup(parm_template_group)
+
+            # Tidy up.
+            place_network_header(control_node)
+            control_node.parm('active_bundle').set(sorted_retopo_prim_groups[0].name())
+            load_active_bundle(control_node)
+            control_node.parm('network_exists').set(True)
+            home_network(network_location)
 
 
 def create_source_network(node_name, control_node, material='', smooth_normals=False):
@@ -515,10 +868,10 @@ def create_source_network(node_name, control_node, material='', smooth_normals=F
     material_sop.parm('shop_materialpath1').set(material)
     material_sop.bypass(True)
 
-    normal_sop = geo_node.createNode('normal')
+    # Smoothed normals are computed once per source content and reapplied from the geometry cache.
+    normal_sop = geo_node.createNode('python')
     normal_sop.setName('%s_smooth_normals' % node_name)
-    normal_sop.parm('type').set(1)
-    normal_sop.parm('cuspangle').set(180)
+    normal_sop.parm('python').set('%s\ndynamite.cook_smooth_normals(hou.pwd())' % Dynamite.MODULE_IMPORT)
 
     normal_switch_sop = geo_node.createNode('switch')
     normal_switch_sop.setName('%s_smooth_normals_switch' % node_name)
@@ -577,6 +930,494 @@ def create_source_network(node_name, control_node, material='', smooth_normals=F
     return geo_node
 
 
+def index_source(points, vertices, face_counts, members, smooth_normals):
+    """Returns signatures of primitive groups of a source (see mesh.group_signature()), or None if no group members
+    are given, and its smoothed point normals (see get_cached_normals()), or None if they aren't requested.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type members: dict[str, numpy.ndarray]
+    :type smooth_normals: bool
+    :rtype: (dict[str, dict], numpy.ndarray)"""
+    signatures = None
+    if members is not None:
+        signatures = dict((name, mesh.group_signature(points, vertices, face_counts, faces))
+                          for name, faces in members.items())
+    normals = mesh.point_normals(points, vertices, face_counts) if smooth_normals else None
+    return signatures, normals
+
+
+def ingest_sources(nodes, smooth_normals=None, signatures=False):
+    """Cooks source SOPs and indexes their geometry: group signatures, if requested, and smoothed normals of sources
+    flagged in smooth_normals, which are put in the geometry cache, so that smooth normals SOPs of the sources find
+    them there. Cooking and reading geometry happen in the main thread, since hou isn't thread-safe, while geometry
+    is indexed by worker threads, so the small retopo is indexed while the reference file is being parsed. Returns
+    the geometry and the group signatures (or None) of every node once all of them are ingested.
+    Arguments:
+        nodes - source SOPs, in the order they are cooked.
+        smooth_normals - flags of nodes whose smoothed normals are cached.
+        signatures - should group signatures be computed?
+    :type nodes: list[hou.SopNode]
+    :type smooth_normals: tuple[bool]
+    :type signatures: bool
+    :rtype: (list[hou.Geometry], list[dict])"""
+    smooth_normals = smooth_normals or (False,) * len(nodes)
+    geometries = []
+    jobs = []
+    pool = ThreadPool(len(nodes))
+    try:
+        for node, smooth in zip(nodes, smooth_normals):
+            geo = node.geometry()
+            geometries.append(geo)
+            if not smooth and not signatures:
+                jobs.append(None)
+                continue
+            vertices, face_counts = geo_io.read_topology(geo)
+            points = geo_io.read_points(geo)
+            key = 'smooth_normals_%s' % mesh.content_hash(points, vertices, face_counts) if smooth else None
+            if key is not None and cache.shared_cache().get(key) is not None:
+                key = None
+            if key is None and not signatures:
+                jobs.append(None)
+                continue
+            members = geo_io.read_group_members(geo) if signatures else None
+            jobs.append((key, pool.apply_async(index_source, (points, vertices, face_counts, members,
+                                                              key is not None))))
+        results = []
+        for job in jobs:
+            if job is None:
+                results.append(None)
+                continue
+            key, result = job
+            group_signatures, normals = result.get()
+            if key is not None:
+                cache.shared_cache().set(key, {'normals': normals})
+            results.append(group_signatures)
+    finally:
+        pool.terminate()
+    return geometries, results
+
+
+def get_cached_normals(geo):
+    """Returns smoothed point normals of the geometry, like the Normal SOP with the cusp angle of 180 degrees
+    computes. Normals are looked up in the geometry cache by the geometry content and only computed on a miss.
+    :type geo: hou.Geometry
+    :rtype: numpy.ndarray"""
+    vertices, face_counts = geo_io.read_topology(geo)
+    points = geo_io.read_points(geo)
+    key = 'smooth_normals_%s' % mesh.content_hash(points, vertices, face_counts)
+    entry = cache.shared_cache().get(key)
+    if entry is None:
+        entry = {'normals': mesh.point_normals(points, vertices, face_counts)}
+        cache.shared_cache().set(key, entry)
+    return entry['normals']
+
+
+def cook_smooth_normals(node):
+    """Cooks a Python SOP which smooths normals of its input. Vertex normals are removed, so that the point
+    normals take effect.
+    :type node: hou.SopNode"""
+    geo = node.geometry()
+    vertex_normals = geo.findVertexAttrib('N')
+    if vertex_normals is not None:
+        vertex_normals.destroy()
+    geo_io.write_points(geo, get_cached_normals(geo), 'N')
+
+
+def cook_peak_directions(node):
+    """Cooks a Python SOP of the retopo object which stores cage peak directions in the 'dynamite_peak_dir'
+    point attribute. Subdivision interpolates the attribute like point positions.
+    :type node: hou.SopNode"""
+    geo = node.geometry()
+    geo_io.write_points(geo, get_cached_normals(geo), 'dynamite_peak_dir')
+
+
+def cook_triangulation(node):
+    """Cooks a Python SOP which triangulates its input with the mode selected by its 'mode' parameter (see
+    triangulate.MODES). The fan mode runs the Divide SOP verb. Triangles of other modes are looked up in the geometry
+    cache and only computed on a miss.
+    :type node: hou.SopNode"""
+    geo = node.geometry()
+    mode = triangulate.MODES[node.evalParm('mode')]
+    if mode == triangulate.FAN:
+        divided = geo_io.run_verb('divide', geo, {'convex': 1, 'numsides': 3})
+        geo.clear()
+        geo.merge(divided)
+        return
+    vertices, face_counts = geo_io.read_topology(geo)
+    triangles = triangulate.cached_triangles(geo_io.read_points(geo), vertices, face_counts, mode)
+    geo_io.replace_with_triangles(geo, face_counts, triangles)
+
+
+def cook_cage_normals(node):
+    """Cooks a Python SOP of the cage object which smooths its normals, stores them as peak directions and keeps
+    rest positions in the 'dynamite_rest' point attribute.
+    :type node: hou.SopNode"""
+    cook_smooth_normals(node)
+    geo = node.geometry()
+    geo_io.write_points(geo, geo_io.read_points(geo, 'N'), 'dynamite_peak_dir')
+    geo_io.write_points(geo, geo_io.read_points(geo), 'dynamite_rest')
+
+
+def get_cached_edges(geo):
+    """Returns point pairs of all edges of cage geometry (see mesh.point_edges()) from the geometry cache. The key
+    is a digest of the topology and rest positions, which don't change while the cage is tweaked.
+    :type geo: hou.Geometry
+    :rtype: numpy.ndarray"""
+    vertices, face_counts = geo_io.read_topology(geo)
+    key = 'edges_%s' % mesh.content_hash(geo_io.read_points(geo, 'dynamite_rest'), vertices, face_counts)
+    entry = cache.shared_cache().get(key)
+    if entry is None:
+        entry = {'edges': mesh.point_edges(vertices, face_counts)}
+        cache.shared_cache().set(key, entry)
+    return entry['edges']
+
+
+def cook_cage_relax(node):
+    """Cooks a Python SOP of the cage object which relaxes offsets of the cage from its rest positions (the peak,
+    so far), rather than the positions themselves, so that the cage keeps following the retopo.
+    :type node: hou.SopNode"""
+    iterations = node.evalParm('iterations')
+    strength = node.evalParm('strength')
+    if iterations <= 0 or strength <= 0:
+        return
+    geo = node.geometry()
+    if geo.findPointAttrib('dynamite_rest') is None:
+        raise hou.NodeError('Missing dynamite_rest point attribute. Please reset the cage.')
+    rest = geo_io.read_points(geo, 'dynamite_rest')
+    offsets = geo_io.read_points(geo) - rest
+    geo_io.write_points(geo, rest + mesh.relax_offsets(offsets, get_cached_edges(geo), iterations, strength))
+
+
+def get_cage_offsets(node):
+    """Returns per-point cage offsets stored in user data of a cage offsets SOP, or None if it has none.
+    :type node: hou.SopNode
+    :rtype: numpy.ndarray"""
+    data = node.userData(Dynamite.OFFSETS_USER_DATA)
+    if not data:
+        return None
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=np.float32).reshape(-1, 3)
+
+
+def set_cage_offsets(node, offsets):
+    """Stores per-point cage offsets in user data of a cage offsets SOP. None clears them.
+    :type node: hou.SopNode
+    :type offsets: numpy.ndarray"""
+    if offsets is None:
+        if node.userData(Dynamite.OFFSETS_USER_DATA) is not None:
+            node.destroyUserData(Dynamite.OFFSETS_USER_DATA)
+        return
+    data = np.ascontiguousarray(offsets, dtype=np.float32).tostring()
+    node.setUserData(Dynamite.OFFSETS_USER_DATA, base64.b64encode(zlib.compress(data)))
+
+
+def cook_cage_offsets(node):
+    """Cooks a Python SOP of the cage object which moves points by the offset array stored in its user data,
+    which holds all edits of the cage.
+    :type node: hou.SopNode"""
+    offsets = get_cage_offsets(node)
+    if offsets is None:
+        return
+    geo = node.geometry()
+    if len(offsets) != geo.intrinsicValue('pointcount'):
+        raise hou.NodeError('Stored cage offsets don\'t match the cage topology. Please reset the cage.')
+    geo_io.write_points(geo, geo_io.read_points(geo) + offsets)
+
+
+def capture_cage_edits(prim_group_name, control_node):
+    """Returns a frozen copy of the cage geometry at rest (unpeaked retopo positions) with its edits in the
+    'dynamite_offset' point attribute, or None if the cage has no edits.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode
+    :rtype: hou.Geometry"""
+    obj_node = get_bundle_obj(prim_group_name, Dynamite.CAGE_GROUP, control_node)
+    user_block_end = obj_node.node('USER_END').geometry()
+    edited = obj_node.node('%s_offsets' % prim_group_name).geometry()
+    offsets = geo_io.read_points(edited) - geo_io.read_points(user_block_end)
+    if not np.abs(offsets).max() > 0:
+        return None
+    captured = hou.Geometry()
+    captured.merge(user_block_end)
+    geo_io.write_points(captured, geo_io.read_points(captured, 'dynamite_rest'))
+    geo_io.write_points(captured, offsets, 'dynamite_offset')
+    return captured
+
+
+def transfer_cage_edits(prim_group_name, captured, control_node):
+    """Transfers captured edits (see capture_cage_edits()) to a cage whose retopo topology has changed. Offsets
+    are sampled at the closest location on the old rest surface to every new rest point and replace the offset
+    array of the cage. An Edit SOP, whose edits refer to old point numbers, is removed.
+    :type prim_group_name: str
+    :type captured: hou.Geometry
+    :type control_node: hou.ObjNode"""
+    obj_node = get_bundle_obj(prim_group_name, Dynamite.CAGE_GROUP, control_node)
+    remove_cage_edit(obj_node, prim_group_name)
+
+    rest = hou.Geometry()
+    rest.merge(obj_node.node('USER_END').geometry())
+    geo_io.write_points(rest, geo_io.read_points(rest, 'dynamite_rest'))
+    set_cage_offsets(obj_node.node('%s_offsets' % prim_group_name),
+                     geo_io.sample_surface(rest, captured, 'dynamite_offset'))
+
+
+def remove_cage_edit(obj_node, prim_group_name):
+    """Destroys the Edit SOP of a cage object, if it has one, and connects the offsets SOP directly to USER_END.
+    :type obj_node: hou.ObjNode
+    :type prim_group_name: str"""
+    edit = obj_node.node('%s_edit' % prim_group_name)
+    if edit is not None:
+        edit.destroy()
+    obj_node.node('%s_offsets' % prim_group_name).setInput(0, obj_node.node('USER_END'))
+
+
+def bake_cage_edits(prim_group_name, control_node):
+    """Adds edits of the Edit SOP of a cage to its offset array and removes the Edit SOP.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode"""
+    obj_node = get_bundle_obj(prim_group_name, Dynamite.CAGE_GROUP, control_node)
+    if obj_node is None:
+        return
+    edit = obj_node.node('%s_edit' % prim_group_name)
+    if edit is not None:
+        offsets_node = obj_node.node('%s_offsets' % prim_group_name)
+        edits = geo_io.read_points(edit.geometry()) - geo_io.read_points(edit.inputs()[0].geometry())
+        offsets = get_cage_offsets(offsets_node)
+        if offsets is not None and len(offsets) != len(edits):
+            raise hou.Error('Offsets of %s don\'t match its topology. Please reset the cage.' % prim_group_name)
+        if edits.any():
+            set_cage_offsets(offsets_node, edits if offsets is None else offsets + edits)
+    remove_cage_edit(obj_node, prim_group_name)
+
+
+def bake_pending_edits(control_node, keep=''):
+    """Bakes edits of the cage which was last opened by edit_cage(), unless it is the one to keep editing.
+    :type control_node: hou.ObjNode
+    :type keep: str"""
+    editing = control_node.userData(Dynamite.EDITING_USER_DATA)
+    if not editing or editing == keep:
+        return
+    bake_cage_edits(editing, control_node)
+    control_node.destroyUserData(Dynamite.EDITING_USER_DATA)
+
+
+def refine_cage_offsets(geo, offsets, refined_point_count, iterations, algorithm):
+    """Returns cage offsets (edits and user deformations, without the peak) refined like the retopo is. Subdivision
+    is linear in point positions, so the offsets are subdivided on their own and the result is cached by their
+    values, topology and subdivision settings. Unedited cages skip the subdivision altogether.
+    :type geo: hou.Geometry
+    :type offsets: numpy.ndarray
+    :type refined_point_count: int
+    :type iterations: int
+    :type algorithm: int
+    :rtype: numpy.ndarray"""
+    # Offsets are quantized, so that float rounding of the peak doesn't count as an edit.
+    tolerance = max(float(np.abs(geo_io.read_points(geo, 'dynamite_rest')).max()), 1.0) * 1e-6
+    quantized = np.round(offsets / tolerance).astype(np.int64)
+    if not quantized.any():
+        return np.zeros((refined_point_count, 3))
+    offsets = quantized * tolerance
+    if len(offsets) == refined_point_count:
+        return offsets
+
+    vertices, face_counts = geo_io.read_topology(geo)
+    digest = hashlib.sha1(quantized.tostring())
+    digest.update(mesh.topology_hash(len(offsets), vertices, face_counts))
+    digest.update(str((iterations, algorithm, tolerance)))
+    key = 'cage_offsets_%s' % digest.hexdigest()
+    entry = cache.shared_cache().get(key)
+    if entry is None:
+        offsets_geo = hou.Geometry()
+        offsets_geo.merge(geo)
+        geo_io.write_points(offsets_geo, offsets)
+        refined = geo_io.run_verb('subdivide', offsets_geo, {'algorithm': algorithm, 'iterations': iterations})
+        entry = {'offsets': geo_io.read_points(refined)}
+        cache.shared_cache().set(key, entry)
+    return entry['offsets']
+
+
+def get_subdivision_attribs(geo):
+    """Returns point, primitive and vertex attributes of the geometry which change how it is subdivided (see
+    Dynamite.SUBDIVISION_ATTRIBS).
+    :type geo: hou.Geometry
+    :rtype: list[hou.Attrib]"""
+    attribs = []
+    for name in Dynamite.SUBDIVISION_ATTRIBS:
+        for find_attrib in (geo.findPointAttrib, geo.findPrimAttrib, geo.findVertexAttrib):
+            if find_attrib(name) is not None:
+                attribs.append(find_attrib(name))
+    return attribs
+
+
+def subdivision_attribs_key(geo):
+    """Returns a digest of names, classes and values of subdivision attributes of the geometry.
+    :type geo: hou.Geometry
+    :rtype: str"""
+    digest = hashlib.sha1()
+    for attrib in get_subdivision_attribs(geo):
+        digest.update('%s %s' % (attrib.type(), attrib.name()))
+        digest.update(geo_io.read_attrib_string(geo, attrib))
+    return digest.hexdigest()
+
+
+def refine_creased_cage(geo, base_geo, iterations, algorithm):
+    """Returns displacements of refined cage points from the refined retopo, for cages whose subdivision attributes
+    were changed by the user (e.g. with Crease SOPs between USER_BEGIN and USER_END), so that the cage isn't
+    subdivided like the retopo. The cage is subdivided with its attributes, and its rest positions with those of
+    the base geometry (USER_BEGIN), which has the attributes of the retopo. The result is cached by the cage
+    content, both sets of attributes and subdivision settings.
+    :type geo: hou.Geometry
+    :type base_geo: hou.Geometry
+    :type iterations: int
+    :type algorithm: int
+    :rtype: numpy.ndarray"""
+    vertices, face_counts = geo_io.read_topology(geo)
+    rest_points = geo_io.read_points(geo, 'dynamite_rest')
+    digest = hashlib.sha1(mesh.content_hash(geo_io.read_points(geo), vertices, face_counts))
+    digest.update(rest_points.tostring())
+    digest.update(str((subdivision_attribs_key(geo), subdivision_attribs_key(base_geo), iterations, algorithm)))
+    key = 'creased_cage_%s' % digest.hexdigest()
+    entry = cache.shared_cache().get(key)
+    if entry is None:
+        parms = {'algorithm': algorithm, 'iterations': iterations}
+        rest_geo = hou.Geometry()
+        rest_geo.merge(base_geo)
+        geo_io.write_points(rest_geo, rest_points)
+        entry = {'offsets': geo_io.read_points(geo_io.run_verb('subdivide', geo, parms)).astype(np.float64) -
+                 geo_io.read_points(geo_io.run_verb('subdivide', rest_geo, parms))}
+        cache.shared_cache().set(key, entry)
+    return entry['offsets']
+
+
+def cook_cage_refinement(node):
+    """Cooks a Python SOP of the cage object which outputs the refined retopo (second input) displaced by the
+    peak and edits of the cage (first input). Only point positions are computed per cook; subdivision and
+    triangulation are shared with the retopo object, unless the user changed subdivision attributes of the cage
+    (see refine_creased_cage()).
+    :type node: hou.SopNode"""
+    geo = node.geometry()
+    refined = node.inputs()[1].geometry()
+    for source, attrib_name in ((geo, 'dynamite_rest'), (geo, 'dynamite_peak_dir'), (refined, 'dynamite_peak_dir')):
+        if source.findPointAttrib(attrib_name) is None:
+            raise hou.NodeError('Missing %s point attribute. Please reset the cage.' % attrib_name)
+
+    peak_dist = node.evalParm('peak_dist')
+    export_scale = node.evalParm('export_scale')
+    offsets = (geo_io.read_points(geo).astype(np.float64) - geo_io.read_points(geo, 'dynamite_rest') -
+               peak_dist * geo_io.read_points(geo, 'dynamite_peak_dir'))
+    refined_points = geo_io.read_points(refined)
+    user_block_start = node.parent().node('USER_BEGIN')
+    if len(offsets) != len(refined_points) and user_block_start is not None and \
+            subdivision_attribs_key(geo) != subdivision_attribs_key(user_block_start.geometry()):
+        displacements = refine_creased_cage(geo, user_block_start.geometry(), node.evalParm('iterations'),
+                                             node.evalParm('algorithm'))
+    else:
+        displacements = refine_cage_offsets(geo, offsets, len(refined_points), node.evalParm('iterations'),
+                                            node.evalParm('algorithm'))
+        if len(displacements) == len(refined_points):
+            displacements = displacements + peak_dist * geo_io.read_points(refined, 'dynamite_peak_dir')
+    if len(displacements) != len(refined_points):
+        raise hou.NodeError('Cage topology doesn\'t match the retopo. Please reset the cage.')
+    points = refined_points + export_scale * displacements
+
+    geo.clear()
+    geo.merge(refined)
+    geo.findPointAttrib('dynamite_peak_dir').destroy()
+    if geo.findPrimAttrib('shop_materialpath') is not None:
+        geo.findPrimAttrib('shop_materialpath').destroy()
+    geo_io.write_points(geo, points)
+
+
+def folds_cache_key(points, vertices, face_counts, retopo_geo):
+    """Returns the geometry cache key of folds of a cage given by its arrays, built from the retopo geometry.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type retopo_geo: hou.Geometry
+    :rtype: str"""
+    return 'folds_%s_%s' % (mesh.content_hash(points, vertices, face_counts), geo_io.geometry_key(retopo_geo))
+
+
+def detect_folds_entry(points, vertices, face_counts, retopo_points):
+    """Detects folds of a cage (see folds.detect_folds()) and returns them as a geometry cache entry. It doesn't
+    use hou, so it can run on worker threads.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type retopo_points: numpy.ndarray
+    :rtype: dict"""
+    return {'faces': folds.detect_folds(points, vertices, face_counts, retopo_points).astype(np.int32)}
+
+
+def get_cached_folds(geo, retopo_geo):
+    """Returns indices of folded polygons of cage geometry (see folds.py) from the geometry cache, detecting them
+    on a miss. The retopo geometry is the refined retopo the cage was built from.
+    :type geo: hou.Geometry
+    :type retopo_geo: hou.Geometry
+    :rtype: numpy.ndarray"""
+    vertices, face_counts = geo_io.read_topology(geo)
+    points = geo_io.read_points(geo)
+    key = folds_cache_key(points, vertices, face_counts, retopo_geo)
+    entry = cache.shared_cache().get(key)
+    if entry is None:
+        entry = detect_folds_entry(points, vertices, face_counts, geo_io.read_points(retopo_geo))
+        cache.shared_cache().set(key, entry)
+    return entry['faces']
+
+
+def cook_cage_folds(node):
+    """Cooks a Python SOP of the cage object which puts folded polygons into the folds primitive group, if enabled.
+    :type node: hou.SopNode"""
+    if not node.evalParm('enable'):
+        return
+    geo = node.geometry()
+    retopo_geo = node.inputs()[1].geometry()
+    if geo.intrinsicValue('pointcount') != retopo_geo.intrinsicValue('pointcount'):
+        raise hou.NodeError('Cage topology doesn\'t match the retopo. Please reset the cage.')
+    faces = get_cached_folds(geo, retopo_geo)
+    if len(faces):
+        geo.createPrimGroup(Dynamite.FOLDS_GROUP).add(geo.globPrims(' '.join(str(face) for face in faces)))
+
+
+def check_cages(control_node):
+    """Detects folds of cages of all bundles and lists the bundles which have them. Geometry is read in the main
+    thread, since hou isn't thread-safe, while detection runs on worker threads. Results are cached, so that the
+    folds SOPs of cages don't detect them again. If any folds are found, they are marked in the viewport.
+    :type control_node: hou.ObjNode"""
+    bake_pending_edits(control_node)
+    results = []
+    pool = ThreadPool()
+    try:
+        for name in get_current_prim_groups(control_node) or []:
+            cage_obj = get_bundle_obj(name, Dynamite.CAGE_GROUP, control_node)
+            geo = cage_obj.node('%s_post_normals' % name).geometry()
+            retopo_geo = cage_obj.node('%s_retopo_merge' % name).geometry()
+            vertices, face_counts = geo_io.read_topology(geo)
+            points = geo_io.read_points(geo)
+            key = folds_cache_key(points, vertices, face_counts, retopo_geo)
+            entry = cache.shared_cache().get(key)
+            if entry is None:
+                entry = pool.apply_async(detect_folds_entry, (points, vertices, face_counts,
+                                                              geo_io.read_points(retopo_geo)))
+            results.append((name, key, entry))
+        folded = []
+        for name, key, entry in results:
+            if not isinstance(entry, dict):
+                entry = entry.get()
+                cache.shared_cache().set(key, entry)
+            faces = entry['faces']
+            if len(faces):
+                folded.append('%s: %d polygons' % (name, len(faces)))
+    finally:
+        pool.terminate()
+
+    if not folded:
+        hou.ui.displayMessage('No folds found in %d cages.' % len(results))
+        return
+    control_node.parm('detect_folds').set(True)
+    hou.ui.displayMessage("%d of %d cages have folds. They are marked with the '%s' group." % (
+        len(folded), len(results), Dynamite.FOLDS_GROUP), details='\n'.join(folded))
+
+
 def create_output_group(node_name, group_type, control_node, suffix=''):
     """Creates output groups for retopo, reference and cage bake groups. Legacy and required mostly for .obj export.
     :type node_name: str
@@ -585,9 +1426,6 @@ def create_output_group(node_name, group_type, control_node, suffix=''):
     :type suffix: str
     :rtype: hou.ObjNode"""
     network_location = control_node.parm('network_location').eval()
-    retopo_source_out_geo = hou.node(control_node.parm('retopo_source_out').eval()).geometry()
-    prim_group_names = get_prim_group_names(retopo_source_out_geo)
-    number_of_prim_groups = len(prim_group_names)
 
     obj_node = hou.node(network_location).createNode('geo')
     obj_node.setName(node_name)
@@ -598,17 +1436,15 @@ def create_output_group(node_name, group_type, control_node, suffix=''):
     set_default_folders_hidden(obj_node.parmTemplateGroup())
     destroy_children(obj_node)
 
+    # Bundles of a sharded network are aggregated by shard outputs. Bundles of a flat network are collected
+    # by the network node bundle, which add_bundle_to_outputs() fills as they are created.
     object_merge = obj_node.createNode('object_merge')
     object_merge.setName('object_merge')
-    object_merge.parm('numobj').set(number_of_prim_groups)
-    object_path_suffix = 1
-    for prim_group_name in prim_group_names:
-        if group_type is not 'cage':
-            group_obj_path = '%s/%s_%s' % (network_location, prim_group_name, group_type)
-        else:
-            group_obj_path = '%s/%s_cage' % (network_location, prim_group_name)
-        object_merge.parm('objpath%d' % object_path_suffix).set(group_obj_path)
-        object_path_suffix += 1
+    shard_paths = get_shard_paths(control_node)
+    if shard_paths:
+        set_merge_paths(object_merge, ['%s/%s_shard_output' % (shard_path, group_type) for shard_path in shard_paths])
+    else:
+        set_merge_paths(object_merge, ['@%s' % get_node_bundle(network_location, group_type).name()])
 
     add_suffix = obj_node.createNode('grouprename')
     add_suffix.setName('add_suffix')
@@ -647,111 +1483,183 @@ def create_output_group(node_name, group_type, control_node, suffix=''):
     return obj_node
 
 
-def create_retopo_group(prim_group, control_node):
-    """Creates retopo bake hou.ObjNode. Adds prim group-related stuff to control node.
-    :type prim_group: hou.PrimGroup
+def create_display_group(node_name, group_type, control_node, material=''):
+    """Creates a whole-asset display object which merges outputs of all bake groups of a given type into one
+    packed display. It is toggled instead of display flags of individual bake group objects.
+    Arguments:
+        node_name - name of the display object.
+        group_type - type of merged bake group objects (e.g. reference, cage).
+        control_node - Dynamite control hou.ObjNode.
+        material - path to material that the display object will use.
+    :type node_name: str
+    :type group_type: str
     :type control_node: hou.ObjNode
+    :type material: str
     :rtype: hou.ObjNode"""
     network_location = control_node.parm('network_location').eval()
-    prim_group_name = prim_group.name()
+
     obj_node = hou.node(network_location).createNode('geo')
-    obj_node.setName('%s_retopo' % prim_group_name)
+    obj_node.setName(node_name)
+    obj_node.setColor(DynamiteColor.GRAY_LIGHT)
+    set_node_shape(obj_node, 6)
+    obj_node.setDisplayFlag(False)
+    obj_node.setSelectableInViewport(False)
+    set_default_folders_hidden(obj_node.parmTemplateGroup())
+    destroy_children(obj_node)
+    obj_node.parm('shop_materialpath').set(material)
 
-    # Bundle-specific interface parameters.
-    help = "How many iterations to subdivide, higher numbers give a smoother surface."
-    disable_when = '{ subdivide == 0 }'
-    subdiv_iterations_pt = hou.IntParmTemplate('%s_iterations' % prim_group_name, 'Iterations', 1, default_value=(0,),
-                                               disable_when=disable_when, help=help)
-    hide_when = '{ subdivide == 0 }'
-    subdiv_iterations_pt.setConditional(hou.parmCondType.HideWhen, hide_when)
+    # One packed primitive per bake group object keeps the per-object viewport overhead constant.
+    object_merge = obj_node.createNode('object_merge')
+    object_merge.setName('object_merge')
+    shard_paths = get_shard_paths(control_node) or [network_location]
+    set_merge_paths(object_merge, ['@%s' % get_node_bundle(shard_path, group_type).name()
+                                   for shard_path in shard_paths])
+    object_merge.parm('xformtype').set(1)
+    object_merge.parm('pack').set(True)
+    object_merge.parm('createprimstring').set(True)
+
+    # Bundle objects over the polygon budget are drawn as bounding boxes, see apply_polygon_budget().
+    budget = obj_node.createNode('attribwrangle')
+    budget.setName('budget')
+    budget.parm('class').set(1)
+    budget.parm('snippet').set(Dynamite.BUDGET_SNIPPET)
+    parm_template_group = budget.parmTemplateGroup()
+    parm_template_group.append(hou.StringParmTemplate('proxies', 'Proxies', 1))
+    budget.setParmTemplateGroup(parm_template_group)
 
-    help = "Translates the whole bake group."
-    translate_pt = hou.FloatParmTemplate('%s_translate' % prim_group_name, 'Translate', 3, join_with_next=True,
-                                         default_value=(0, 0, 0), help=help)
+    out = obj_node.createNode('null')
+    out.setName('OUT')
+    out.setColor(DynamiteColor.BLACK)
+    out.setDisplayFlag(True)
+    out.setRenderFlag(True)
 
-    help = "Takes you to predefined Edit SOP of the current cage object."
-    script_callback = "%s;dynamite.edit_cage('%s', hou.node('%s'))" % (
-        Dynamite.MODULE_IMPORT, prim_group_name, control_node.path())
-    edit_cage_button = hou.ButtonParmTemplate('%s_edit_cage' % prim_group_name, 'Edit Cage',
-                                              script_callback=script_callback,
-                                              script_callback_language=hou.scriptLanguage.Python, help=help)
+    # Connections.
+    budget.setInput(0, object_merge)
+    out.setInput(0, budget)
 
-    help = "Offset distance of the cage from the retopo surface."
-    peak_pt = hou.FloatParmTemplate('%s_peak_dist' % prim_group_name, 'Peak Distance', 1, help=help)
-    peak_pt.setMaxValue(1.0)
-
-    help = "Show %s retopo object." % (prim_group_name,)
-    script_callback = "%s;dynamite.toggle_obj_display(hou.node('%s'), hou.node('%s'), '%s_retopo_display')" % (
-        Dynamite.MODULE_IMPORT, obj_node.path(), control_node.path(), prim_group_name)
-    retopo_display_toggle = hou.ToggleParmTemplate('%s_retopo_display' % prim_group_name, 'Show Retopo',
-                                                   default_value=False, script_callback=script_callback,
-                                                   script_callback_language=hou.scriptLanguage.Python, help=help)
-
-    # Init only. Script callback added in create_reference_group().
-    help = "Show %s reference object." % (prim_group_name,)
-    reference_display_toggle = hou.ToggleParmTemplate('%s_reference_display' % prim_group_name, 'Show Reference',
-                                                      default_value=False, help=help)
-
-    # Init only. Script callback added in create_cage_group().
-    help = "Show %s cage object." % (prim_group_name,)
-    cage_display_toggle = hou.ToggleParmTemplate('%s_cage_display' % prim_group_name, 'Show Cage',
-                                                 default_value=True, help=help)
+    obj_node.layoutChildren()
+    return obj_node
 
-    help = "Restores the cage object to default."
-    script_callback = "%s;dynamite.reset_cage('%s', hou.node('%s'))" % (
-        Dynamite.MODULE_IMPORT, prim_group_name, control_node.path())
-    reset_changes_button = hou.ButtonParmTemplate('%s_reset_changes' % prim_group_name, 'Reset Changes',
-                                                  join_with_next=True, script_callback=script_callback,
-                                                  script_callback_language=hou.scriptLanguage.Python,
-                                                  help=help)
 
-    retopo_out_geo = hou.node(control_node.parm('retopo_source_out').eval()).geometry()
-    all_prim_group_names = get_prim_group_names(retopo_out_geo)
+def create_shard(shard_name, control_node):
+    """Creates a shard subnet, which holds bundles of one category, and its retopo, reference and cage outputs.
+    Shard outputs aggregate bundles of the shard and are merged by the top-level output objects.
+    :type shard_name: str
+    :type control_node: hou.ObjNode
+    :rtype: hou.ObjNode"""
+    network_location = control_node.parm('network_location').eval()
+    subnet = hou.node(network_location).createNode('subnet')
+    subnet.setName(shard_name)
+    subnet.setColor(DynamiteColor.GRAY_DARK)
+    subnet.setDisplayFlag(True)
+    set_default_folders_hidden(subnet.parmTemplateGroup())
+
+    for column, group_type in enumerate((Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP)):
+        obj_node = subnet.createNode('geo')
+        obj_node.setName('%s_shard_output' % group_type)
+        obj_node.setColor(DynamiteColor.GRAY_LIGHT)
+        set_node_shape(obj_node, 6)
+        obj_node.setDisplayFlag(False)
+        obj_node.setSelectableInViewport(False)
+        set_default_folders_hidden(obj_node.parmTemplateGroup())
+        destroy_children(obj_node)
+        obj_node.setPosition(grid_position(hou.Vector2(0, 0), column, 0))
+
+        object_merge = obj_node.createNode('object_merge')
+        object_merge.setName('object_merge')
+        set_merge_paths(object_merge, ['@%s' % get_node_bundle(subnet.path(), group_type).name()])
+
+        out = obj_node.createNode('null')
+        out.setName('OUT')
+        out.setColor(DynamiteColor.BLACK)
+        out.setDisplayFlag(True)
+        out.setRenderFlag(True)
+        out.setInput(0, object_merge)
+        place_nodes((object_merge, 0, 0), (out, 0, 1))
+
+    return subnet
+
+
+def get_node_bundle(location, group_type):
+    """Returns the node bundle which collects bake group objects of a given type inside a network location
+    (the network itself or a shard). Output and display objects merge it with an '@' object path, so adding or
+    removing a bundle never touches their multiparms. Creates the node bundle if it doesn't exist.
+    :type location: str
+    :type group_type: str
+    :rtype: hou.NodeBundle"""
+    node_bundle_name = 'dynamite%s_%s' % (re.sub(r'[^A-Za-z0-9_]', '_', location), group_type)
+    node_bundle = hou.nodeBundle(node_bundle_name)
+    if node_bundle is None:
+        node_bundle = hou.addNodeBundle(node_bundle_name)
+    return node_bundle
 
-    help = "Shows reference and cage objects of all bake groups."
-    script_callback = "%s;dynamite.set_group_display(%s, False, True, True, hou.node('%s'))" % (
-        Dynamite.MODULE_IMPORT, str(all_prim_group_names), control_node.path())
-    show_reference_cages_button = hou.ButtonParmTemplate('%s_show_ref_cages' % prim_group_name,
-                                                         'Show Reference and Cages', join_with_next=True,
-                                                         script_callback=script_callback,
-                                                         script_callback_language=hou.scriptLanguage.Python,
-                                                         help=help)
 
-    help = "Shows cage objects of all bake groups."
-    script_callback = "%s;dynamite.set_group_display(%s, False, False, True, hou.node('%s'))" % (
-        Dynamite.MODULE_IMPORT, str(all_prim_group_names), control_node.path())
-    show_cages_only = hou.ButtonParmTemplate('%s_show_cages_only' % prim_group_name, 'Show Cages Only',
-                                             join_with_next=True, script_callback=script_callback,
-                                             script_callback_language=hou.scriptLanguage.Python, help=help)
+def add_bundle_to_outputs(prim_group_name, control_node, group_types=None):
+    """Adds retopo, reference and cage objects of a given bundle to the node bundles that collect them.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode
+    :type group_types: list[str]"""
+    bundle_location = get_bundle_location(prim_group_name, control_node)
+    for group_type in group_types or (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        obj_node = get_bundle_obj(prim_group_name, group_type, control_node)
+        get_node_bundle(bundle_location, group_type).addNode(obj_node)
 
-    help = "Isolates the reference and cage objects of the current bake group."
-    script_callback = "%s;dynamite.set_group_display(%s, False, False, False, hou.node('%s'));" \
-                      "dynamite.set_group_display(('%s',), False, True, True, hou.node('%s'));" \
-                      "dynamite.home()" %\
-                      (Dynamite.MODULE_IMPORT, all_prim_group_names, control_node.path(),
-                       prim_group_name, control_node.path())
-    isolate_button = hou.ButtonParmTemplate('%s_isolate' % prim_group_name, 'Isolate',
-                                            script_callback=script_callback,
-                                            script_callback_language=hou.scriptLanguage.Python, help=help)
 
-    folder = hou.FolderParmTemplate('%s_folder' % prim_group_name, prim_group_name, (
-        subdiv_iterations_pt, translate_pt, edit_cage_button, peak_pt, retopo_display_toggle, reference_display_toggle,
-        cage_display_toggle, reset_changes_button, show_reference_cages_button, show_cages_only, isolate_button),
-                                    folder_type=hou.folderType.Simple, ends_tab_group=True)
-    # folder.setEndsTabGroup(True)  # Uncomment if ends_tab_group in the constructor doesn't work.
+def remove_bundle_from_outputs(prim_group_name, control_node):
+    """Removes retopo, reference and cage objects of a given bundle from the node bundles that collect them.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode"""
+    bundle_location = get_bundle_location(prim_group_name, control_node)
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        obj_node = get_bundle_obj(prim_group_name, group_type, control_node)
+        node_bundle = get_node_bundle(bundle_location, group_type)
+        if obj_node is not None and node_bundle.containsNode(obj_node):
+            node_bundle.removeNode(obj_node)
 
-    parm_template_group = control_node.parmTemplateGroup()
-    parm_template_group.appendToFolder('Edit', folder)
-    control_node.setParmTemplateGroup(parm_template_group)
+
+def add_shard_to_outputs(shard_path, control_node):
+    """Adds shard outputs to top-level output objects and shard bundles to merged display objects.
+    :type shard_path: str
+    :type control_node: hou.ObjNode"""
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        object_merge = hou.node('%s/object_merge' % control_node.parm('%s_output_obj' % group_type).eval())
+        add_to_multiparm(object_merge.parm('numobj'), 'objpath', '%s/%s_shard_output' % (shard_path, group_type))
+    for group_type in (Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        object_merge = hou.node('%s/object_merge' % control_node.parm('%s_display_obj' % group_type).eval())
+        add_to_multiparm(object_merge.parm('numobj'), 'objpath', '@%s' % get_node_bundle(shard_path, group_type).name())
+
+
+def remove_shard_from_outputs(shard_path, control_node):
+    """Removes shard outputs from top-level output objects and shard bundles from merged display objects.
+    :type shard_path: str
+    :type control_node: hou.ObjNode"""
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        object_merge = hou.node('%s/object_merge' % control_node.parm('%s_output_obj' % group_type).eval())
+        remove_from_multiparm(object_merge.parm('numobj'), 'objpath', '%s/%s_shard_output' % (shard_path, group_type))
+    for group_type in (Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        object_merge = hou.node('%s/object_merge' % control_node.parm('%s_display_obj' % group_type).eval())
+        node_bundle_path = '@%s' % get_node_bundle(shard_path, group_type).name()
+        remove_from_multiparm(object_merge.parm('numobj'), 'objpath', node_bundle_path)
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        get_node_bundle(shard_path, group_type).destroy()
+
+
+def create_retopo_group(prim_group, control_node):
+    """Creates retopo bake hou.ObjNode. The retopo object holds bundle-specific parameters of the whole bundle.
+    :type prim_group: hou.PrimGroup
+    :type control_node: hou.ObjNode
+    :rtype: hou.ObjNode"""
+    prim_group_name = prim_group.name()
+    obj_node = hou.node(get_bundle_location(prim_group_name, control_node)).createNode('geo')
+    obj_node.setName('%s_retopo' % prim_group_name)
 
     # Operators.
     destroy_children(obj_node)
     set_default_folders_hidden(obj_node.parmTemplateGroup())
-    # obj_node.parmTemplateGroup(parm_template_group)
+    add_bundle_parms(obj_node)
     obj_node.setColor(DynamiteColor.GRAY)
-    obj_node.setDisplayFlag(bool(control_node.parm('%s_retopo_display' % prim_group_name).eval()))
-    obj_node.setSelectableInViewport(bool(control_node.parm('%s_retopo_display' % prim_group_name).eval()))
-    obj_node.moveToGoodPosition()
+    obj_node.setDisplayFlag(False)
+    obj_node.setSelectableInViewport(False)
     obj_node.parm('shop_materialpath').set(control_node.parm('retopo_material').eval())
 
     object_merge = obj_node.createNode('object_merge')
@@ -759,24 +1667,23 @@ def create_retopo_group(prim_group, control_node):
     object_merge.parm('objpath1').set(prim_group.geometry().sopNode().path())
     object_merge.parm('group1').set(prim_group_name)
 
+    # Peak directions are refined together with the retopo, so that cages can reuse its subdivision.
+    peak_directions = obj_node.createNode('python')
+    peak_directions.setName('%s_peak_directions' % prim_group_name)
+    peak_directions.parm('python').set('%s\ndynamite.cook_peak_directions(hou.pwd())' % Dynamite.MODULE_IMPORT)
+
     xform = obj_node.createNode('xform')
     xform.setName('%s_xform' % prim_group_name)
     xform.parm('updatenmls').set(0)
-    xform.parmTuple('t').set(control_node.parmTuple('%s_translate' % prim_group_name))
-
-    triangulate = obj_node.createNode('divide')
-    triangulate.setName('%s_triangulate' % prim_group_name)
-    # triangulate.parm('convex').set(1)
-    # triangulate.parm('usemaxsides').set(3)
-    # triangulate.parm('numsides').set(3)
-    # triangulate.parm('planar').set(1)
-    # triangulate.parm('plantol').set(0.0001)
-    # triangulate.parm('noslivers').set(0)
-    # triangulate.parm('avoidsmallangles').set(0)
-    # triangulate.parm('smooth').set(0)
-    # triangulate.parm('brick').set(0)
-    # triangulate.parm('removesh').set(0)
-    # triangulate.parm('dual').set(0)
+    xform.parmTuple('t').set(obj_node.parmTuple('dynamite_translate'))
+
+    triangulate_sop = obj_node.createNode('python')
+    triangulate_sop.setName('%s_triangulate' % prim_group_name)
+    triangulate_sop.parm('python').set('%s\ndynamite.cook_triangulation(hou.pwd())' % Dynamite.MODULE_IMPORT)
+    parm_template_group = triangulate_sop.parmTemplateGroup()
+    parm_template_group.append(hou.IntParmTemplate('mode', 'Mode', 1))
+    triangulate_sop.setParmTemplateGroup(parm_template_group)
+    triangulate_sop.parm('mode').set(control_node.parm('triangulate_mode'))
 
     triangulate_switch = obj_node.createNode('switch')
     triangulate_switch.setName('%s_triangulate_switch' % prim_group_name)
@@ -789,50 +1696,65 @@ def create_retopo_group(prim_group, control_node):
     subdivide = obj_node.createNode('subdivide')
     subdivide.setName('%s_subdivide' % prim_group_name)
     subdivide.parm('algorithm').set(control_node.parm('algorithm'))
-    subdivide.parm('iterations').set(control_node.parm('%s_iterations' % prim_group_name))
+    subdivide.parm('iterations').set(obj_node.parm('dynamite_iterations'))
 
     subdivide_switch = obj_node.createNode('switch')
     subdivide_switch.setName('%s_subdivide_switch' % prim_group_name)
     subdivide_switch.parm('input').set(control_node.parm('subdivide'))
 
+    # Refined topology shared with the cage object.
+    refined = obj_node.createNode('null')
+    refined.setName('%s_refined' % prim_group_name)
+
+    delete_peak_directions = obj_node.createNode('attribdelete')
+    delete_peak_directions.setName('%s_peak_directions_delete' % prim_group_name)
+    delete_peak_directions.parm('ptdel').set('dynamite_peak_dir')
+
     out = obj_node.createNode('null')
     out.setName('%s_OUT' % prim_group_name)
     out.setColor(DynamiteColor.BLACK)
     out.setDisplayFlag(True)
     out.setRenderFlag(True)
 
-    # Connections
-    xform.setInput(0, object_merge)
-    export_scale.setInput(0, xform)
-    subdivide.setInput(0, export_scale)
-    subdivide_switch.setInput(0, export_scale)
+    # Connections. Topology changes come before transforms, so that translating or scaling a bundle doesn't
+    # recook them.
+    peak_directions.setInput(0, object_merge)
+    subdivide.setInput(0, peak_directions)
+    subdivide_switch.setInput(0, peak_directions)
     subdivide_switch.setInput(1, subdivide)
-    triangulate.setInput(0, subdivide_switch)
+    triangulate_sop.setInput(0, subdivide_switch)
     triangulate_switch.setInput(0, subdivide_switch)
-    triangulate_switch.setInput(1, triangulate)
-    out.setInput(0, triangulate_switch)
+    triangulate_switch.setInput(1, triangulate_sop)
+    xform.setInput(0, triangulate_switch)
+    export_scale.setInput(0, xform)
+    refined.setInput(0, export_scale)
+    delete_peak_directions.setInput(0, refined)
+    out.setInput(0, delete_peak_directions)
 
-    obj_node.layoutChildren()
+    place_nodes((object_merge, 0, 0), (peak_directions, 0, 1), (subdivide, 1, 2), (subdivide_switch, 0, 3),
+                (triangulate_sop, 1, 4), (triangulate_switch, 0, 5), (xform, 0, 6), (export_scale, 0, 7),
+                (refined, 0, 8), (delete_peak_directions, 0, 9), (out, 0, 10))
     return obj_node
 
 
 def create_cage_group(prim_group, control_node, return_control=False):
-    """Creates retopo cage hou.ObjNode. Updates prim group-related control node parameters.
+    """Creates retopo cage hou.ObjNode. Adds the primitive group to the list of current primitive groups.
     :type prim_group: hou.PrimGroup
     :type control_node: hou.ObjNode
     :type return_control: bool
     :rtype: hou.ObjNode"""
-    network_location = control_node.parm('network_location').eval()
     prim_group_name = prim_group.name()
+    bundle_location = get_bundle_location(prim_group_name, control_node)
+    retopo_obj = get_bundle_obj(prim_group_name, Dynamite.RETOPO_GROUP, control_node)
 
     # Group contents.
-    obj_node = hou.node(network_location).createNode('geo')
+    obj_node = hou.node(bundle_location).createNode('geo')
     destroy_children(obj_node)
     set_default_folders_hidden(obj_node.parmTemplateGroup())
     obj_node.setName('%s_cage' % prim_group_name)
     obj_node.setColor(DynamiteColor.GRAY_LIGHT)
-    obj_node.setDisplayFlag(bool(control_node.parm('%s_cage_display' % prim_group_name).eval()))
-    obj_node.setSelectableInViewport(bool(control_node.parm('%s_cage_display' % prim_group_name).eval()))
+    obj_node.setDisplayFlag(True)
+    obj_node.setSelectableInViewport(True)
     obj_node.parm('shop_materialpath').set(control_node.parm('cage_material').eval())
 
     object_merge = obj_node.createNode('object_merge')
@@ -844,20 +1766,27 @@ def create_cage_group(prim_group, control_node, return_control=False):
     material.setName('%s_material' % prim_group_name)
     material.parm('shop_materialpath1').set(control_node.parm('cage_material').eval())
 
-    xform = obj_node.createNode('xform')
-    xform.setName('%s_xform' % prim_group_name)
-    xform.parm('updatenmls').set(0)
-    xform.parmTuple('t').set(control_node.parmTuple('%s_translate' % prim_group_name))
-
-    normals = obj_node.createNode('normal')
+    # Cage normals are also stored as peak directions, and rest positions are kept, so that the refinement can
+    # tell the peak apart from edits.
+    normals = obj_node.createNode('python')
     normals.setName('%s_normal' % prim_group_name)
-    normals.parm('cuspangle').set(180)
-    normals.parm('type').set(0)
+    normals.parm('python').set('%s\ndynamite.cook_cage_normals(hou.pwd())' % Dynamite.MODULE_IMPORT)
 
     peak = obj_node.createNode('peak')
     peak.setName('%s_peak' % prim_group_name)
     peak.parm('updatenmls').set(0)
-    peak.parm('dist').set(control_node.parm('%s_peak_dist' % prim_group_name))
+    peak.parm('dist').set(retopo_obj.parm('dynamite_peak_dist'))
+
+    relax = obj_node.createNode('python')
+    relax.setName('%s_relax' % prim_group_name)
+    relax.parm('python').set('%s\ndynamite.cook_cage_relax(hou.pwd())' % Dynamite.MODULE_IMPORT)
+    parm_template_group = relax.parmTemplateGroup()
+    parm_template_group.append(hou.IntParmTemplate('iterations', 'Iterations', 1))
+    parm_template_group.append(hou.FloatParmTemplate('strength', 'Strength', 1))
+    relax.setParmTemplateGroup(parm_template_group)
+    if retopo_obj.parm('dynamite_relax_iterations') is not None:
+        relax.parm('iterations').set(retopo_obj.parm('dynamite_relax_iterations'))
+        relax.parm('strength').set(retopo_obj.parm('dynamite_relax_strength'))
 
     user_block_start = obj_node.createNode('null')
     user_block_start.setName('USER_BEGIN')
@@ -867,47 +1796,44 @@ def create_cage_group(prim_group, control_node, return_control=False):
     user_block_end.setName('USER_END')
     user_block_end.setColor(DynamiteColor.GREEN)
 
-    edit = obj_node.createNode('edit')
-    edit.setName('%s_edit' % prim_group_name)
-    edit.setColor(DynamiteColor.GOLD)
+    # All cage edits are kept as one per-point offset array. Edit SOPs only exist while a cage is being edited,
+    # see edit_cage() and bake_cage_edits().
+    offsets = obj_node.createNode('python')
+    offsets.setName('%s_offsets' % prim_group_name)
+    offsets.parm('python').set('%s\ndynamite.cook_cage_offsets(hou.pwd())' % Dynamite.MODULE_IMPORT)
 
     retopo_merge = obj_node.createNode('object_merge')
     retopo_merge.setName('%s_retopo_merge' % prim_group_name)
-    retopo_merge.parm('objpath1').set(
-        '%s/%s_retopo/%s_triangulate' % (network_location, prim_group_name, prim_group_name))
-
-    delete_material = obj_node.createNode('attribdelete')
-    delete_material.setName('%s_shop_path_delete' % prim_group_name)
-    delete_material.parm('primdel').set('shop_materialpath')
-
-    # Remove commented lines if everything is ok with the Python implementation of the simplified 'topo_match'.
-    # topology_match = obj_node.createNode('com.arturjzarek::exact_topology_match')
-    topology_match = topo_match.create_node(obj_node)
-    # topology_match.setName('%s_topology_match' % prim_group_name)
-    # topology_match.parm('mode').set(1)
-
-    topology_match_switch = obj_node.createNode('switch')
-    topology_match_switch.setName('%s_match_topology' % prim_group_name)
-    topology_match_switch.parm('input').set(control_node.parm('triangulate'))
-
-    export_scale = obj_node.createNode('xform')
-    export_scale.setName('%s_export_scale' % prim_group_name)
-    export_scale.parm('scale').set(control_node.parm('export_scale'))
-
-    subdivide = obj_node.createNode('subdivide')
-    subdivide.setName('%s_subdivide' % prim_group_name)
-    subdivide.parm('algorithm').set(control_node.parm('algorithm'))
-    subdivide.parm('iterations').set(control_node.parm('%s_iterations' % prim_group_name))
-
-    subdivide_switch = obj_node.createNode('switch')
-    subdivide_switch.setName('%s_subdivide_switch' % prim_group_name)
-    subdivide_switch.parm('input').set(control_node.parm('subdivide'))
+    retopo_merge.parm('objpath1').set('%s/%s_refined' % (retopo_obj.path(), prim_group_name))
+
+    # The cage reuses the refined (subdivided and triangulated) retopo and only displaces its points.
+    refine = obj_node.createNode('python')
+    refine.setName('%s_refine' % prim_group_name)
+    refine.parm('python').set('%s\ndynamite.cook_cage_refinement(hou.pwd())' % Dynamite.MODULE_IMPORT)
+    parm_template_group = refine.parmTemplateGroup()
+    parm_template_group.append(hou.FloatParmTemplate('peak_dist', 'Peak Distance', 1))
+    parm_template_group.append(hou.FloatParmTemplate('export_scale', 'Export Scale', 1))
+    parm_template_group.append(hou.IntParmTemplate('iterations', 'Iterations', 1))
+    parm_template_group.append(hou.IntParmTemplate('algorithm', 'Algorithm', 1))
+    refine.setParmTemplateGroup(parm_template_group)
+    refine.parm('peak_dist').set(retopo_obj.parm('dynamite_peak_dist'))
+    refine.parm('export_scale').set(control_node.parm('export_scale'))
+    refine.parm('iterations').set(retopo_obj.parm('dynamite_iterations'))
+    refine.parm('algorithm').set(control_node.parm('algorithm'))
 
     post_normals = obj_node.createNode('normal')
     post_normals.setName('%s_post_normals' % prim_group_name)
     post_normals.parm('cuspangle').set(180)
     post_normals.parm('type').set(0)
 
+    fold_check = obj_node.createNode('python')
+    fold_check.setName('%s_folds' % prim_group_name)
+    fold_check.parm('python').set('%s\ndynamite.cook_cage_folds(hou.pwd())' % Dynamite.MODULE_IMPORT)
+    parm_template_group = fold_check.parmTemplateGroup()
+    parm_template_group.append(hou.ToggleParmTemplate('enable', 'Enable', False))
+    fold_check.setParmTemplateGroup(parm_template_group)
+    fold_check.parm('enable').set(control_node.parm('detect_folds'))
+
     out = obj_node.createNode('null')
     out.setName('%s_OUT' % prim_group_name)
     out.setColor(DynamiteColor.BLACK)
@@ -918,41 +1844,24 @@ def create_cage_group(prim_group, control_node, return_control=False):
     material.setInput(0, object_merge)
     normals.setInput(0, material)
     peak.setInput(0, normals)
-    user_block_start.setInput(0, peak)
+    relax.setInput(0, peak)
+    user_block_start.setInput(0, relax)
     user_block_end.setInput(0, user_block_start)
-    edit.setInput(0, user_block_end)
-    xform.setInput(0, edit)
-    export_scale.setInput(0, xform)
-    subdivide.setInput(0, export_scale)
-    subdivide_switch.setInput(0, export_scale)
-    subdivide_switch.setInput(1, subdivide)
-    delete_material.setInput(0, retopo_merge)
-    topology_match.setInput(0, subdivide_switch)
-    topology_match.setInput(1, delete_material)
-    topology_match_switch.setInput(0, subdivide_switch)
-    topology_match_switch.setInput(0, subdivide_switch)
-    topology_match_switch.setInput(1, topology_match)
-    post_normals.setInput(0, topology_match_switch)
-    out.setInput(0, post_normals)
-
-    obj_node.layoutChildren()
-
-    # Update control node parameters.
-    # TODO: Externalize to function.
-    script_callback = "%s;dynamite.toggle_obj_display(hou.node('%s'), hou.node('%s'), '%s_cage_display')" % (
-        Dynamite.MODULE_IMPORT, obj_node.path(), control_node.path(), prim_group_name)
-    parm_template_group = control_node.parmTemplateGroup()
-    cage_display_toggle = parm_template_group.find('%s_cage_display' % prim_group_name)
-    cage_display_toggle.setScriptCallback(script_callback)
-    cage_display_toggle.setScriptCallbackLanguage(hou.scriptLanguage.Python)
+    offsets.setInput(0, user_block_end)
+    refine.setInput(0, offsets)
+    refine.setInput(1, retopo_merge)
+    post_normals.setInput(0, refine)
+    fold_check.setInput(0, post_normals)
+    fold_check.setInput(1, retopo_merge)
+    out.setInput(0, fold_check)
+
+    place_nodes((object_merge, 0, 0), (material, 0, 1), (normals, 0, 2), (peak, 0, 3), (relax, 0, 4),
+                (user_block_start, 0, 5), (user_block_end, 0, 6), (offsets, 0, 7), (retopo_merge, 1, 7),
+                (refine, 0, 8), (post_normals, 0, 9), (fold_check, 0, 10), (out, 0, 11))
 
     # Update current list of primitive groups.
-    prim_groups_list = get_current_prim_groups(control_node)  # TODO: Remove the variable assignment.
     add_to_current_prim_groups(control_node, prim_group_name)
 
-    parm_template_group.replace('%s_cage_display' % prim_group_name, cage_display_toggle)
-    control_node.setParmTemplateGroup(parm_template_group)
-
     return obj_node if not return_control else (obj_node, control_node)
 
 
@@ -961,16 +1870,14 @@ def create_reference_group(prim_group, control_node):
     :type prim_group: hou.PrimGroup
     :type control_node: hou.ObjNode
     :rtype: hou.ObjNode"""
-    network_location = control_node.parm('network_location').eval()
     prim_group_name = prim_group.name()
-    obj_node = hou.node(network_location).createNode('geo')
+    obj_node = hou.node(get_bundle_location(prim_group_name, control_node)).createNode('geo')
     destroy_children(obj_node)
     set_default_folders_hidden(obj_node.parmTemplateGroup())
     obj_node.setName('%s_reference' % prim_group_name)
     obj_node.setColor(DynamiteColor.GRAY)
-    obj_node.setDisplayFlag(bool(control_node.parm('%s_reference_display' % prim_group_name).eval()))
-    obj_node.setSelectableInViewport(bool(control_node.parm('%s_reference_display' % prim_group_name).eval()))
-    obj_node.moveToGoodPosition()
+    obj_node.setDisplayFlag(False)
+    obj_node.setSelectableInViewport(False)
 
     object_merge = obj_node.createNode('object_merge')
     object_merge.setName('%s_object_merge' % prim_group_name)
@@ -980,7 +1887,8 @@ def create_reference_group(prim_group, control_node):
     xform = obj_node.createNode('xform')
     xform.setName('%s_xform' % prim_group_name)
     xform.parm('updatenmls').set(0)
-    xform.parmTuple('t').set(control_node.parmTuple('%s_translate' % prim_group_name))
+    xform.parmTuple('t').set(
+        get_bundle_obj(prim_group_name, Dynamite.RETOPO_GROUP, control_node).parmTuple('dynamite_translate'))
 
     export_scale = obj_node.createNode('xform')
     export_scale.setName('%s_export_scale' % prim_group_name)
@@ -997,18 +1905,7 @@ def create_reference_group(prim_group, control_node):
     export_scale.setInput(0, xform)
     out.setInput(0, export_scale)
 
-    # Update control node parameters.
-    script_callback = "%s;dynamite.toggle_obj_display(hou.node('%s'), hou.node('%s'), '%s_reference_display')" % (
-        Dynamite.MODULE_IMPORT, obj_node.path(), control_node.path(), prim_group_name)
-    parm_template_group = control_node.parmTemplateGroup()
-    reference_display_toggle = parm_template_group.find('%s_reference_display' % prim_group_name)
-    reference_display_toggle.setScriptCallback(script_callback)
-    reference_display_toggle.setScriptCallbackLanguage(hou.scriptLanguage.Python)
-
-    parm_template_group.replace('%s_reference_display' % prim_group_name, reference_display_toggle)
-    control_node.setParmTemplateGroup(parm_template_group)
-
-    obj_node.layoutChildren()
+    place_nodes((object_merge, 0, 0), (xform, 0, 1), (export_scale, 0, 2), (out, 0, 3))
     return obj_node
 
 
@@ -1049,32 +1946,35 @@ def destroy_children(node):
 
 
 def edit_cage(prim_group_name, control_node, dive_in=True):
-    """Routines for cage editing.
+    """Routines for cage editing. Inserts an Edit SOP into the cage object, whose edits are added to the offset
+    array of the cage once another cage is edited, the active bundle changes or the network is exported. Pending
+    edits of the previously edited cage are baked first.
     :type prim_group_name: str
     :type control_node: hou.ObjNode
     :type dive_in: bool"""
-    network_location = control_node.parm('network_location').eval()
-    obj_node = hou.node('%s/%s_cage' % (network_location, prim_group_name))
-    cage_edit_node = hou.node('%s/%s_cage/%s_edit' % (network_location, prim_group_name, prim_group_name))
+    bake_pending_edits(control_node, keep=prim_group_name)
+    obj_node = get_bundle_obj(prim_group_name, Dynamite.CAGE_GROUP, control_node)
+    cage_edit_node = obj_node.node('%s_edit' % prim_group_name)
     # If user dives into the cage node and switches to Edit Handle but doesn't make any changes before leaving it...
     # Houdini removes the edit node, so it needs to be recreated.
     if cage_edit_node is None:
-        # Re-create the node.
-        cage_edit_node = hou.node('%s/%s_cage' % (network_location, prim_group_name)).createNode('edit')
+        cage_edit_node = obj_node.createNode('edit')
         cage_edit_node.setName('%s_edit' % prim_group_name)
         cage_edit_node.setColor(DynamiteColor.GOLD)
 
-        user_block_end = hou.node('%s/%s_cage/USER_END' % (network_location, prim_group_name))
-        xform = hou.node('%s/%s_cage/%s_xform' % (network_location, prim_group_name, prim_group_name))
+        user_block_end = obj_node.node('USER_END')
+        offsets = obj_node.node('%s_offsets' % prim_group_name)
 
         cage_edit_node.setInput(0, user_block_end)
-        xform.setInput(0, cage_edit_node)
-        obj_node.layoutChildren()
+        offsets.setInput(0, cage_edit_node)
+        cage_edit_node.setPosition((user_block_end.position() + offsets.position()) * 0.5 +
+                                   hou.Vector2(Dynamite.SOP_COLUMN_WIDTH, 0))
+    control_node.setUserData(Dynamite.EDITING_USER_DATA, prim_group_name)
 
     if dive_in:
         get_current_network_editor(hou.ui.curDesktop()).setCurrentNode(cage_edit_node)
         # Clear selection of all nodes.
-        for child in hou.node('%s/%s_cage' % (network_location, prim_group_name)).children():
+        for child in obj_node.children():
             child.setSelected(False)
             child.setCurrent(False)
         cage_edit_node.setSelected(True)
@@ -1163,11 +2063,10 @@ def export_fbx(group_type, suffix, control_node):
     :type group_type: str
     :type suffix: str
     :type control_node: hou.ObjNode"""
-    network_location = control_node.parm('network_location').eval()
     prim_group_names = control_node.parm('prim_groups').eval().split(' ')
     obj_nodes = []
     for name in prim_group_names:
-        obj_nodes.append(hou.node('%s/%s_%s' % (network_location, name, group_type)))
+        obj_nodes.append(get_bundle_obj(name, group_type, control_node))
     subnet = create_fbx_export_nodes(obj_nodes, '_%s' % group_type, '%s' % suffix, control_node)[0].parent()
     subnet.setColor(DynamiteColor.RED)
     fbx_rop = create_fbx_rop(group_type)
@@ -1181,6 +2080,87 @@ def export_fbx(group_type, suffix, control_node):
     subnet.destroy()
 
 
+def is_path_direct(path):
+    """Returns True if a file of a given path can be written by the direct writer (OBJ, gzipped OBJ or FBX).
+    :type path: str
+    :rtype: bool"""
+    return writers.is_obj_path(path) or is_path_fbx(path)
+
+
+def export_direct(group_type, suffix, control_node):
+    """Writes all bundles of a given type straight to the OBJ or FBX file of its export path. Bundles are read
+    from the displayed geometry of their objects one at a time, in prim group order, and each becomes an object
+    named after its bundle and the suffix.
+    :type group_type: str
+    :type suffix: str
+    :type control_node: hou.ObjNode"""
+    export_path = control_node.parm('%s_export_path' % group_type).eval()
+    prim_group_names = get_current_prim_groups(control_node) or []
+    bundles = (geo_io.read_bundle(get_bundle_obj(name, group_type, control_node).displayNode().geometry(),
+                                  name + suffix) for name in prim_group_names)
+    if is_path_fbx(export_path):
+        writers.write_fbx(export_path, bundles, ascii=control_node.parm('fbx_ascii').eval() == 1)
+    else:
+        writers.write_obj(export_path, bundles)
+
+
+def export_group(group_type, suffix, control_node):
+    """Exports bundles of a given type with the writer chosen on the control node. The direct writer handles
+    OBJ and FBX paths; other formats always go through Houdini ROPs.
+    :type group_type: str
+    :type suffix: str
+    :type control_node: hou.ObjNode"""
+    export_path = control_node.parm('%s_export_path' % group_type).eval()
+    if control_node.parm('export_writer').evalAsString() == 'direct' and is_path_direct(export_path):
+        export_direct(group_type, suffix, control_node)
+    elif is_path_fbx(export_path):
+        export_fbx(group_type, suffix, control_node)
+    else:
+        export_sop = hou.node('%s/export' % control_node.parm('%s_output_obj' % group_type).eval())
+        export_sop.parm('execute').pressButton()
+
+
+def read_output_topology(prim_group_name, group_type, control_node):
+    """Returns (point count, vertices, face counts) of the displayed geometry of a bundle object.
+    :type prim_group_name: str
+    :type group_type: str
+    :type control_node: hou.ObjNode
+    :rtype: tuple"""
+    geo = get_bundle_obj(prim_group_name, group_type, control_node).displayNode().geometry()
+    vertices, face_counts = geo_io.read_topology(geo)
+    return geo.intrinsicValue('pointcount'), vertices, face_counts
+
+
+def validate_cages(control_node):
+    """Checks that the cage of every bundle has exactly the topology of its retopo: the same points, polygons and
+    vertex lists. Topologies are read in the main thread, since hou isn't thread-safe, and compared by worker
+    threads while the next bundle is being read. Bundles whose element counts already differ are reported without
+    reading their topology. Returns a list of (bundle name, problem) pairs; the list is empty if all cages match.
+    :type control_node: hou.ObjNode
+    :rtype: list[tuple[str]]"""
+    intrinsic_names = ('pointcount', 'primitivecount', 'vertexcount')
+    problems = []
+    comparisons = []
+    pool = ThreadPool()
+    try:
+        for name in get_current_prim_groups(control_node) or []:
+            counts = []
+            for group_type in (Dynamite.RETOPO_GROUP, Dynamite.CAGE_GROUP):
+                geo = get_bundle_obj(name, group_type, control_node).displayNode().geometry()
+                counts.append(tuple(geo.intrinsicValue(intrinsic_name) for intrinsic_name in intrinsic_names))
+            if counts[0] != counts[1]:
+                problems.append((name, '%d/%d/%d cage points/polygons/vertices, %d/%d/%d in retopo' % (
+                    counts[1] + counts[0])))
+                continue
+            comparisons.append((name, pool.apply_async(mesh.topology_mismatch, (
+                read_output_topology(name, Dynamite.RETOPO_GROUP, control_node),
+                read_output_topology(name, Dynamite.CAGE_GROUP, control_node)))))
+        problems += [(name, result.get()) for name, result in comparisons if result.get() is not None]
+    finally:
+        pool.terminate()
+    return sorted(problems)
+
+
 def export(retopo, reference, cage, control_node):
     """Export routines.
     Arguments:
@@ -1201,39 +2181,454 @@ def export(retopo, reference, cage, control_node):
         retopo_suffix = ''
         reference_suffix = ''
 
+    bake_pending_edits(control_node)
+    if cage:
+        problems = validate_cages(control_node)
+        if problems:
+            hou.ui.displayMessage("ERROR: Topology of %d cage(s) doesn't match their retopo. Nothing was exported."
+                                  % len(problems), severity=hou.severityType.Error,
+                                  details='\n'.join('%s: %s' % problem for problem in problems))
+            return
+
     with operation:
         if retopo:
             operation.updateLongProgress(long_op_status='Exporting Retopo')
-            export_path = control_node.parm('retopo_export_path').eval()
-
-            if is_path_fbx(export_path):
-                export_fbx(Dynamite.RETOPO_GROUP, retopo_suffix, control_node)
-
-            else:
-                export_sop = hou.node('%s/export' % control_node.parm('retopo_output_obj').eval())
-                export_sop.parm('execute').pressButton()
+            export_group(Dynamite.RETOPO_GROUP, retopo_suffix, control_node)
 
         if reference:
             operation.updateLongProgress(0.33, long_op_status='Exporting Reference')
-            export_path = control_node.parm('reference_export_path').eval()
-
-            if is_path_fbx(export_path):
-                export_fbx(Dynamite.REFERENCE_GROUP, reference_suffix, control_node)
-
-            else:
-                export_sop = hou.node('%s/export' % control_node.parm('reference_output_obj').eval())
-                export_sop.parm('execute').pressButton()
+            export_group(Dynamite.REFERENCE_GROUP, reference_suffix, control_node)
 
         if cage:
             operation.updateLongProgress(0.66, long_op_status='Exporting Cage')
-            export_path = control_node.parm('cage_export_path').eval()
+            export_group(Dynamite.CAGE_GROUP, '', control_node)
 
-            if is_path_fbx(export_path):
-                export_fbx(Dynamite.CAGE_GROUP, '', control_node)
 
-            else:
-                export_sop = hou.node('%s/export' % control_node.parm('cage_output_obj').eval())
-                export_sop.parm('execute').pressButton()
+def preview_bake(control_node):
+    """Bakes low-resolution tangent-space normal maps of all bundles with UVs into the preview directory, together
+    with masks of texels whose rays missed the reference, and lists bundles with misses. Geometry is read and rays
+    are cast in the main thread, since hou isn't thread-safe, while UVs are rasterized and images are encoded and
+    written by worker threads.
+    :type control_node: hou.ObjNode"""
+    bake_pending_edits(control_node)
+    resolution = int(control_node.parm('preview_resolution').evalAsString())
+    directory = control_node.parm('preview_path').eval()
+    skipped = []
+    samples = []
+    results = []
+    pool = ThreadPool()
+    try:
+        for name in get_current_prim_groups(control_node) or []:
+            cage_obj = get_bundle_obj(name, Dynamite.CAGE_GROUP, control_node)
+            retopo_geo = cage_obj.node('%s_retopo_merge' % name).geometry()
+            cage_geo = cage_obj.node('%s_post_normals' % name).geometry()
+            if retopo_geo.findVertexAttrib('uv') is None and retopo_geo.findPointAttrib('uv') is None:
+                skipped.append('%s: the retopo has no UVs' % name)
+                continue
+            if cage_geo.intrinsicValue('pointcount') != retopo_geo.intrinsicValue('pointcount'):
+                skipped.append('%s: cage topology doesn\'t match the retopo' % name)
+                continue
+            samples.append((name, pool.apply_async(preview.sample_texels, (
+                geo_io.read_bundle(retopo_geo, name), geo_io.read_points(cage_geo), resolution))))
+
+        for name, bundle_samples in samples:
+            bundle_samples = bundle_samples.get()
+            reference_geo = get_bundle_obj(name, Dynamite.REFERENCE_GROUP, control_node).displayNode().geometry()
+            hit_normals = geo_io.cast_rays(bundle_samples.origins, bundle_samples.directions, reference_geo)
+            results.append((name, pool.apply_async(preview.write_preview, (
+                os.path.join(directory, '%s_normal.png' % name), os.path.join(directory, '%s_miss.png' % name),
+                bundle_samples, hit_normals))))
+        missed = [(name, result.get()) for name, result in results]
+    finally:
+        pool.terminate()
+
+    details = ['%s: %.1f%% of texels missed' % (name, 100 * ratio) for name, ratio in missed if ratio > 0]
+    message = 'Preview of %d bundles was baked to %s.' % (len(missed), directory)
+    if details:
+        message += ' Rays missed the reference in %d bundles.' % len(details)
+    hou.ui.displayMessage(message, details='\n'.join(details + skipped) or None)
+
+
+def get_manifest(control_node):
+    """Returns the bundle manifest stored in user data of the control node.
+    The manifest is a dictionary holding per-bundle bookkeeping under the 'bundles' key and per-shard bookkeeping
+    under the 'shards' key. The returned dictionary is a fresh copy and can be modified and passed to set_manifest().
+    :type control_node: hou.ObjNode
+    :rtype: dict"""
+    manifest = control_node.userData(Dynamite.MANIFEST_USER_DATA)
+    if manifest is None:
+        return {'bundles': {}, 'shards': {}}
+    manifest = json.loads(manifest)
+    manifest.setdefault('shards', {})
+    return manifest
+
+
+def set_manifest(control_node, manifest):
+    """Stores the bundle manifest in user data of the control node.
+    :type control_node: hou.ObjNode
+    :type manifest: dict"""
+    control_node.setUserData(Dynamite.MANIFEST_USER_DATA, json.dumps(manifest, sort_keys=True))
+
+
+_manifest_cache = {}
+
+
+def get_bundle_record(prim_group_name, control_node):
+    """Returns a read-only manifest record of a bundle, or None if the bundle isn't registered.
+    Parsed manifests are cached, so that path lookups of many bundles don't parse the manifest over and over.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode
+    :rtype: dict"""
+    raw_manifest = control_node.userData(Dynamite.MANIFEST_USER_DATA)
+    cached = _manifest_cache.get(control_node.path())
+    if cached is None or cached[0] != raw_manifest:
+        cached = (raw_manifest, get_manifest(control_node))
+        _manifest_cache[control_node.path()] = cached
+    return cached[1]['bundles'].get(prim_group_name)
+
+
+def get_shard_name(prim_group_name, control_node):
+    """Returns name of the shard subnet a new bundle belongs to, according to the current sharding settings.
+    Returns an empty string if the network is flat.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode
+    :rtype: str"""
+    shard_mode = control_node.parm('shard_mode').evalAsString()
+    if shard_mode == 'prefix':
+        separator = control_node.parm('shard_separator').eval() or '_'
+        category = prim_group_name.split(separator, 1)[0]
+    elif shard_mode == 'category':
+        category = Dynamite.DEFAULT_SHARD
+        for rule in control_node.parm('shard_categories').eval().splitlines():
+            rule = rule.split()
+            if len(rule) >= 2 and fnmatch.fnmatchcase(prim_group_name, rule[0]):
+                category = rule[1]
+                break
+    else:
+        return ''
+    return Dynamite.SHARD_PREFIX + re.sub(r'[^A-Za-z0-9_]', '_', category or Dynamite.DEFAULT_SHARD)
+
+
+def get_bundle_location(prim_group_name, control_node):
+    """Returns path of the network which contains objects of a given bundle.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode
+    :rtype: str"""
+    network_location = control_node.parm('network_location').eval()
+    record = get_bundle_record(prim_group_name, control_node)
+    shard_name = record.get('shard', '') if record is not None else get_shard_name(prim_group_name, control_node)
+    return '%s/%s' % (network_location, shard_name) if shard_name else network_location
+
+
+def get_bundle_obj(prim_group_name, group_type, control_node):
+    """Returns retopo, reference or cage object of a given bundle.
+    :type prim_group_name: str
+    :type group_type: str
+    :type control_node: hou.ObjNode
+    :rtype: hou.ObjNode"""
+    return hou.node('%s/%s_%s' % (get_bundle_location(prim_group_name, control_node), prim_group_name, group_type))
+
+
+def get_shard_paths(control_node):
+    """Returns sorted paths of all shard subnets. Returns an empty list if the network is flat.
+    :type control_node: hou.ObjNode
+    :rtype: list[str]"""
+    network_location = control_node.parm('network_location').eval()
+    return ['%s/%s' % (network_location, shard_name) for shard_name in sorted(get_manifest(control_node)['shards'])]
+
+
+def register_bundles(prim_group_names, control_node):
+    """Registers bundles which aren't in the manifest yet. Each bundle is assigned a shard and a network editor row
+    inside it. Rows released by removed bundles are reused first, in sorted order, then new rows are appended after
+    the last one. Rows of existing bundles never change. Shards are registered the same way in the top-level network.
+    Returns a list of shards which have been registered by this call.
+    :type prim_group_names: list[str]
+    :type control_node: hou.ObjNode
+    :rtype: list[str]"""
+    manifest = get_manifest(control_node)
+    bundles = manifest['bundles']
+    shards = manifest['shards']
+
+    used_bundle_rows = {}
+    for record in bundles.values():
+        used_bundle_rows.setdefault(record.get('shard', ''), set()).add(record['row'])
+    used_shard_rows = set(record['row'] for record in shards.values())
+
+    def allocate_row(used_rows):
+        row = 0
+        while row in used_rows:
+            row += 1
+        used_rows.add(row)
+        return row
+
+    new_shards = []
+    for prim_group_name in sorted(prim_group_names):
+        if prim_group_name in bundles:
+            continue
+        shard_name = get_shard_name(prim_group_name, control_node)
+        if shard_name and shard_name not in shards:
+            shards[shard_name] = {'row': allocate_row(used_shard_rows)}
+            new_shards.append(shard_name)
+        bundles[prim_group_name] = {'row': allocate_row(used_bundle_rows.setdefault(shard_name, set())),
+                                    'shard': shard_name}
+    set_manifest(control_node, manifest)
+    return new_shards
+
+
+def unregister_bundle(prim_group_name, control_node):
+    """Removes a bundle from the manifest, so that its row can be reused. If it was the last bundle of its shard,
+    the shard is unregistered too and its name is returned. Otherwise returns an empty string.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode
+    :rtype: str"""
+    manifest = get_manifest(control_node)
+    record = manifest['bundles'].pop(prim_group_name, None)
+    shard_name = record.get('shard', '') if record is not None else ''
+    released_shard = ''
+    if shard_name and not [bundle for bundle in manifest['bundles'].values() if bundle.get('shard') == shard_name]:
+        manifest['shards'].pop(shard_name, None)
+        released_shard = shard_name
+    set_manifest(control_node, manifest)
+    return released_shard
+
+
+def read_geometry_stats(node, previous=None):
+    """Returns statistics of the geometry of a SOP: element counts, bounding box, memory use, content key and cook
+    time. Apart from the content key (see geo_io.geometry_key()), only intrinsics are read. The cook time is measured
+    when reading the geometry cooks the node; otherwise the previous one is kept. If the content key matches the
+    previous statistics, they are returned as they are.
+    :type node: hou.SopNode
+    :type previous: dict
+    :rtype: dict"""
+    needs_to_cook = node.needsToCook()
+    start = time.time()
+    geo = node.geometry()
+    cook_seconds = time.time() - start if needs_to_cook else None
+    key = geo_io.geometry_key(geo)
+    if previous is not None and previous.get('key') == key:
+        if cook_seconds is None:
+            return previous
+        return dict(previous, cook_seconds=cook_seconds)
+    return {'key': key,
+            'points': geo.intrinsicValue('pointcount'),
+            'primitives': geo.intrinsicValue('primitivecount'),
+            'vertices': geo.intrinsicValue('vertexcount'),
+            'bounds': list(geo.intrinsicValue('bounds')),
+            'memory': geo.intrinsicValue('memoryusage'),
+            'cook_seconds': cook_seconds if cook_seconds is not None else (previous or {}).get('cook_seconds')}
+
+
+def refresh_bundle_stats(control_node):
+    """Updates statistics of retopo, reference and cage objects of all bundles in the manifest (see
+    read_geometry_stats()) and shows them on the stats tab.
+    :type control_node: hou.ObjNode"""
+    manifest = get_manifest(control_node)
+    for name in get_current_prim_groups(control_node) or []:
+        record = manifest['bundles'].get(name)
+        if record is None:
+            continue
+        stats = record.setdefault('stats', {})
+        for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+            obj_node = get_bundle_obj(name, group_type, control_node)
+            if obj_node is not None and obj_node.displayNode() is not None:
+                stats[group_type] = read_geometry_stats(obj_node.displayNode(), stats.get(group_type))
+    set_manifest(control_node, manifest)
+    show_bundle_stats(control_node)
+
+
+def bundle_costs(control_node):
+    """Returns (name, polygons, memory, cook seconds) tuples of all bundles with statistics, ordered by the sort
+    parameter of the stats tab. Costs are totals of the retopo, reference and cage objects.
+    :type control_node: hou.ObjNode
+    :rtype: list[tuple]"""
+    costs = []
+    for name, record in get_manifest(control_node)['bundles'].items():
+        stats = record.get('stats', {}).values()
+        if stats:
+            costs.append((name, sum(entry['primitives'] for entry in stats), sum(entry['memory'] for entry in stats),
+                          sum(entry['cook_seconds'] or 0.0 for entry in stats)))
+    sort_index = ('name', 'polygons', 'memory', 'cook').index(control_node.parm('stats_sort').evalAsString())
+    return sorted(costs, key=lambda cost: cost[sort_index], reverse=sort_index > 0)
+
+
+def show_bundle_stats(control_node):
+    """Fills the statistics table of the stats tab from the manifest.
+    :type control_node: hou.ObjNode"""
+    manifest = get_manifest(control_node)
+    lines = ['%-24s %10s %10s %10s %10s %9s %8s' % ('Bundle', 'Retopo', 'Reference', 'Cage', 'Points', 'Memory',
+                                                  'Cook')]
+    for name, polygons, memory, cook_seconds in bundle_costs(control_node):
+        stats = manifest['bundles'][name]['stats']
+        counts = [stats[group_type]['primitives'] if group_type in stats else 0
+                  for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP)]
+        points = sum(entry['points'] for entry in stats.values())
+        lines.append('%-24s %10d %10d %10d %10d %7.1fMB %7.2fs' % (
+            (name,) + tuple(counts) + (points, memory / 1048576.0, cook_seconds)))
+    control_node.parm('bundle_stats').set('\n'.join(lines))
+
+
+def read_cached_geometry(control_node):
+    """Returns (node, bundle name, memory in bytes, geometry) of every SOP of the network which holds cooked
+    geometry. Nodes which need to cook hold no valid geometry and are skipped, so that the audit doesn't cook
+    anything. The bundle name is empty for nodes outside bundle objects.
+    :type control_node: hou.ObjNode
+    :rtype: list[tuple]"""
+    bundle_objects = {}
+    for name in get_current_prim_groups(control_node) or []:
+        for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+            bundle_objects['%s_%s' % (name, group_type)] = name
+    entries = []
+    for node in hou.node(control_node.parm('network_location').eval()).allSubChildren():
+        if not isinstance(node, hou.SopNode) or node.needsToCook():
+            continue
+        geo = node.geometry()
+        if geo is None:
+            continue
+        obj_node = node.parent()
+        while not isinstance(obj_node, hou.ObjNode):
+            obj_node = obj_node.parent()
+        entries.append((node, bundle_objects.get(obj_node.name(), ''), geo.intrinsicValue('memoryusage'), geo))
+    return entries
+
+
+def find_duplicate_stages(entries):
+    """Returns lists of nodes whose cached geometry is the same, including topology, attributes and groups (see
+    geo_io.geometry_digest()). Geometry is only hashed when its element counts match another node's, since hashing
+    reads all attribute values.
+    :type entries: list[tuple]
+    :rtype: list[list[hou.SopNode]]"""
+    by_counts = {}
+    for node, _, _, geo in entries:
+        counts = tuple(geo.intrinsicValue(name) for name in ('pointcount', 'primitivecount', 'vertexcount'))
+        if counts[0]:
+            by_counts.setdefault(counts, []).append((node, geo))
+    by_key = {}
+    for candidates in by_counts.values():
+        if len(candidates) > 1:
+            for node, geo in candidates:
+                by_key.setdefault(geo_io.geometry_digest(geo), []).append(node)
+    return sorted((nodes for nodes in by_key.values() if len(nodes) > 1), key=lambda nodes: nodes[0].path())
+
+
+def get_intermediate_sops(control_node):
+    """Returns SOPs of the source objects which only feed other nodes: the temporary update chain and every stage
+    before the OUT node. They can be unloaded without affecting what the bundles use.
+    :type control_node: hou.ObjNode
+    :rtype: list[hou.SopNode]"""
+    nodes = []
+    for parm_name in ('retopo_source', 'reference_source'):
+        source_obj = hou.node(control_node.parm(parm_name).eval())
+        if source_obj is not None:
+            nodes += [node for node in source_obj.children() if node != source_obj.displayNode()]
+    return nodes
+
+
+def audit_memory(control_node):
+    """Reports memory held by cached geometry of the network per bundle and per node, and stages which hold the
+    same geometry. Memory of duplicates may be partly shared by Houdini, so it is an upper bound. Offers to set
+    unload flags of intermediate source stages, which frees their geometry once downstream nodes have cooked.
+    :type control_node: hou.ObjNode"""
+    entries = read_cached_geometry(control_node)
+    megabytes = 1048576.0
+    per_bundle = {}
+    for _, name, memory, _ in entries:
+        per_bundle[name] = per_bundle.get(name, 0) + memory
+    duplicates = find_duplicate_stages(entries)
+    memory_by_node = dict((node.path(), memory) for node, _, memory, _ in entries)
+    duplicate_memory = sum(memory_by_node[node.path()] for nodes in duplicates for node in nodes[1:])
+    intermediate = [node for node in get_intermediate_sops(control_node) if node.path() in memory_by_node]
+    intermediate_memory = sum(memory_by_node[node.path()] for node in intermediate)
+
+    lines = ['Per bundle:']
+    lines += ['%10.1f MB  %s' % (memory / megabytes, name or '(sources, outputs and displays)')
+              for name, memory in sorted(per_bundle.items(), key=lambda item: -item[1])]
+    lines += ['', 'Per node:']
+    lines += ['%10.1f MB  %s' % (memory / megabytes, node.path())
+              for node, _, memory, _ in sorted(entries, key=lambda entry: -entry[2])]
+    if duplicates:
+        lines += ['', 'Stages holding the same geometry:']
+        lines += [', '.join(node.path() for node in nodes) for nodes in duplicates]
+    summary = '%.1f MB of cached geometry in %d nodes, %.1f MB of it in duplicate stages.' % (
+        sum(memory_by_node.values()) / megabytes, len(entries), duplicate_memory / megabytes)
+
+    if not intermediate:
+        hou.ui.displayMessage(summary, title='Dynamite: Memory Audit', details='\n'.join(lines))
+        return
+    summary += '\n%d intermediate source stages hold %.1f MB and can be unloaded.' % (
+        len(intermediate), intermediate_memory / megabytes)
+    choice = hou.ui.displayMessage(summary, buttons=('Unload Intermediate Stages', 'Close'), default_choice=1,
+                                   close_choice=1, title='Dynamite: Memory Audit', details='\n'.join(lines))
+    if choice == 0:
+        for node in intermediate:
+            node.setUnloadFlag(True)
+
+
+def bundle_menu_items(control_node):
+    """Returns items of the bundle menu of the edit tab. Bundles are ordered like the statistics table, and labeled
+    with their polygon counts when they are sorted by cost. Bundles without statistics come last.
+    :type control_node: hou.ObjNode
+    :rtype: list[str]"""
+    names = get_current_prim_groups(control_node) or []
+    costs = [cost for cost in bundle_costs(control_node) if cost[0] in names]
+    sort_by_cost = control_node.parm('stats_sort').evalAsString() != 'name' if costs else False
+    items = []
+    for cost in costs:
+        items += [cost[0], '%s (%d polygons)' % (cost[0], cost[1]) if sort_by_cost else cost[0]]
+    ranked = set(cost[0] for cost in costs)
+    for name in names:
+        if name not in ranked:
+            items += [name, name]
+    return items
+
+
+def grid_position(origin, column, row):
+    """Returns position of a network editor grid cell. Row 0 is the header row holding source, output and display
+    objects, bundle and shard rows start below it.
+    :type origin: hou.Vector2
+    :type column: int
+    :type row: int
+    :rtype: hou.Vector2"""
+    return hou.Vector2(origin[0] + column * Dynamite.OBJ_COLUMN_WIDTH, origin[1] - (row + 1) * Dynamite.OBJ_ROW_HEIGHT)
+
+
+def place_bundle(prim_group_name, control_node):
+    """Moves retopo, reference and cage objects of a bundle to their grid row. In a flat network the grid hangs under
+    the control node, inside shards it starts below shard outputs.
+    :type prim_group_name: str
+    :type control_node: hou.ObjNode"""
+    record = get_bundle_record(prim_group_name, control_node)
+    origin = hou.Vector2(0, 0) if record.get('shard') else control_node.position()
+    for column, group_type in enumerate((Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP)):
+        obj_node = get_bundle_obj(prim_group_name, group_type, control_node)
+        if obj_node is not None:
+            obj_node.setPosition(grid_position(origin, column, record['row'] + 1))
+
+
+def place_network_header(control_node):
+    """Moves source, output and display objects to the header row of the grid, and shards below it.
+    :type control_node: hou.ObjNode"""
+    origin = control_node.position()
+    parm_names = ('retopo_source', 'reference_source', 'retopo_output_obj', 'reference_output_obj',
+                  'cage_output_obj', 'reference_display_obj', 'cage_display_obj')
+    for column, parm_name in enumerate(parm_names):
+        node = hou.node(control_node.parm(parm_name).eval())
+        if node is not None:
+            node.setPosition(grid_position(origin, column, 0))
+
+    network_location = control_node.parm('network_location').eval()
+    for shard_name, record in get_manifest(control_node)['shards'].items():
+        shard = hou.node('%s/%s' % (network_location, shard_name))
+        if shard is not None:
+            shard.setPosition(grid_position(origin, 0, record['row'] + 1))
+
+
+def place_nodes(*placements):
+    """Places operators inside a network on a fixed grid, instead of relying on layoutChildren().
+    Arguments:
+        placements - (node, column, row) tuples.
+    :type placements: tuple"""
+    for node, column, row in placements:
+        node.setPosition(hou.Vector2(column * Dynamite.SOP_COLUMN_WIDTH, -row * Dynamite.SOP_ROW_HEIGHT))
 
 
 def path_exists(path):
@@ -1272,15 +2667,6 @@ def get_current_network_editor(desktop):
             return pane
 
 
-def get_multiparm_index(multi_parm, path):
-    """Returns an index of a multiparm item."""
-    parms = multi_parm.multiParmInstances()
-    obj_paths = [parm for parm in parms if 'objpath' in parm.name()]
-    for parm in obj_paths:
-        if path in parm.evalAsString():
-            index = parm.multiParmInstanceIndices()[0] / 4  # TODO: Remove the assignment.
-
-
 def get_prim_group_names(geo, sort=True):
     """Returns a list of primitive groups in a given hou.Geometry. Sorts the list if sorted=True.
     :type geo: hou.Geometry
@@ -1358,23 +2744,115 @@ def primitive_groups_match(geo1, geo2):
 
 
 def reset_cage(prim_group_name, control_node):
-    """Removes the cage group of a specific primitive group and recreates it from scratch.
+    """Resets the cage of a specific primitive group to default: clears its offset array, removes its Edit SOP and
+    resets its peak and translation. Cages created before offset arrays were introduced are recreated from scratch.
     :type prim_group_name: str
     :type control_node: hou.ObjNode"""
-    network_location = control_node.parm('network_location').eval()
-    reference_obj = hou.node('%s/%s_reference' % (network_location, prim_group_name))
-    cage_node = hou.node('%s/%s_cage' % (network_location, prim_group_name))
-    position = cage_node.position()
-    cage_node.destroy()
-    retopo_source_out_sop = hou.node(control_node.parm('retopo_source_out').eval())
-    prim_group = find_prim_group(prim_group_name, retopo_source_out_sop.geometry().primGroups())
-    cage_obj = create_cage_group(prim_group, control_node)
-    cage_obj.setPosition(position)
-    cage_obj.setInput(0, reference_obj)
+    transaction = NetworkTransaction('Dynamite: Reset Cage')
+    with transaction:
+        cage_node = get_bundle_obj(prim_group_name, Dynamite.CAGE_GROUP, control_node)
+        offsets = cage_node.node('%s_offsets' % prim_group_name)
+        if offsets is not None:
+            set_cage_offsets(offsets, None)
+            remove_cage_edit(cage_node, prim_group_name)
+            if control_node.userData(Dynamite.EDITING_USER_DATA) == prim_group_name:
+                control_node.destroyUserData(Dynamite.EDITING_USER_DATA)
+        else:
+            reference_obj = get_bundle_obj(prim_group_name, Dynamite.REFERENCE_GROUP, control_node)
+            position = cage_node.position()
+            cage_node.destroy()
+            retopo_source_out_sop = hou.node(control_node.parm('retopo_source_out').eval())
+            prim_group = find_prim_group(prim_group_name, retopo_source_out_sop.geometry().primGroups())
+            cage_node = create_cage_group(prim_group, control_node)
+            cage_node.setPosition(position)
+            cage_node.setInput(0, reference_obj)
+            add_bundle_to_outputs(prim_group_name, control_node, [Dynamite.CAGE_GROUP])
+        transaction.cook_on_commit(cage_node.displayNode())
+
+        # Reset cage-specific bundle parameters.
+        retopo_obj = get_bundle_obj(prim_group_name, Dynamite.RETOPO_GROUP, control_node)
+        retopo_obj.parmTuple('dynamite_translate').set((0, 0, 0))
+        retopo_obj.parm('dynamite_peak_dist').set(0)
+        if retopo_obj.parm('dynamite_relax_iterations') is not None:
+            retopo_obj.parm('dynamite_relax_iterations').set(0)
+        if control_node.parm('active_bundle').eval() == prim_group_name:
+            load_active_bundle(control_node)
+
+
+def get_cage_topologies(control_node):
+    """Returns topology digests of cages of all bundles, keyed by bundle names. Cages have the topology of their
+    retopo groups, so the retopo source is read once instead of every cage.
+    :type control_node: hou.ObjNode
+    :rtype: dict[str, str]"""
+    retopo_geo = hou.node(control_node.parm('retopo_source_out').eval()).geometry()
+    return dict((name, signature['topology']) for name, signature in geo_io.group_signatures(retopo_geo).items())
 
-    # Reset cage-specific control node parameters.
-    control_node.parmTuple('%s_translate' % prim_group_name).set((0, 0, 0))
-    control_node.parm('%s_peak_dist' % prim_group_name).set(0)
+
+def save_cage_state(control_node):
+    """Saves the cage work of all bundles to the cage state file of the control node. Pending edits are baked first.
+    :type control_node: hou.ObjNode"""
+    bake_pending_edits(control_node)
+    topologies = get_cage_topologies(control_node)
+    states = []
+    for name in get_current_prim_groups(control_node) or []:
+        retopo_obj = get_bundle_obj(name, Dynamite.RETOPO_GROUP, control_node)
+        offsets_node = get_bundle_obj(name, Dynamite.CAGE_GROUP, control_node).node('%s_offsets' % name)
+        relax = (0, 0.5)
+        if retopo_obj.parm('dynamite_relax_iterations') is not None:
+            relax = (retopo_obj.parm('dynamite_relax_iterations').eval(),
+                     retopo_obj.parm('dynamite_relax_strength').eval())
+        states.append(snapshot.CageState(name, topologies.get(name, ''), retopo_obj.parm('dynamite_peak_dist').eval(),
+                                         retopo_obj.parmTuple('dynamite_translate').eval(),
+                                         retopo_obj.parm('dynamite_iterations').eval(),
+                                         get_cage_offsets(offsets_node) if offsets_node is not None else None,
+                                         *relax))
+    path = control_node.parm('cage_state_path').eval()
+    writers.prepare_directory(path)
+    snapshot.write_snapshot(path, states)
+
+
+def load_cage_state(control_node):
+    """Restores the cage work of all bundles from the cage state file of the control node. Bundles which don't exist
+    or whose cage topology has changed since the file was saved are skipped and reported.
+    :type control_node: hou.ObjNode"""
+    path = control_node.parm('cage_state_path').eval()
+    if not os.path.isfile(path):
+        hou.ui.displayMessage("ERROR: Cage state file doesn't exist.")
+        return
+    states = snapshot.read_snapshot(path)
+    topologies = get_cage_topologies(control_node)
+    skipped = []
+    transaction = NetworkTransaction('Dynamite: Load Cage State')
+    with transaction:
+        bake_pending_edits(control_node)
+        for state in states:
+            if state.name not in topologies:
+                skipped.append('%s: no such bundle' % state.name)
+                continue
+            if state.topology != topologies[state.name]:
+                skipped.append('%s: topology has changed' % state.name)
+                continue
+            retopo_obj = get_bundle_obj(state.name, Dynamite.RETOPO_GROUP, control_node)
+            cage_obj = get_bundle_obj(state.name, Dynamite.CAGE_GROUP, control_node)
+            offsets_node = cage_obj.node('%s_offsets' % state.name)
+            if offsets_node is None:
+                skipped.append('%s: the cage needs to be reset first' % state.name)
+                continue
+            retopo_obj.parm('dynamite_peak_dist').set(state.peak_dist)
+            retopo_obj.parmTuple('dynamite_translate').set(state.translate)
+            retopo_obj.parm('dynamite_iterations').set(state.iterations)
+            if retopo_obj.parm('dynamite_relax_iterations') is not None:
+                retopo_obj.parm('dynamite_relax_iterations').set(state.relax_iterations)
+                retopo_obj.parm('dynamite_relax_strength').set(state.relax_strength)
+            set_cage_offsets(offsets_node, state.offsets)
+            remove_cage_edit(cage_obj, state.name)
+        load_active_bundle(control_node)
+        for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+            transaction.cook_on_commit(hou.node(control_node.parm('%s_output_obj' % group_type).eval()).displayNode())
+
+    if skipped:
+        hou.ui.displayMessage('Cage state of %d of %d bundles was restored, %d were skipped.' % (
+            len(states) - len(skipped), len(states), len(skipped)), details='\n'.join(skipped))
 
 
 def set_default_folders_hidden(parm_template_group, hide=True):
@@ -1394,205 +2872,500 @@ def set_group_display(prim_group_names, show_retopo, show_reference, show_cage,
     :type show_reference: bool
     :type show_cage: bool
     :type control_node: hou.ObjNode"""
-    network_location = control_node.parm('network_location').eval()
     for prim_group_name in prim_group_names:
-        retopo_obj = hou.node('%s/%s_retopo' % (network_location, prim_group_name))
-        reference_obj = hou.node('%s/%s_reference' % (network_location, prim_group_name))
-        cage_obj = hou.node('%s/%s_cage' % (network_location, prim_group_name))
+        get_bundle_obj(prim_group_name, Dynamite.RETOPO_GROUP, control_node).setDisplayFlag(show_retopo)
+        get_bundle_obj(prim_group_name, Dynamite.REFERENCE_GROUP, control_node).setDisplayFlag(show_reference)
+        get_bundle_obj(prim_group_name, Dynamite.CAGE_GROUP, control_node).setDisplayFlag(show_cage)
+    if control_node.parm('active_bundle').eval() in prim_group_names:
+        load_active_bundle(control_node)
 
-        retopo_obj.setDisplayFlag(show_retopo)
-        reference_obj.setDisplayFlag(show_reference)
-        cage_obj.setDisplayFlag(show_cage)
 
-        retopo_display_toggle = control_node.parm('%s_retopo_display' % prim_group_name)
-        reference_display_toggle = control_node.parm('%s_reference_display' % prim_group_name)
-        cage_display_toggle = control_node.parm('%s_cage_display' % prim_group_name)
-        retopo_display_toggle.set(show_retopo)
-        reference_display_toggle.set(show_reference)
-        cage_display_toggle.set(show_cage)
+def set_merged_display(show_reference, show_cage, control_node):
+    """Sets visibility of the whole-asset reference and cage display objects.
+    :type show_reference: bool
+    :type show_cage: bool
+    :type control_node: hou.ObjNode"""
+    for parm_name, show in (('reference_display_obj', show_reference), ('cage_display_obj', show_cage)):
+        display_obj = hou.node(control_node.parm(parm_name).eval())
+        if display_obj is not None:
+            display_obj.setDisplayFlag(show)
 
 
-def toggle_obj_display(node, control_node, parm_name):
-    """Toggles display flag of a given hou.ObjNode and updates its corresponding display checkbox in the control node.
-    :type node: hou.ObjNode
+def show_all(show_reference, show_cage, control_node):
+    """Displays reference and/or cage meshes of all bake groups through the merged display objects.
+    Individual bake group objects are hidden, so that the viewport draws two objects instead of 2N.
+    :type show_reference: bool
+    :type show_cage: bool
+    :type control_node: hou.ObjNode"""
+    prim_group_names = get_current_prim_groups(control_node) or []
+    set_group_display(prim_group_names, False, False, False, control_node)
+    apply_polygon_budget(show_reference, show_cage, control_node)
+    set_merged_display(show_reference, show_cage, control_node)
+
+
+def viewport_camera_position():
+    """Returns the camera position of the current viewport, or None if Houdini runs without its UI.
+    :rtype: hou.Vector3"""
+    if not hou.isUIAvailable():
+        return None
+    viewer = toolutils.sceneViewer()
+    if viewer is None:
+        return None
+    return hou.Vector3(0, 0, 0) * viewer.curViewport().viewTransform()
+
+
+def bundle_display_costs(prim_group_names, group_types, control_node):
+    """Returns (name, polygons, center, radius) of given bundles, summed over or enclosing their objects of given
+    types. Only intrinsics of the objects are read.
+    :type prim_group_names: list[str]
+    :type group_types: tuple[str]
     :type control_node: hou.ObjNode
-    :type parm_name: str"""
-    if node.isDisplayFlagSet():
-        node.setDisplayFlag(False)
-        control_node.parm(parm_name).set(0)
-    else:
-        node.setDisplayFlag(True)
-        control_node.parm(parm_name).set(1)
+    :rtype: list[tuple]"""
+    costs = []
+    for name in prim_group_names:
+        polygons = 0
+        bounds = []
+        for group_type in group_types:
+            geo = get_bundle_obj(name, group_type, control_node).displayNode().geometry()
+            polygons += geo.intrinsicValue('primitivecount')
+            bounds.append(geo.intrinsicValue('bounds'))
+        bounds = np.array(bounds, dtype=np.float64).reshape(-1, 3, 2)
+        lower, upper = bounds[:, :, 0].min(axis=0), bounds[:, :, 1].max(axis=0)
+        costs.append((name, polygons, (lower + upper) / 2, float(np.linalg.norm(upper - lower)) / 2))
+    return costs
+
+
+def apply_polygon_budget(show_reference, show_cage, control_node):
+    """Draws bundles within the polygon budget of the control node in full and the rest of them as bounding boxes
+    in the merged display objects. Bundles are drawn in order of priority: the active bundle first, then bundles
+    which are largest on screen, i.e. large and near the camera. Without a viewport, larger bundles come first.
+    The budget is applied when the display is switched, so moving the camera doesn't change it.
+    :type show_reference: bool
+    :type show_cage: bool
+    :type control_node: hou.ObjNode"""
+    group_types = tuple(group_type for group_type, show in ((Dynamite.REFERENCE_GROUP, show_reference),
+                                                              (Dynamite.CAGE_GROUP, show_cage)) if show)
+    budget = control_node.parm('polygon_budget').eval() if control_node.parm('polygon_budget') is not None else 0
+    proxies = []
+    if budget and group_types:
+        camera = viewport_camera_position()
+        active = control_node.parm('active_bundle').eval()
+
+        def priority(cost):
+            name, _, center, radius = cost
+            screen_size = radius
+            if camera is not None:
+                distance = np.linalg.norm(center - np.array(tuple(camera)))
+                screen_size = radius / max(distance - radius, radius * 0.01, 1e-6)
+            return name != active, -screen_size
+
+        drawn = 0
+        for name, polygons, _, _ in sorted(bundle_display_costs(get_current_prim_groups(control_node) or [],
+                                                                group_types, control_node), key=priority):
+            # The first bundle is always drawn in full, and once the budget is reached, only boxes follow.
+            if proxies or (drawn and drawn + polygons > budget):
+                proxies.append(name)
+            else:
+                drawn += polygons
+    for parm_name, group_type in (('reference_display_obj', Dynamite.REFERENCE_GROUP),
+                                  ('cage_display_obj', Dynamite.CAGE_GROUP)):
+        display_obj = hou.node(control_node.parm(parm_name).eval())
+        budget_sop = display_obj.node('budget') if display_obj is not None else None
+        if budget_sop is not None:
+            budget_sop.parm('proxies').set(' '.join('%s_%s' % (name, group_type) for name in proxies))
 
 
-def update_network(control_node):
-    """Updates all bake groups. Deletes groups that are missing in the new asset version, adds those that are new.
+def isolate_group(prim_group_name, control_node):
+    """Isolates reference and cage objects of a given bake group from all the others and homes the viewport on them.
+    :type prim_group_name: str
     :type control_node: hou.ObjNode"""
-    network_location = control_node.parm('network_location').eval()
-    retopo_file = hou.node(control_node.parm('retopo_source_file_sop').eval())
-    reference_file = hou.node(control_node.parm('reference_source_file_sop').eval())
-    retopo_temp = hou.node(control_node.parm('retopo_source_temp_file_sop').eval())
-    reference_temp = hou.node(control_node.parm('reference_source_temp_file_sop').eval())
-    retopo_source_out = hou.node(control_node.parm('retopo_source_out').eval())
-    retopo_source_temp_out = hou.node('%s/OUT_TEMP' % (control_node.parm('retopo_source').eval()))
-    reference_source_out = hou.node(control_node.parm('reference_source_out').eval())
-    reference_source_temp_out = hou.node('%s/OUT_TEMP' % (control_node.parm('reference_source').eval()))
-    retopo_is_fbx_temp_switch = hou.node('%s/is_fbx_temp' % (control_node.parm('retopo_source').eval()))
-    reference_is_fbx_temp_switch = hou.node('%s/is_fbx_temp' % (control_node.parm('reference_source').eval()))
-
-    retopo_temp.parm('file').set(control_node.parm('retopo_source_path').eval())
-    reference_temp.parm('file').set(control_node.parm('reference_source_path').eval())
-
-    retopo_temp.parm('reload').pressButton()
-    reference_temp.parm('reload').pressButton()
-
-    retopo_temp.cook()
-    reference_temp.cook()
+    prim_group_names = get_current_prim_groups(control_node) or []
+    set_merged_display(False, False, control_node)
+    set_group_display(prim_group_names, False, False, False, control_node)
+    set_group_display((prim_group_name,), False, True, True, control_node)
+    home()
 
-    if is_path_fbx(control_node.parm('retopo_source_path').eval()):
-        retopo_is_fbx_temp_switch.parm('input').set(1)
-    else:
-        retopo_is_fbx_temp_switch.parm('input').set(0)
-    if is_path_fbx(control_node.parm('reference_source_path').eval()):
-        reference_is_fbx_temp_switch.parm('input').set(1)
-    else:
-        reference_is_fbx_temp_switch.parm('input').set(0)
 
-    if not primitive_groups_match(retopo_source_temp_out.geometry(), reference_source_temp_out.geometry()):
+def add_bundle_parms(obj_node):
+    """Adds bundle-specific parameters to a retopo object. They are driven by the active bundle editor of the control
+    node, and can be keyframed directly on the object.
+    :type obj_node: hou.ObjNode"""
+    help = "How many iterations to subdivide, higher numbers give a smoother surface."
+    iterations = hou.IntParmTemplate('dynamite_iterations', 'Iterations', 1, default_value=(0,), help=help)
+
+    help = "Translates the whole bake group."
+    translate = hou.FloatParmTemplate('dynamite_translate', 'Translate', 3, default_value=(0, 0, 0), help=help)
+
+    help = "Offset distance of the cage from the retopo surface."
+    peak_dist = hou.FloatParmTemplate('dynamite_peak_dist', 'Peak Distance', 1, max=1.0, help=help)
+
+    help = "How many times to relax the cage, smoothing out crumpled regions while keeping its topology."
+    relax_iterations = hou.IntParmTemplate('dynamite_relax_iterations', 'Relax Iterations', 1, max=50,
+                                           default_value=(0,), help=help)
+
+    help = "How much every relax iteration smooths the cage."
+    relax_strength = hou.FloatParmTemplate('dynamite_relax_strength', 'Relax Strength', 1, default_value=(0.5,),
+                                           min=0.0, max=1.0, min_is_strict=True, max_is_strict=True, help=help)
+
+    parm_template_group = obj_node.parmTemplateGroup()
+    parm_template_group.append(hou.FolderParmTemplate('dynamite_folder', 'Dynamite',
+                                                      (iterations, translate, peak_dist, relax_iterations,
+                                                       relax_strength)))
+    obj_node.setParmTemplateGroup(parm_template_group)
+
+
+def load_active_bundle(control_node):
+    """Loads values of the active bundle into the bundle editor of the control node. Pending edits of another
+    cage are baked.
+    :type control_node: hou.ObjNode"""
+    prim_group_name = control_node.parm('active_bundle').eval()
+    bake_pending_edits(control_node, keep=prim_group_name)
+    retopo_obj = get_bundle_obj(prim_group_name, Dynamite.RETOPO_GROUP, control_node) if prim_group_name else None
+    if retopo_obj is None:
         return
-    retopo_file.parm('file').set(control_node.parm('retopo_source_path').eval())
-    reference_file.parm('file').set(control_node.parm('reference_source_path').eval())
+    control_node.parm('active_iterations').set(retopo_obj.parm('dynamite_iterations').eval())
+    control_node.parmTuple('active_translate').set(retopo_obj.parmTuple('dynamite_translate').eval())
+    control_node.parm('active_peak_dist').set(retopo_obj.parm('dynamite_peak_dist').eval())
+    if retopo_obj.parm('dynamite_relax_iterations') is not None:
+        control_node.parm('active_relax_iterations').set(retopo_obj.parm('dynamite_relax_iterations').eval())
+        control_node.parm('active_relax_strength').set(retopo_obj.parm('dynamite_relax_strength').eval())
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        obj_node = get_bundle_obj(prim_group_name, group_type, control_node)
+        control_node.parm('active_%s_display' % group_type).set(obj_node.isDisplayFlagSet())
+
+
+def store_active_bundle(control_node):
+    """Stores values of the bundle editor of the control node on the retopo object of the active bundle.
+    :type control_node: hou.ObjNode"""
+    prim_group_name = control_node.parm('active_bundle').eval()
+    retopo_obj = get_bundle_obj(prim_group_name, Dynamite.RETOPO_GROUP, control_node) if prim_group_name else None
+    if retopo_obj is None:
+        return
+    retopo_obj.parm('dynamite_iterations').set(control_node.parm('active_iterations').eval())
+    retopo_obj.parmTuple('dynamite_translate').set(control_node.parmTuple('active_translate').eval())
+    retopo_obj.parm('dynamite_peak_dist').set(control_node.parm('active_peak_dist').eval())
+    if retopo_obj.parm('dynamite_relax_iterations') is not None:
+        retopo_obj.parm('dynamite_relax_iterations').set(control_node.parm('active_relax_iterations').eval())
+        retopo_obj.parm('dynamite_relax_strength').set(control_node.parm('active_relax_strength').eval())
 
-    parm_template_group = control_node.parmTemplateGroup()
 
-    old_prim_group_names = control_node.parm('prim_groups').eval().split(' ')
-    new_prim_group_names = get_prim_group_names(retopo_is_fbx_temp_switch.geometry())
-
-    # Remove non-existing bake bundles.
-    retopo_output_object_merge = hou.node('%s/object_merge' % control_node.parm('retopo_output_obj').eval())
-    reference_output_object_merge = hou.node('%s/object_merge' % control_node.parm('reference_output_obj').eval())
-    cage_output_object_merge = hou.node('%s/object_merge' % control_node.parm('cage_output_obj').eval())
-
-    candidates_removal = sorted(list(set(old_prim_group_names) - set(new_prim_group_names)))
-    for candidate in candidates_removal:
-        # Remove corresponding multiParms from output nodes.
-        # Retopo output multiParm.
-        candidate_path = '%s/%s_retopo' % (network_location, candidate)
-        retopo_object_merge_multiparm = retopo_output_object_merge.parm('numobj')
-        remove_from_multiparm(retopo_object_merge_multiparm, 'objpath', candidate_path)
-        # Reference output multiParm.
-        candidate_path = '%s/%s_reference' % (network_location, candidate)
-        reference_object_merge_multiparm = reference_output_object_merge.parm('numobj')
-        remove_from_multiparm(reference_object_merge_multiparm, 'objpath', candidate_path)
-        # Cage output multiParm.
-        candidate_path = '%s/%s_cage' % (network_location, candidate)
-        cage_object_merge_multiparm = cage_output_object_merge.parm('numobj')
-        remove_from_multiparm(cage_object_merge_multiparm, 'objpath', candidate_path)
-        # Remove the bake bundle.
-        hou.node('%s/%s_retopo' % (network_location, candidate)).destroy()
-        hou.node('%s/%s_reference' % (network_location, candidate)).destroy()
-        hou.node('%s/%s_cage' % (network_location, candidate)).destroy()
-        remove_from_current_prim_groups(control_node, candidate)
-        parm_template_group.remove('%s_folder' % candidate)
+def store_active_display(control_node):
+    """Sets display flags of the active bundle objects from the display toggles of the bundle editor.
+    Merged display objects are hidden when an individual object is shown, so that nothing is drawn twice.
+    :type control_node: hou.ObjNode"""
+    prim_group_name = control_node.parm('active_bundle').eval()
+    if not prim_group_name:
+        return
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        show = bool(control_node.parm('active_%s_display' % group_type).eval())
+        if show:
+            set_merged_display(False, False, control_node)
+        get_bundle_obj(prim_group_name, group_type, control_node).setDisplayFlag(show)
 
-    control_node.setParmTemplateGroup(parm_template_group)
 
-    # Add new bake bundles.
-    retopo_file.parm('reload').pressButton()
-    reference_file.parm('reload').pressButton()
-    candidates_add = sorted(list(set(new_prim_group_names) - set(old_prim_group_names)))
-    for candidate in candidates_add:
-        prim_group = retopo_source_out.geometry().findPrimGroup(candidate)
-        retopo_group = create_retopo_group(prim_group, control_node)
-        prim_group = reference_source_out.geometry().findPrimGroup(candidate)
-        reference_group = create_reference_group(prim_group, control_node)
-        prim_group = retopo_source_out.geometry().findPrimGroup(candidate)
-        cage_group = create_cage_group(prim_group, control_node)
-        reference_group.setInput(0, retopo_group)
-        cage_group.setInput(0, reference_group)
-
-        # Add corresponding multiParms to output nodes.
-        # TODO: Externalize to function.
-        # Retopo output multiparm.
-        candidate_path = '%s/%s_retopo' % (network_location, candidate)
-        retopo_object_merge_multiparm = retopo_output_object_merge.parm('numobj')
-        numobj = retopo_object_merge_multiparm.eval() + 1
-        retopo_object_merge_multiparm.set(numobj)
-        retopo_output_object_merge.parm('objpath%d' % numobj).set(candidate_path)
-
-        # Reference output multiparm.
-        candidate_path = '%s/%s_reference' % (network_location, candidate)
-        reference_object_merge_multiparm = reference_output_object_merge.parm('numobj')
-        numobj = reference_object_merge_multiparm.eval() + 1
-        reference_object_merge_multiparm.set(numobj)
-        reference_output_object_merge.parm('objpath%d' % numobj).set(candidate_path)
-
-        # Cage output multiparm.
-        candidate_path = '%s/%s_cage' % (network_location, candidate)
-        cage_object_merge_multiparm = cage_output_object_merge.parm('numobj')
-        numobj = cage_object_merge_multiparm.eval() + 1
-        cage_object_merge_multiparm.set(numobj)
-        cage_output_object_merge.parm('objpath%d' % numobj).set(candidate_path)
-
-        add_to_current_prim_groups(control_node, candidate)
-
-    update_display_buttons(control_node)
-    hou.node(network_location).layoutChildren()
-    home_network(network_location)
+def get_update_source_parms(control_node):
+    """Returns the file parameters of the temporary file SOPs of source networks and the input parameters of their
+    FBX switches.
+    :type control_node: hou.ObjNode
+    :rtype: list[hou.Parm]"""
+    parms = []
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP):
+        parms.append(hou.node(control_node.parm('%s_source_temp_file_sop' % group_type).eval()).parm('file'))
+        parms.append(hou.node('%s/is_fbx_temp' % control_node.parm('%s_source' % group_type).eval()).parm('input'))
+    return parms
+
+
+def restore_update_sources(previous_sources, control_node):
+    """Points the temporary file SOPs of source networks back to the files they had before an update was planned,
+    e.g. when the user cancels it. Undos are disabled, like while planning.
+    :type previous_sources: list
+    :type control_node: hou.ObjNode"""
+    with hou.undos.disabler():
+        for parm, value in zip(get_update_source_parms(control_node), previous_sources):
+            parm.set(value)
 
 
-def remove_from_multiparm(multi_parm, parm_name, value):
-    """Removes instance from multiparm. Hardcoded for object_merge SOP multiparms.
+def load_update_sources(control_node):
+    """Points the temporary file SOPs of source networks to new versions of source files and returns the last
+    temporary SOPs of the retopo and reference sources. Nothing is cooked, see ingest_sources().
+    :type control_node: hou.ObjNode
+    :rtype: list[hou.SopNode]"""
+    temp_outputs = []
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP):
+        source_path = control_node.parm('%s_source_path' % group_type).eval()
+        temp_file = hou.node(control_node.parm('%s_source_temp_file_sop' % group_type).eval())
+        temp_file.parm('file').set(source_path)
+        temp_file.parm('reload').pressButton()
+        is_fbx_temp_switch = hou.node('%s/is_fbx_temp' % control_node.parm('%s_source' % group_type).eval())
+        is_fbx_temp_switch.parm('input').set(1 if is_path_fbx(source_path) else 0)
+        temp_outputs.append(hou.node('%s/OUT_TEMP' % control_node.parm('%s_source' % group_type).eval()))
+    return temp_outputs
+
+
+def estimate_update_seconds(bundle_count, polygon_count, control_node):
+    """Returns the estimated duration of an update which creates or reloads a number of bundles, where the created
+    ones have a given total number of retopo and reference polygons. The polygon rate is learned from past updates
+    of the network (see record_update_timing()).
+    :type bundle_count: int
+    :type polygon_count: int
+    :type control_node: hou.ObjNode
+    :rtype: float"""
+    timings = get_manifest(control_node).get('timings', {})
+    if timings.get('polygons'):
+        seconds_per_polygon = timings['seconds'] / float(timings['polygons'])
+    else:
+        seconds_per_polygon = Dynamite.SECONDS_PER_POLYGON
+    return bundle_count * Dynamite.SECONDS_PER_BUNDLE + polygon_count * seconds_per_polygon
+
+
+def record_update_timing(plan, seconds, control_node):
+    """Adds the duration of an applied update plan to the timings of the network. Only added bundles are built,
+    so only their polygons are counted; changed bundles are reloaded and count as bundles only.
+    :type plan: dict
+    :type seconds: float
+    :type control_node: hou.ObjNode"""
+    bundle_count = len(plan['added']) + len(plan['changed'])
+    polygon_count = sum(plan['polygons'][name] for name in plan['added'])
+    if not polygon_count:
+        return
+    manifest = get_manifest(control_node)
+    timings = manifest.setdefault('timings', {'seconds': 0.0, 'polygons': 0})
+    timings['seconds'] += max(seconds - bundle_count * Dynamite.SECONDS_PER_BUNDLE, 0.0)
+    timings['polygons'] += polygon_count
+    set_manifest(control_node, manifest)
+
+
+def plan_update(control_node):
+    """Loads new versions of source files and compares them with the current ones without modifying the network.
+    Returns a plan with sorted lists of 'added', 'removed', 'changed' and 'unchanged' bundles, [old name, new name]
+    pairs of 'renamed' bundles and of 'uncertain' ones (which are too alike other bundles to be matched safely and
+    are added and removed instead), changed bundles whose retopo topology differs under 'retopologized' (their
+    cage edits are transferred), retopo and reference polygon counts of bundles in the new files under
+    'polygons', the estimated duration of applying the plan under 'seconds' and the previous parameter values of
+    the temporary source SOPs under 'previous_sources' (see restore_update_sources()). Returns None if primitive
+    groups of the new files don't match. Planning is not recorded for undo.
+    :type control_node: hou.ObjNode
+    :rtype: dict"""
+    previous_sources = [parm.unexpandedString() if parm.parmTemplate().type() == hou.parmTemplateType.String
+                        else parm.eval() for parm in get_update_source_parms(control_node)]
+    with hou.undos.disabler():
+        # New files are ingested first, and their normals are cached for the file SOPs which will load them
+        # when the plan is applied.
+        old_sources = [hou.node('%s/is_fbx' % control_node.parm('%s_source' % group_type).eval())
+                       for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP)]
+        geometries, signatures = ingest_sources(load_update_sources(control_node) + old_sources,
+                                                (False, bool(control_node.parm('smooth_normals').eval()), False,
+                                                 False), signatures=True)
+        if not primitive_groups_match(geometries[0], geometries[1]):
+            restore_update_sources(previous_sources, control_node)
+            return None
+    new_signatures, old_signatures = signatures[:2], signatures[2:]
+
+    old_prim_group_names = set(get_current_prim_groups(control_node) or [])
+    new_prim_group_names = set(new_signatures[0])
+    added = new_prim_group_names - old_prim_group_names
+    removed = old_prim_group_names - new_prim_group_names
+    # Renamed bundles are recognized by their retopo geometry, which cages are built from.
+    renamed, uncertain = mesh.match_renames(dict((name, old_signatures[0][name]) for name in removed),
+                                            dict((name, new_signatures[0][name]) for name in added))
+    plan = {'added': sorted(added - set(new_name for _, new_name in renamed)),
+            'removed': sorted(removed - set(old_name for old_name, _ in renamed)),
+            'renamed': [list(pair) for pair in renamed], 'uncertain': [list(pair) for pair in uncertain],
+            'changed': [], 'unchanged': [], 'previous_sources': previous_sources,
+            'polygons': dict((name, sum(signatures[name]['polygons'] for signatures in new_signatures))
+                             for name in new_prim_group_names)}
+    plan['retopologized'] = []
+    for name in sorted(new_prim_group_names & old_prim_group_names):
+        changed = [name not in old or old[name]['digest'] != new[name]['digest']
+                   for old, new in zip(old_signatures, new_signatures)]
+        plan['changed' if any(changed) else 'unchanged'].append(name)
+        if old_signatures[0][name]['topology'] != new_signatures[0][name]['topology']:
+            plan['retopologized'].append(name)
+
+    plan['seconds'] = estimate_update_seconds(len(plan['added']) + len(plan['changed']),
+                                              sum(plan['polygons'][name] for name in plan['added']), control_node)
+    return plan
+
+
+def format_update_plan(plan):
+    """Returns a summary line and a per-bundle listing of an update plan.
+    :type plan: dict
+    :rtype: tuple[str]"""
+    summary = '%d added, %d removed, %d renamed, %d changed and %d unchanged bundles. Estimated time: %.1f s.' % (
+        len(plan['added']), len(plan['removed']), len(plan['renamed']), len(plan['changed']),
+        len(plan['unchanged']), plan['seconds'])
+    if plan['uncertain']:
+        summary += '\n%d possible renames are ambiguous and will be recreated; see details.' % len(plan['uncertain'])
+    lines = ['%-10s %s -> %s' % ('renamed', old_name, new_name) for old_name, new_name in plan['renamed']]
+    lines += ['%-10s %s -> %s (not applied)' % ('uncertain', old_name, new_name)
+              for old_name, new_name in plan['uncertain']]
+    lines += ['%-10s %s (cage edits will be transferred)' % ('retopo', name) for name in plan['retopologized']]
+    for status in ('added', 'removed', 'changed', 'unchanged'):
+        for name in plan[status]:
+            polygons = plan['polygons'].get(name)
+            lines.append('%-10s %s%s' % (status, name, ' (%d polygons)' % polygons if polygons is not None else ''))
+    return summary, '\n'.join(lines)
+
+
+def review_update(control_node):
+    """Shows the update plan of the network and applies it if the user confirms.
+    :type control_node: hou.ObjNode"""
+    plan = plan_update(control_node)
+    if plan is None:
+        return
+    summary, details = format_update_plan(plan)
+    choice = hou.ui.displayMessage(summary, buttons=('Apply', 'Cancel'), default_choice=0, close_choice=1,
+                                   title='Dynamite: Update Network', details=details)
+    if choice != 0:
+        restore_update_sources(plan['previous_sources'], control_node)
+        return
+    start = time.time()
+    update_network(control_node, plan)
+    record_update_timing(plan, time.time() - start, control_node)
+
+
+def rename_bundle(old_name, new_name, control_node):
+    """Renames a bundle after its primitive group has been renamed, keeping its nodes, edits and parameters.
+    The bundle stays in its shard and network editor row.
+    :type old_name: str
+    :type new_name: str
+    :type control_node: hou.ObjNode"""
+    for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+        obj_node = get_bundle_obj(old_name, group_type, control_node)
+        for child in obj_node.children():
+            if child.name().startswith('%s_' % old_name):
+                child.setName(new_name + child.name()[len(old_name):])
+        obj_node.node('%s_object_merge' % new_name).parm('group1').set(new_name)
+        obj_node.setName('%s_%s' % (new_name, group_type))
+
+    manifest = get_manifest(control_node)
+    manifest['bundles'][new_name] = manifest['bundles'].pop(old_name)
+    set_manifest(control_node, manifest)
+    retopo_obj = get_bundle_obj(new_name, Dynamite.RETOPO_GROUP, control_node)
+    cage_obj = get_bundle_obj(new_name, Dynamite.CAGE_GROUP, control_node)
+    cage_obj.node('%s_retopo_merge' % new_name).parm('objpath1').set('%s/%s_refined' % (retopo_obj.path(), new_name))
+
+    remove_from_current_prim_groups(control_node, old_name)
+    add_to_current_prim_groups(control_node, new_name)
+    if control_node.parm('active_bundle').eval() == old_name:
+        control_node.parm('active_bundle').set(new_name)
+    if control_node.userData(Dynamite.EDITING_USER_DATA) == old_name:
+        control_node.setUserData(Dynamite.EDITING_USER_DATA, new_name)
+
+
+def update_network(control_node, plan=None):
+    """Updates all bake groups. Deletes groups that are missing in the new asset version, adds those that are new
+    and renames those which have only been renamed. Changed bundles are updated by reloading source files; edits
+    of their cages are transferred to the new retopo if its topology has changed.
+    Arguments:
+        control_node - Dynamite control hou.ObjNode.
+        plan - update plan returned by plan_update(). If given, only bundles it adds, removes or renames are
+            processed and the new source files, which it has already loaded, aren't compared again.
+    :type control_node: hou.ObjNode
+    :type plan: dict"""
+    if plan is None:
+        plan = plan_update(control_node)
+        if plan is None:
+            return
+
+    transaction = NetworkTransaction('Dynamite: Update Network')
+    with transaction:
+        network_location = control_node.parm('network_location').eval()
+        retopo_file = hou.node(control_node.parm('retopo_source_file_sop').eval())
+        reference_file = hou.node(control_node.parm('reference_source_file_sop').eval())
+        retopo_source_out = hou.node(control_node.parm('retopo_source_out').eval())
+        reference_source_out = hou.node(control_node.parm('reference_source_out').eval())
+
+        # Edits of cages whose retopo topology changes are captured before the new files are loaded.
+        captured_edits = {}
+        for name in plan['retopologized']:
+            captured = capture_cage_edits(name, control_node)
+            if captured is not None:
+                captured_edits[name] = captured
+
+        retopo_file.parm('file').set(control_node.parm('retopo_source_path').eval())
+        reference_file.parm('file').set(control_node.parm('reference_source_path').eval())
+
+        for old_name, new_name in plan['renamed']:
+            rename_bundle(old_name, new_name, control_node)
+
+        # Remove non-existing bake bundles.
+        for candidate in plan['removed']:
+            # Remove the bake bundle from the node bundles that collect it, then the bundle itself.
+            remove_bundle_from_outputs(candidate, control_node)
+            bundle_location = get_bundle_location(candidate, control_node)
+            for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+                get_bundle_obj(candidate, group_type, control_node).destroy()
+            remove_from_current_prim_groups(control_node, candidate)
+            released_shard = unregister_bundle(candidate, control_node)
+            if released_shard:
+                remove_shard_from_outputs(bundle_location, control_node)
+                hou.node(bundle_location).destroy()
+
+        # Add new bake bundles.
+        retopo_file.parm('reload').pressButton()
+        reference_file.parm('reload').pressButton()
+        candidates_add = plan['added']
+        for shard_name in register_bundles(candidates_add, control_node):
+            shard = create_shard(shard_name, control_node)
+            add_shard_to_outputs(shard.path(), control_node)
+        place_network_header(control_node)
+        for candidate in candidates_add:
+            prim_group = retopo_source_out.geometry().findPrimGroup(candidate)
+            retopo_group = create_retopo_group(prim_group, control_node)
+            prim_group = reference_source_out.geometry().findPrimGroup(candidate)
+            reference_group = create_reference_group(prim_group, control_node)
+            prim_group = retopo_source_out.geometry().findPrimGroup(candidate)
+            cage_group = create_cage_group(prim_group, control_node)
+            reference_group.setInput(0, retopo_group)
+            cage_group.setInput(0, reference_group)
+            place_bundle(candidate, control_node)
+            add_bundle_to_outputs(candidate, control_node)
+            add_to_current_prim_groups(control_node, candidate)
+
+        for name in sorted(captured_edits):
+            transfer_cage_edits(name, captured_edits[name], control_node)
+
+        new_prim_group_names = get_current_prim_groups(control_node) or []
+        if control_node.parm('active_bundle').eval() not in new_prim_group_names:
+            control_node.parm('active_bundle').set(new_prim_group_names[0] if new_prim_group_names else '')
+        load_active_bundle(control_node)
+
+        for group_type in (Dynamite.RETOPO_GROUP, Dynamite.REFERENCE_GROUP, Dynamite.CAGE_GROUP):
+            transaction.cook_on_commit(hou.node(control_node.parm('%s_output_obj' % group_type).eval()).displayNode())
+        home_network(network_location)
+
+
+def add_to_multiparm(multi_parm, parm_name, value):
+    """Appends an instance to a multiparm and sets it to a given value. Hardcoded for object_merge SOP multiparms.
     :type multi_parm: hou.Parm
     :type parm_name: str
     :type value: str"""
-    instances = multi_parm.multiParmInstances()
-    parms = [parm for parm in instances if parm_name in parm.name()]
-    for parm in parms:
-        if value in parm.evalAsString():
-            index = parm.multiParmInstanceIndices()[0] / 4
-            multi_parm.removeMultiParmInstance(index)
-            break
-
+    number_of_instances = multi_parm.eval() + 1
+    multi_parm.set(number_of_instances)
+    multi_parm.node().parm('%s%d' % (parm_name, number_of_instances)).set(value)
 
-def update_display_buttons(control_node):
-    """Updates bundle display buttons on the control node. Required after performing network update.
-    :type control_node: hou.ObjNode"""
-    retopo_source_out = hou.node(control_node.parm('retopo_source_out').eval())
-    prim_groups = retopo_source_out.geometry().primGroups()
-    prim_group_names = sorted([prim_group.name() for prim_group in prim_groups])
 
-    parm_template_group = control_node.parmTemplateGroup()
+def set_merge_paths(object_merge, paths):
+    """Replaces all object paths of an object_merge SOP.
+    :type object_merge: hou.SopNode
+    :type paths: list[str]"""
+    object_merge.parm('numobj').set(len(paths))
+    for index, path in enumerate(paths):
+        object_merge.parm('objpath%d' % (index + 1)).set(path)
 
-    for prim_group in prim_groups:
-        prim_group_name = prim_group.name()
-
-        # Show reference and cages button.
-        script_callback = "%s;dynamite.set_group_display(%s, False, True, True, hou.node('%s'))" % (
-            Dynamite.MODULE_IMPORT, str(prim_group_names), control_node.path())
-        button = parm_template_group.find('%s_show_ref_cages' % prim_group_name)
-        button.setScriptCallback(script_callback)
-        parm_template_group.replace(button.name(), button)
-
-        # Show cages only button.
-        script_callback = "%s;dynamite.set_group_display(%s, False, False, True, hou.node('%s'))" % (
-            Dynamite.MODULE_IMPORT, str(prim_group_names), control_node.path())
-        button = parm_template_group.find('%s_show_cages_only' % prim_group_name)
-        button.setScriptCallback(script_callback)
-        parm_template_group.replace(button.name(), button)
-
-        # Isolate button.
-        script_callback = "%s;dynamite.set_group_display(%s, False, False, False, hou.node('%s'));" \
-                          "dynamite.set_group_display(('%s',), False, True, True, hou.node('%s'));" \
-                          "dynamite.home()" % \
-                          (Dynamite.MODULE_IMPORT, prim_group_names, control_node.path(),
-                           prim_group_name, control_node.path())
-
-        button = parm_template_group.find('%s_isolate' % prim_group_name)
-        button.setScriptCallback(script_callback)
-        parm_template_group.replace(button.name(), button)
 
-    control_node.setParmTemplateGroup(parm_template_group)
+def remove_from_multiparm(multi_parm, parm_name, value):
+    """Removes the multiparm instance whose value is exactly a given value. Hardcoded for object_merge SOP
+    multiparms, which are indexed from 1.
+    :type multi_parm: hou.Parm
+    :type parm_name: str
+    :type value: str"""
+    node = multi_parm.node()
+    for index in range(multi_parm.eval()):
+        if node.parm('%s%d' % (parm_name, index + 1)).unexpandedString() == value:
+            multi_parm.removeMultiParmInstance(index)
+            break
 
 
 def get_current_prim_groups(control_node):
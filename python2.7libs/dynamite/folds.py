@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# ===== folds.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module detects folds of cages: polygons which intersect other, non-adjacent polygons of the same cage, and
+polygons which face the opposite way than the matching retopo polygons. Candidate pairs of intersecting triangles
+are found with a uniform grid of triangle bounding boxes, which is built and queried with NumPy sorting instead of
+a per-triangle tree traversal, then every candidate pair is tested at once. Triangles much larger than the grid
+cells are kept out of the grid and tested against all other triangles.
+"""
+import mesh
+import numpy as np
+import triangulate
+
+EPSILON = 1e-9
+# Grid cells are this many times larger than the median triangle, but there are at most GRID_RESOLUTION cells along
+# the longest side of the bounding box (e.g. if most triangles are degenerate).
+CELL_SCALE = 2.0
+GRID_RESOLUTION = 1024
+# Triangles which span more cells than this along any axis are not put into the grid, but tested against all others,
+# so that one large polygon among small ones doesn't add a huge number of grid entries.
+MAX_CELL_SPAN = 4
+# Oversized triangles are tested against at most this many triangles at once.
+CHUNK_SIZE = 1 << 22
+
+
+def _cell_entries(lower, upper, cell_size):
+    """Returns triangle indices and keys of all grid cells overlapped by triangle bounding boxes.
+    :type lower: numpy.ndarray
+    :type upper: numpy.ndarray
+    :type cell_size: float
+    :rtype: (numpy.ndarray, numpy.ndarray)"""
+    origin = lower.min(axis=0)
+    first = np.floor((lower - origin) / cell_size).astype(np.int64)
+    last = np.floor((upper - origin) / cell_size).astype(np.int64)
+    spans = last - first + 1
+    counts = spans.prod(axis=1)
+    triangles = np.repeat(np.arange(len(lower)), counts)
+    local = np.arange(len(triangles)) - np.repeat(np.cumsum(counts) - counts, counts)
+    span_x, span_y = spans[triangles, 0], spans[triangles, 1]
+    cells = first[triangles] + np.column_stack((local % span_x, local // span_x % span_y, local // (span_x * span_y)))
+    size = last.max(axis=0) + 1
+    return triangles, (cells[:, 2] * size[1] + cells[:, 1]) * size[0] + cells[:, 0]
+
+
+def _grid_pairs(lower, upper, cell_size):
+    """Returns pairs of triangles which share a grid cell, possibly repeated and in any order.
+    :type lower: numpy.ndarray
+    :type upper: numpy.ndarray
+    :type cell_size: float
+    :rtype: numpy.ndarray"""
+    if not len(lower):
+        return np.zeros((0, 2), dtype=np.int64)
+    triangles, keys = _cell_entries(lower, upper, cell_size)
+    order = np.argsort(keys, kind='mergesort')
+    triangles, keys = triangles[order], keys[order]
+
+    # Every entry is paired with the entries after it in the same cell.
+    run_starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    run_lengths = np.diff(np.append(run_starts, len(keys)))
+    positions = np.arange(len(keys))
+    followers = np.repeat(run_starts + run_lengths, run_lengths) - positions - 1
+    first = np.repeat(positions, followers)
+    second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(followers) - followers, followers)
+    return np.column_stack((triangles[first], triangles[second]))
+
+
+def _oversized_pairs(lower, upper, oversized):
+    """Returns pairs of every oversized triangle with all triangles whose bounding boxes overlap its own.
+    :type lower: numpy.ndarray
+    :type upper: numpy.ndarray
+    :type oversized: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    pairs = [np.zeros((0, 2), dtype=np.int64)]
+    step = max(CHUNK_SIZE // len(lower), 1)
+    for start in range(0, len(oversized), step):
+        chunk = oversized[start:start + step]
+        overlap = ((lower[chunk, np.newaxis] <= upper) & (lower <= upper[chunk, np.newaxis])).all(axis=2)
+        rows, others = np.nonzero(overlap)
+        pairs.append(np.column_stack((chunk[rows], others)))
+    return np.concatenate(pairs)
+
+
+def candidate_pairs(corners):
+    """Returns unique (i, j), i < j, pairs of triangles whose bounding boxes overlap.
+    :type corners: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    lower, upper = corners.min(axis=1), corners.max(axis=1)
+    origin = lower.min(axis=0)
+    cell_size = max(CELL_SCALE * float(np.median((upper - lower).max(axis=1))),
+                    float((upper.max(axis=0) - origin).max()) / GRID_RESOLUTION, EPSILON)
+    spans = np.floor((upper - origin) / cell_size) - np.floor((lower - origin) / cell_size) + 1
+    oversized = (spans > MAX_CELL_SPAN).any(axis=1)
+    gridded = np.flatnonzero(~oversized)
+    grid_pairs = gridded[_grid_pairs(lower[gridded], upper[gridded], cell_size)]
+    pairs = np.concatenate((grid_pairs.reshape(-1, 2), _oversized_pairs(lower, upper, np.flatnonzero(oversized))))
+    pairs = np.sort(pairs, axis=1)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    if not len(pairs):
+        return pairs.reshape(0, 2)
+    pairs = np.unique(pairs[:, 0] * len(corners) + pairs[:, 1])
+    pairs = np.column_stack((pairs // len(corners), pairs % len(corners)))
+    overlap = ((lower[pairs[:, 0]] <= upper[pairs[:, 1]]) & (lower[pairs[:, 1]] <= upper[pairs[:, 0]])).all(axis=1)
+    return pairs[overlap]
+
+
+def _edges_cross(edge_starts, edge_ends, triangles):
+    """Returns whether segments cross triangles (Moller-Trumbore with the segment parameter within (0, 1)).
+    :type edge_starts: numpy.ndarray
+    :type edge_ends: numpy.ndarray
+    :type triangles: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    direction = edge_ends - edge_starts
+    edge1 = triangles[:, 1] - triangles[:, 0]
+    edge2 = triangles[:, 2] - triangles[:, 0]
+    p = np.cross(direction, edge2)
+    determinant = np.einsum('ij,ij->i', edge1, p)
+    valid = np.abs(determinant) > EPSILON
+    inverse = np.where(valid, 1.0 / np.where(valid, determinant, 1.0), 0.0)
+    s = edge_starts - triangles[:, 0]
+    u = np.einsum('ij,ij->i', s, p) * inverse
+    q = np.cross(s, edge1)
+    v = np.einsum('ij,ij->i', direction, q) * inverse
+    t = np.einsum('ij,ij->i', edge2, q) * inverse
+    return valid & (u > EPSILON) & (v > EPSILON) & (u + v < 1 - EPSILON) & (t > EPSILON) & (t < 1 - EPSILON)
+
+
+def intersecting_triangles(points, triangles):
+    """Returns indices of triangles which intersect other triangles that don't share any point with them.
+    Coplanar overlaps are not detected.
+    :type points: numpy.ndarray
+    :type triangles: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    if len(triangles) < 2:
+        return np.zeros(0, dtype=np.int64)
+    corners = points[triangles].astype(np.float64)
+    pairs = candidate_pairs(corners)
+    first, second = triangles[pairs[:, 0]], triangles[pairs[:, 1]]
+    adjacent = (first[:, :, np.newaxis] == second[:, np.newaxis, :]).any(axis=(1, 2))
+    pairs = pairs[~adjacent]
+    if not len(pairs):
+        return np.zeros(0, dtype=np.int64)
+
+    crossing = np.zeros(len(pairs), dtype=bool)
+    for edge_triangle, face_triangle in ((pairs[:, 0], pairs[:, 1]), (pairs[:, 1], pairs[:, 0])):
+        for k in range(3):
+            crossing |= _edges_cross(corners[edge_triangle, k], corners[edge_triangle, (k + 1) % 3],
+                                     corners[face_triangle])
+    return np.unique(pairs[crossing])
+
+
+def flipped_faces(points, vertices, face_counts, reference_points):
+    """Returns indices of polygons whose normals point away from normals of the same polygons of the reference
+    geometry (e.g. the retopo), which has the same topology.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type reference_points: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    normals = mesh.face_normals(points, vertices, face_counts)
+    reference_normals = mesh.face_normals(reference_points, vertices, face_counts)
+    return np.flatnonzero(np.einsum('ij,ij->i', normals, reference_normals) < 0)
+
+
+def detect_folds(points, vertices, face_counts, reference_points):
+    """Returns sorted indices of self-intersecting and flipped polygons of a cage.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type reference_points: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    corners = triangulate.fan(face_counts)
+    triangle_faces = np.repeat(np.arange(len(face_counts)), np.maximum(face_counts.astype(np.int64) - 2, 0))
+    intersecting = triangle_faces[intersecting_triangles(points, vertices[corners])]
+    return np.union1d(intersecting, flipped_faces(points, vertices, face_counts, reference_points))
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+
+# ===== geo_io.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module converts hou.Geometry to mesh.Bundle arrays. Attribute values are transferred as binary
+strings, and topology and group membership are written to attributes by multithreaded wrangle SOP verbs and
+read back the same way, so that no per-primitive Python loop or list of Python ints is involved.
+"""
+import hashlib
+import hou
+import mesh
+import numpy as np
+import triangulate
+
+# Group membership is packed into bits of int primitive attributes, this many groups per attribute.
+GROUP_BITS = 31
+
+TOPOLOGY_SNIPPET = """i@dynamite_point = @ptnum;
+i@dynamite_prim = @primnum;"""
+
+GROUP_MEMBERS_SNIPPET = """string names[] = detailintrinsic(0, "primitivegroups");
+if (@primnum == 0) setdetailattrib(0, "dynamite_group_names", names);
+for (int first = 0; first < len(names); first += %(bits)d) {
+    int bits = 0;
+    for (int bit = 0; bit < %(bits)d && first + bit < len(names); bit++) {
+        if (inprimgroup(0, names[first + bit], @primnum)) bits |= 1 << bit;
+    }
+    setprimattrib(0, sprintf("dynamite_groups_%%d", first / %(bits)d), @primnum, bits);
+}""" % {'bits': GROUP_BITS}
+
+SURFACE_SAMPLE_SNIPPET = """int prim;
+vector uv;
+xyzdist(1, @P, prim, uv);
+v@%(attrib_name)s = primuv(1, "%(attrib_name)s", prim, uv);"""
+
+RAY_SNIPPET = """vector hit_position, hit_uvw;
+int prim = intersect(1, @P, v@dynamite_dir, hit_position, hit_uvw);
+v@dynamite_hit_N = {0, 0, 0};
+if (prim >= 0) v@dynamite_hit_N = normalize(primuv(1, "N", prim, hit_uvw));"""
+
+# Local corners of the k-th triangle of every polygon are stored on its k-th vertex. Attribute values are copied
+# afterwards by source element numbers (see copy_attrib_values()), groups are copied here.
+TRIANGLES_SNIPPET = """string prim_groups[] = detailintrinsic(0, "primitivegroups");
+string vertex_groups[] = detailintrinsic(0, "vertexgroups");
+int member_of[];
+foreach (string name; prim_groups) append(member_of, inprimgroup(0, name, @primnum));
+int count = primvertexcount(0, @primnum);
+for (int slot = 0; slot < count - 2; slot++) {
+    vector corners = vertex(0, "dynamite_triangle", primvertex(0, @primnum, slot));
+    int triangle = addprim(0, "poly");
+    setprimattrib(0, "dynamite_source_prim", triangle, @primnum);
+    for (int group = 0; group < len(prim_groups); group++) {
+        if (member_of[group]) setprimgroup(0, prim_groups[group], triangle, 1);
+    }
+    for (int k = 0; k < 3; k++) {
+        int source = primvertex(0, @primnum, int(corners[k]));
+        int target = addvertex(0, triangle, vertexpoint(0, source));
+        setvertexattrib(0, "dynamite_source_vertex", -1, target, source);
+        foreach (string name; vertex_groups) {
+            if (invertexgroup(0, name, source)) setvertexgroup(0, name, -1, target, 1);
+        }
+    }
+}
+removeprim(0, @primnum, 0);"""
+
+
+def run_verb(node_type_name, geo, parms, inputs=()):
+    """Runs a SOP verb on a copy of the geometry and returns the result.
+    :type node_type_name: str
+    :type geo: hou.Geometry
+    :type parms: dict
+    :type inputs: tuple[hou.Geometry]
+    :rtype: hou.Geometry"""
+    verb = hou.sopNodeTypeCategory().nodeVerb(node_type_name)
+    verb.setParms(parms)
+    result = hou.Geometry()
+    verb.execute(result, [geo] + list(inputs))
+    return result
+
+
+def read_points(geo, attrib_name='P'):
+    """Returns values of a 3-float point attribute as a (N, 3) float32 array.
+    :type geo: hou.Geometry
+    :type attrib_name: str
+    :rtype: numpy.ndarray"""
+    return np.frombuffer(geo.pointFloatAttribValuesAsString(attrib_name), dtype=np.float32).reshape(-1, 3)
+
+
+def write_points(geo, values, attrib_name='P'):
+    """Sets values of a 3-float point attribute from a (N, 3) array. Creates the attribute if it doesn't exist.
+    The geometry must be writable (e.g. inside a Python SOP).
+    :type geo: hou.Geometry
+    :type values: numpy.ndarray
+    :type attrib_name: str"""
+    if geo.findPointAttrib(attrib_name) is None:
+        geo.addAttrib(hou.attribType.Point, attrib_name, (0.0, 0.0, 0.0))
+    geo.setPointFloatAttribValuesFromString(attrib_name, np.ascontiguousarray(values, dtype=np.float32).tostring())
+
+
+def _attrib_method(attrib, method_format):
+    """Returns the name of a hou.Geometry method of the attribute's class and data type, and the keyword argument
+    of its storage type."""
+    element = {hou.attribType.Point: 'Point', hou.attribType.Prim: 'Prim', hou.attribType.Vertex: 'Vertex'}[
+        attrib.type()]
+    if attrib.dataType() == hou.attribData.Float:
+        return method_format % (element, 'Float'), {'float_type': attrib.numericData()}
+    return method_format % (element, 'Int'), {'int_type': attrib.numericData()}
+
+
+def read_attrib_string(geo, attrib):
+    """Returns values of a numeric point, primitive or vertex attribute as a binary string, in element order and
+    in the storage type of the attribute.
+    :type geo: hou.Geometry
+    :type attrib: hou.Attrib
+    :rtype: str"""
+    method_name, keywords = _attrib_method(attrib, '%s%sAttribValuesAsString')
+    method_name = method_name[0].lower() + method_name[1:]
+    return getattr(geo, method_name)(attrib.name(), **keywords)
+
+
+def write_attrib_string(geo, attrib, values):
+    """Sets values of a numeric point, primitive or vertex attribute from a binary string in the storage type of
+    the attribute (see read_attrib_string()). The geometry must be writable.
+    :type geo: hou.Geometry
+    :type attrib: hou.Attrib
+    :type values: str"""
+    method_name, keywords = _attrib_method(attrib, 'set%s%sAttribValuesFromString')
+    getattr(geo, method_name)(attrib.name(), values, **keywords)
+
+
+def copy_attrib_values(source_geo, target_geo, attrib, sources):
+    """Sets values of a primitive or vertex attribute of all elements of the target geometry to the values of
+    source geometry elements given by their numbers. Numeric attributes of any tuple size and storage are copied
+    as binary strings, string attributes as tuples, and other ones (e.g. arrays) element by element. The target
+    geometry must be writable and have the attribute.
+    :type source_geo: hou.Geometry
+    :type target_geo: hou.Geometry
+    :type attrib: hou.Attrib
+    :type sources: numpy.ndarray"""
+    if not len(sources):
+        return
+    is_prim = attrib.type() == hou.attribType.Prim
+    target_attrib = (target_geo.findPrimAttrib if is_prim else target_geo.findVertexAttrib)(attrib.name())
+    if not attrib.isArrayType() and attrib.dataType() in (hou.attribData.Float, hou.attribData.Int):
+        count = source_geo.intrinsicValue('primitivecount' if is_prim else 'vertexcount')
+        values = np.frombuffer(read_attrib_string(source_geo, attrib), dtype=np.uint8).reshape(count, -1)
+        write_attrib_string(target_geo, target_attrib, values[sources].tostring())
+    elif not attrib.isArrayType() and attrib.dataType() == hou.attribData.String:
+        if is_prim:
+            values = source_geo.primStringAttribValues(attrib.name())
+            target_geo.setPrimStringAttribValues(attrib.name(), tuple(values[source] for source in sources))
+        else:
+            values = source_geo.vertexStringAttribValues(attrib.name())
+            target_geo.setVertexStringAttribValues(attrib.name(), tuple(values[source] for source in sources))
+    else:
+        if is_prim:
+            source_elements, target_elements = source_geo.prims(), target_geo.prims()
+        else:
+            source_elements = [vertex for prim in source_geo.prims() for vertex in prim.vertices()]
+            target_elements = [vertex for prim in target_geo.prims() for vertex in prim.vertices()]
+        for element, source in zip(target_elements, sources):
+            element.setAttribValue(target_attrib, source_elements[source].attribValue(attrib))
+
+
+def geometry_key(geo):
+    """Returns a digest of point positions and topology of the geometry (see mesh.content_hash()), which is used
+    as a cache key. Callers which read the topology anyway should hash their arrays with mesh.content_hash().
+    :type geo: hou.Geometry
+    :rtype: str"""
+    vertices, face_counts = read_topology(geo)
+    return mesh.content_hash(read_points(geo), vertices, face_counts)
+
+
+def geometry_digest(geo):
+    """Returns a digest of the whole geometry: point positions and topology (see geometry_key()), the names, types
+    and sizes of all attributes, values of numeric and string attributes, and group names. Values of array and
+    dictionary attributes aren't read.
+    :type geo: hou.Geometry
+    :rtype: str"""
+    digest = hashlib.sha1(geometry_key(geo))
+    string_values = {hou.attribType.Point: geo.pointStringAttribValues, hou.attribType.Prim: geo.primStringAttribValues,
+                     hou.attribType.Vertex: geo.vertexStringAttribValues}
+    for attribs in (geo.pointAttribs(), geo.primAttribs(), geo.vertexAttribs(), geo.globalAttribs()):
+        for attrib in sorted(attribs, key=lambda attrib: attrib.name()):
+            digest.update(repr((str(attrib.type()), attrib.name(), str(attrib.dataType()), attrib.size(),
+                                attrib.isArrayType())))
+            if attrib.isArrayType() or attrib.name() == 'P':
+                continue
+            if attrib.type() == hou.attribType.Global:
+                digest.update(repr(geo.attribValue(attrib.name())))
+            elif attrib.dataType() in (hou.attribData.Float, hou.attribData.Int):
+                digest.update(read_attrib_string(geo, attrib))
+            elif attrib.dataType() == hou.attribData.String:
+                digest.update(repr(string_values[attrib.type()](attrib.name())))
+    for groups in (geo.pointGroups(), geo.primGroups(), geo.edgeGroups()):
+        digest.update(repr(sorted(group.name() for group in groups)))
+    return digest.hexdigest()
+
+
+def read_vertex_values(geo, attrib_name, size):
+    """Returns values of a float vertex attribute, truncated to a given tuple size, in vertex array order.
+    Falls back to the point attribute of the same name. Returns None if neither exists.
+    :type geo: hou.Geometry
+    :type attrib_name: str
+    :type size: int
+    :rtype: numpy.ndarray"""
+    attrib = geo.findVertexAttrib(attrib_name)
+    if attrib is not None:
+        values = geo.vertexFloatAttribValuesAsString(attrib_name)
+    else:
+        attrib = geo.findPointAttrib(attrib_name)
+        if attrib is None:
+            return None
+        values = geo.pointFloatAttribValuesAsString(attrib_name)
+    values = np.frombuffer(values, dtype=np.float32).reshape(-1, attrib.size())[:, :size]
+    if attrib.type() == hou.attribType.Point:
+        values = values[read_topology(geo)[0]]
+    return values
+
+
+def read_topology(geo):
+    """Returns vertex point numbers and vertex counts of all primitives of the geometry. Point and primitive
+    numbers of vertices are written by a vertex wrangle, in vertex array order.
+    :type geo: hou.Geometry
+    :rtype: (numpy.ndarray, numpy.ndarray)"""
+    topology = run_verb('attribwrangle', geo, {'class': 3, 'snippet': TOPOLOGY_SNIPPET})
+    vertices = np.frombuffer(topology.vertexIntAttribValuesAsString('dynamite_point'), dtype=np.int32)
+    prims = np.frombuffer(topology.vertexIntAttribValuesAsString('dynamite_prim'), dtype=np.int32)
+    face_counts = np.bincount(prims, minlength=geo.intrinsicValue('primitivecount')).astype(np.int32)
+    return vertices, face_counts
+
+
+def read_group_members(geo):
+    """Returns a dictionary of primitive numbers of every primitive group of the geometry. A primitive wrangle
+    packs the groups of every primitive into bits of int attributes (see GROUP_BITS).
+    :type geo: hou.Geometry
+    :rtype: dict[str, numpy.ndarray]"""
+    if not geo.primGroups():
+        return {}
+    members = run_verb('attribwrangle', geo, {'class': 1, 'snippet': GROUP_MEMBERS_SNIPPET})
+    if members.findGlobalAttrib('dynamite_group_names') is None:
+        return dict((prim_group.name(), np.zeros(0, dtype=np.int64)) for prim_group in geo.primGroups())
+    result = {}
+    for index, name in enumerate(members.stringListAttribValue('dynamite_group_names')):
+        bits = np.frombuffer(members.primIntAttribValuesAsString('dynamite_groups_%d' % (index // GROUP_BITS)),
+                             dtype=np.int32)
+        result[name] = np.flatnonzero(bits & (1 << index % GROUP_BITS))
+    return result
+
+
+def group_signatures(geo):
+    """Returns signatures (see mesh.group_signature()) of all primitive groups of the geometry. Signatures don't
+    depend on other groups, so a group keeps its signature as long as its own polygons and points are unchanged.
+    :type geo: hou.Geometry
+    :rtype: dict[str, dict]"""
+    vertices, face_counts = read_topology(geo)
+    points = read_points(geo)
+    return dict((name, mesh.group_signature(points, vertices, face_counts, faces))
+                for name, faces in read_group_members(geo).items())
+
+
+def sample_surface(geo, source_geo, attrib_name):
+    """Returns values of a 3-float point attribute of the source geometry, interpolated at the closest location on
+    its surface to every point of the geometry. The closest point query uses the bounding volume hierarchy of the
+    source and runs in a multithreaded wrangle.
+    :type geo: hou.Geometry
+    :type source_geo: hou.Geometry
+    :type attrib_name: str
+    :rtype: numpy.ndarray"""
+    snippet = SURFACE_SAMPLE_SNIPPET % {'attrib_name': attrib_name}
+    return read_points(run_verb('attribwrangle', geo, {'class': 2, 'snippet': snippet}, [source_geo]), attrib_name)
+
+
+def cast_rays(origins, directions, target_geo):
+    """Returns unit normals of the target geometry where rays first hit it, and zero vectors for rays which miss it.
+    Ray lengths are the lengths of their directions. Rays are cast against the bounding volume hierarchy of the
+    target in a multithreaded wrangle. Target normals are computed if it has none.
+    :type origins: numpy.ndarray
+    :type directions: numpy.ndarray
+    :type target_geo: hou.Geometry
+    :rtype: numpy.ndarray"""
+    if target_geo.findPointAttrib('N') is None and target_geo.findVertexAttrib('N') is None:
+        target_geo = run_verb('normal', target_geo, {'type': 0})
+    rays = hou.Geometry()
+    rays.createPoints([(0.0, 0.0, 0.0)] * len(origins))
+    write_points(rays, origins)
+    write_points(rays, directions, 'dynamite_dir')
+    return read_points(run_verb('attribwrangle', rays, {'class': 2, 'snippet': RAY_SNIPPET}, [target_geo]),
+                       'dynamite_hit_N')
+
+
+def read_bundle(geo, name):
+    """Returns a mesh.Bundle of the whole geometry. Point and vertex normals and UVs are read if the geometry
+    has them.
+    :type geo: hou.Geometry
+    :type name: str
+    :rtype: mesh.Bundle"""
+    vertices, face_counts = read_topology(geo)
+    normals = read_points(geo, 'N') if geo.findPointAttrib('N') is not None else None
+    vertex_normals = read_vertex_values(geo, 'N', 3) if geo.findVertexAttrib('N') is not None else None
+    return mesh.Bundle(name, read_points(geo), vertices, face_counts, normals,
+                       [prim_group.name() for prim_group in geo.primGroups()], read_vertex_values(geo, 'uv', 2),
+                       vertex_normals)
+
+
+def replace_with_triangles(geo, face_counts, triangles):
+    """Replaces polygons of the geometry with triangles given by indices into its vertex array, polygon after
+    polygon (see triangulate.triangle_slots()). Triangles are built by a multithreaded primitive wrangle, which
+    also carries primitive and vertex groups over; values of all primitive and vertex attributes are then copied
+    from the source elements. Points, point and detail attributes and edge groups are kept. The geometry must be
+    writable.
+    :type geo: hou.Geometry
+    :type face_counts: numpy.ndarray
+    :type triangles: numpy.ndarray"""
+    slots = triangulate.triangle_slots(face_counts, triangles).astype(np.float32)
+    geo.addAttrib(hou.attribType.Vertex, 'dynamite_triangle', (-1.0, -1.0, -1.0))
+    geo.setVertexFloatAttribValuesFromString('dynamite_triangle', slots.tostring())
+
+    result = run_verb('attribwrangle', geo, {'class': 1, 'snippet': TRIANGLES_SNIPPET})
+    source_prims = np.frombuffer(result.primIntAttribValuesAsString('dynamite_source_prim'), dtype=np.int32)
+    source_vertices = np.frombuffer(result.vertexIntAttribValuesAsString('dynamite_source_vertex'), dtype=np.int32)
+    for attrib in geo.primAttribs():
+        copy_attrib_values(geo, result, attrib, source_prims)
+    for attrib in geo.vertexAttribs():
+        if attrib.name() != 'dynamite_triangle':
+            copy_attrib_values(geo, result, attrib, source_vertices)
+    for attrib in (result.findPrimAttrib('dynamite_source_prim'), result.findVertexAttrib('dynamite_source_vertex'),
+                   result.findVertexAttrib('dynamite_triangle')):
+        attrib.destroy()
+    geo.clear()
+    geo.merge(result)
+
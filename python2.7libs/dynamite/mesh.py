@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+# ===== mesh.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module implements mesh operations of Dynamite (topology digests, normals, topology checks, rename
+matching and offset relaxation) on NumPy arrays, so that they can run without cooking SOPs or outside
+of a Houdini session. It doesn't import hou; see geo_io.py for conversion from and to hou.Geometry.
+
+Vertex order follows the Houdini convention, i.e. polygons are wound clockwise when seen from the side
+their normal points to.
+"""
+import hashlib
+import numpy as np
+
+
+class Bundle(object):
+    """Geometry of one bake group object, stored in flat arrays.
+    Arguments:
+        name - name of the bake bundle (primitive group).
+        points - (N, 3) float32 array of point positions.
+        vertices - int32 array of point numbers of all polygon vertices, polygon after polygon.
+        face_counts - int32 array of vertex counts of polygons.
+        normals - (N, 3) float32 array of point normals or None.
+        group_names - tuple of primitive group names carried by the geometry.
+        uvs - (V, 2) float32 array of vertex UVs or None.
+        vertex_normals - (V, 3) float32 array of vertex normals (e.g. hard edges of a retopo) or None."""
+    __slots__ = ('name', 'points', 'vertices', 'face_counts', 'normals', 'group_names', 'uvs', 'vertex_normals')
+
+    def __init__(self, name, points, vertices, face_counts, normals=None, group_names=(), uvs=None,
+                 vertex_normals=None):
+        self.name = name
+        self.points = np.ascontiguousarray(points, dtype=np.float32).reshape(-1, 3)
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.int32).ravel()
+        self.face_counts = np.ascontiguousarray(face_counts, dtype=np.int32).ravel()
+        self.normals = None if normals is None else np.ascontiguousarray(normals, dtype=np.float32).reshape(-1, 3)
+        self.group_names = tuple(group_names)
+        self.uvs = None if uvs is None else np.ascontiguousarray(uvs, dtype=np.float32).reshape(-1, 2)
+        self.vertex_normals = None if vertex_normals is None else \
+            np.ascontiguousarray(vertex_normals, dtype=np.float32).reshape(-1, 3)
+        if int(self.face_counts.sum()) != len(self.vertices):
+            raise ValueError('Face counts of %s do not add up to its number of vertices.' % name)
+
+    def __repr__(self):
+        return '<Bundle %s: %d points, %d polygons>' % (self.name, self.point_count(), self.face_count())
+
+    def point_count(self):
+        """:rtype: int"""
+        return len(self.points)
+
+    def face_count(self):
+        """:rtype: int"""
+        return len(self.face_counts)
+
+    def copy(self, points=None, normals=None):
+        """Returns a bundle which shares topology arrays with this one, optionally with new points or normals.
+        :type points: numpy.ndarray
+        :type normals: numpy.ndarray
+        :rtype: Bundle"""
+        return Bundle(self.name, self.points if points is None else points, self.vertices, self.face_counts,
+                      self.normals if normals is None else normals, self.group_names, self.uvs, self.vertex_normals)
+
+    def topology_hash(self):
+        """Returns a digest of the polygon connectivity, which doesn't change when points are moved.
+        :rtype: str"""
+        return topology_hash(self.point_count(), self.vertices, self.face_counts)
+
+    def content_hash(self):
+        """Returns a digest of the topology and point positions.
+        :rtype: str"""
+        return content_hash(self.points, self.vertices, self.face_counts)
+
+
+def topology_hash(point_count, vertices, face_counts):
+    """Returns a digest of polygon connectivity given by vertex and face count arrays.
+    :type point_count: int
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :rtype: str"""
+    digest = hashlib.sha1()
+    digest.update(np.int64(point_count).tostring())
+    digest.update(np.ascontiguousarray(face_counts, dtype=np.int32).tostring())
+    digest.update(np.ascontiguousarray(vertices, dtype=np.int32).tostring())
+    return digest.hexdigest()
+
+
+def content_hash(points, vertices, face_counts):
+    """Returns a digest of polygon connectivity and float32 point positions. Reversing or re-triangulating polygons
+    changes it, even if points and element counts stay the same.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :rtype: str"""
+    digest = hashlib.sha1(topology_hash(len(points), vertices, face_counts))
+    digest.update(np.ascontiguousarray(points, dtype=np.float32).tostring())
+    return digest.hexdigest()
+
+
+def face_starts(face_counts):
+    """Returns the index of the first vertex of every polygon.
+    :type face_counts: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    starts = np.zeros(len(face_counts), dtype=np.int64)
+    np.cumsum(face_counts[:-1], out=starts[1:])
+    return starts
+
+
+def vertex_faces(face_counts):
+    """Returns the polygon number of every vertex.
+    :type face_counts: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    return np.repeat(np.arange(len(face_counts)), face_counts)
+
+
+def vertex_neighbours(face_counts):
+    """Returns indices (into the vertex array) of the next and previous vertex of every vertex in its polygon.
+    :type face_counts: numpy.ndarray
+    :rtype: (numpy.ndarray, numpy.ndarray)"""
+    faces = vertex_faces(face_counts)
+    starts = face_starts(face_counts)[faces]
+    counts = face_counts[faces]
+    local = np.arange(len(faces)) - starts
+    return starts + (local + 1) % counts, starts + (local - 1) % counts
+
+
+def reversed_vertex_order(face_counts):
+    """Returns indices into the vertex array which reverse the winding of every polygon. Houdini winds polygons
+    clockwise, while OBJ and FBX expect counter-clockwise winding.
+    :type face_counts: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    faces = vertex_faces(face_counts)
+    starts = face_starts(face_counts)[faces]
+    return 2 * starts + face_counts[faces] - 1 - np.arange(len(faces))
+
+
+def group_signature(points, vertices, face_counts, faces):
+    """Returns the signature of a subset of polygons, as if they were a separate geometry (unused points are left
+    out and the remaining ones are renumbered in their order). It is a dictionary of:
+        polygons - number of polygons.
+        topology - digest of the polygon connectivity.
+        digest - digest of the connectivity and point positions.
+        centroid - average point position.
+        size - bounding box size.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type faces: numpy.ndarray
+    :rtype: dict"""
+    face_mask = np.zeros(len(face_counts), dtype=bool)
+    face_mask[faces] = True
+    group_vertices = vertices[face_mask[vertex_faces(face_counts)]]
+    used = np.unique(group_vertices)
+    group_points = np.ascontiguousarray(points[used], dtype=np.float32)
+    topology = topology_hash(len(used), np.searchsorted(used, group_vertices), face_counts[face_mask])
+    digest = hashlib.sha1(topology)
+    digest.update(group_points.tostring())
+    if len(used):
+        centroid, size = group_points.mean(axis=0), group_points.max(axis=0) - group_points.min(axis=0)
+    else:
+        centroid, size = np.zeros(3), np.zeros(3)
+    return {'polygons': int(face_mask.sum()), 'topology': topology, 'digest': digest.hexdigest(),
+            'centroid': centroid.tolist(), 'size': size.tolist()}
+
+
+def match_renames(removed, added, tolerance=0.01, ambiguity=0.5):
+    """Matches signatures (see group_signature()) of removed groups with those of added groups, to find groups
+    which have only been renamed. Centroids of added groups are put into a uniform grid, so that every removed
+    group is only compared with added groups around it. Distance of two groups is the sum of differences of their
+    centroids and bounding box sizes, relative to the bounding box diagonal of the removed group.
+    A pair is a rename if the groups have the same topology, their distance is within tolerance, the next closest
+    group with that topology is at least 1 / ambiguity times farther away, and neither group is matched twice.
+    Close pairs which fail any of these tests are returned as uncertain, so that the caller can report them instead
+    of guessing.
+    Arguments:
+        removed - dictionary of signatures of removed groups.
+        added - dictionary of signatures of added groups.
+        tolerance - maximum relative distance of renamed groups.
+        ambiguity - maximum ratio of distances of the closest and the second closest group.
+    :type removed: dict[str, dict]
+    :type added: dict[str, dict]
+    :type tolerance: float
+    :type ambiguity: float
+    :rtype: (list[tuple[str]], list[tuple[str]])"""
+    if not removed or not added:
+        return [], []
+    added_names = sorted(added)
+    centroids = np.array([added[name]['centroid'] for name in added_names], dtype=np.float64)
+    sizes = np.array([added[name]['size'] for name in added_names], dtype=np.float64)
+    cell_size = max(float(np.median(np.sqrt(np.square(sizes).sum(axis=1)))), 1e-6)
+    grid = {}
+    for index, cell in enumerate(np.floor(centroids / cell_size).astype(np.int64).tolist()):
+        grid.setdefault(tuple(cell), []).append(index)
+    offsets = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)]
+
+    proposals = {}
+    uncertain = []
+    for old_name in sorted(removed):
+        signature = removed[old_name]
+        centroid = np.asarray(signature['centroid'], dtype=np.float64)
+        size = np.asarray(signature['size'], dtype=np.float64)
+        scale = max(float(np.sqrt(np.square(size).sum())), 1e-6)
+        cell = np.floor(centroid / cell_size).astype(np.int64).tolist()
+        candidates = [index for offset in offsets
+                      for index in grid.get((cell[0] + offset[0], cell[1] + offset[1], cell[2] + offset[2]), ())]
+        if not candidates:
+            continue
+        distances = (np.sqrt(np.square(centroids[candidates] - centroid).sum(axis=1)) +
+                     np.sqrt(np.square(sizes[candidates] - size).sum(axis=1))) / scale
+        same_topology = [added[added_names[index]]['topology'] == signature['topology'] for index in candidates]
+        order = np.argsort(distances)
+        closest = [k for k in order if same_topology[k]]
+        if closest and distances[closest[0]] <= tolerance and (
+                len(closest) == 1 or distances[closest[0]] < ambiguity * distances[closest[1]]):
+            proposals[old_name] = added_names[candidates[closest[0]]]
+        elif distances[order[0]] <= tolerance:
+            uncertain.append((old_name, added_names[candidates[order[0]]]))
+
+    claims = {}
+    for new_name in proposals.values():
+        claims[new_name] = claims.get(new_name, 0) + 1
+    renames = []
+    for old_name in sorted(proposals):
+        pair = (old_name, proposals[old_name])
+        (renames if claims[pair[1]] == 1 else uncertain).append(pair)
+    return renames, sorted(uncertain)
+
+
+def normalize(vectors):
+    """Returns unit length copies of given vectors. Zero vectors stay zero.
+    :type vectors: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    lengths = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    lengths[lengths == 0] = 1.0
+    return vectors / lengths[:, np.newaxis]
+
+
+def face_normals(points, vertices, face_counts):
+    """Returns unit polygon normals computed with Newell's method, which also handles non-planar polygons.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    if not len(face_counts):
+        return np.zeros((0, 3))
+    next_vertex, _ = vertex_neighbours(face_counts)
+    positions = points[vertices].astype(np.float64)
+    crosses = np.cross(positions, positions[next_vertex])
+    # Houdini winds polygons clockwise, hence the negation.
+    return -normalize(np.add.reduceat(crosses, face_starts(face_counts), axis=0))
+
+
+def scatter_add(indices, values, size):
+    """Sums rows of values into a (size, 3) array at given row indices. Equivalent to numpy.add.at, but faster.
+    :type indices: numpy.ndarray
+    :type values: numpy.ndarray
+    :type size: int
+    :rtype: numpy.ndarray"""
+    result = np.empty((size, 3))
+    for axis in range(3):
+        result[:, axis] = np.bincount(indices, weights=values[:, axis], minlength=size)
+    return result
+
+
+def point_edges(vertices, face_counts):
+    """Returns unique (i, j), i < j, point pairs of all polygon edges.
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    next_vertex = vertex_neighbours(face_counts)[0]
+    edges = np.sort(np.column_stack((vertices, vertices[next_vertex])).astype(np.int64), axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    if not len(edges):
+        return edges.reshape(0, 2)
+    size = edges.max() + 1
+    edges = np.unique(edges[:, 0] * size + edges[:, 1])
+    return np.column_stack((edges // size, edges % size))
+
+
+def relax_offsets(offsets, edges, iterations, strength, pass_band=0.1):
+    """Returns per-point offsets smoothed by Taubin's method: every iteration is a Laplacian step which moves
+    offsets towards the average of their edge neighbours, followed by a slightly stronger step back, so that
+    the offsets don't shrink. The umbrella operator is applied as sparse sums over the edge list, one coordinate
+    at a time, which keeps the gathers contiguous.
+    :type offsets: numpy.ndarray
+    :type edges: numpy.ndarray
+    :type iterations: int
+    :type strength: float
+    :type pass_band: float
+    :rtype: numpy.ndarray"""
+    offsets = np.array(offsets, dtype=np.float64)
+    if iterations <= 0 or strength <= 0 or not len(edges):
+        return offsets
+    size = len(offsets)
+    ends = np.concatenate((edges[:, 0], edges[:, 1]))
+    starts = np.concatenate((edges[:, 1], edges[:, 0]))
+    degrees = np.bincount(ends, minlength=size).astype(np.float64)
+    connected = degrees > 0
+    degrees[~connected] = 1.0
+    shrink = min(float(strength), 1.0)
+    inflate = 1.0 / (pass_band - 1.0 / shrink)
+    columns = np.ascontiguousarray(offsets.T)
+    for _ in range(int(iterations)):
+        for factor in (shrink, inflate):
+            for column in columns:
+                laplacian = np.bincount(ends, weights=column.take(starts), minlength=size) / degrees - column
+                column += factor * np.where(connected, laplacian, 0.0)
+    return columns.T.copy()
+
+
+def point_normals(points, vertices, face_counts):
+    """Returns unit point normals, which are averages of normals of adjacent polygons weighted by vertex angles.
+    It matches the Normal SOP with point normals and the cusp angle of 180 degrees.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    if not len(face_counts):
+        return np.zeros((len(points), 3), dtype=np.float32)
+    next_vertex, previous_vertex = vertex_neighbours(face_counts)
+    positions = points[vertices].astype(np.float64)
+    to_next = positions[next_vertex] - positions
+    to_previous = positions[previous_vertex] - positions
+    sines = np.sqrt(np.square(np.cross(to_next, to_previous)).sum(axis=1))
+    angles = np.arctan2(sines, np.einsum('ij,ij->i', to_next, to_previous))
+    weighted = face_normals(points, vertices, face_counts)[vertex_faces(face_counts)] * angles[:, np.newaxis]
+    return normalize(scatter_add(vertices, weighted, len(points))).astype(np.float32)
+
+
+def topology_mismatch(retopo_topology, cage_topology):
+    """Returns a description of how the cage topology differs from the retopo topology, or None if they match.
+    Topologies are (point count, vertices, face counts) tuples.
+    :type retopo_topology: tuple
+    :type cage_topology: tuple
+    :rtype: str"""
+    retopo_point_count, retopo_vertices, retopo_face_counts = retopo_topology
+    cage_point_count, cage_vertices, cage_face_counts = cage_topology
+    if retopo_point_count != cage_point_count:
+        return '%d cage points, %d retopo points' % (cage_point_count, retopo_point_count)
+    if len(retopo_face_counts) != len(cage_face_counts):
+        return '%d cage polygons, %d retopo polygons' % (len(cage_face_counts), len(retopo_face_counts))
+    if not np.array_equal(retopo_face_counts, cage_face_counts):
+        return 'polygon %d has a different number of vertices' % np.flatnonzero(
+            retopo_face_counts != cage_face_counts)[0]
+    if not np.array_equal(retopo_vertices, cage_vertices):
+        return 'polygon %d has different points' % vertex_faces(retopo_face_counts)[
+            np.flatnonzero(retopo_vertices != cage_vertices)[0]]
+    return None
+
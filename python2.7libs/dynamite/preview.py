@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+# ===== preview.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module prepares and finishes low-resolution preview bakes of tangent-space normal maps. UVs of the retopo
+are rasterized into texels, and every texel gets a ray from the cage towards the retopo surface, which continues
+behind the retopo as far as the cage is in front of it. Rays are cast elsewhere (see geo_io.cast_rays()), then hit
+normals of the reference are encoded into the normal map and missed texels into a mask. Tangents are computed per
+triangle, so the normal map is only an approximation of what bakers using MikkTSpace produce.
+"""
+import mesh
+import numpy as np
+import triangulate
+import writers
+
+EPSILON = 1e-9
+FLAT_NORMAL = (128, 128, 255)
+
+
+class PreviewSamples(object):
+    """Texels of a preview bake and their rays.
+    Arguments:
+        resolution - width and height of the image.
+        texels - (N,) indices of covered pixels in row-major order, top row first.
+        origins - (N, 3) ray origins on the cage.
+        directions - (N, 3) ray directions, whose lengths are the ray lengths.
+        normals - (N, 3) unit normals of the retopo.
+        tangents - (N, 3) unit tangents of the retopo.
+        bitangents - (N, 3) unit bitangents of the retopo."""
+    __slots__ = ('resolution', 'texels', 'origins', 'directions', 'normals', 'tangents', 'bitangents')
+
+    def __init__(self, resolution, texels, origins, directions, normals, tangents, bitangents):
+        self.resolution = resolution
+        self.texels = texels
+        self.origins = origins
+        self.directions = directions
+        self.normals = normals
+        self.tangents = tangents
+        self.bitangents = bitangents
+
+
+def rasterize(uvs, triangles, resolution):
+    """Returns pixels whose centers are covered by triangles in UV space, the covering triangle of every pixel and
+    barycentric weights of the pixel center. Where triangles overlap, the first one wins.
+    :type uvs: numpy.ndarray
+    :type triangles: numpy.ndarray
+    :type resolution: int
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)"""
+    corners = uvs[triangles].astype(np.float64) * resolution
+    lower = np.clip(np.ceil(corners.min(axis=1) - 0.5), 0, resolution).astype(np.int64)
+    upper = np.clip(np.floor(corners.max(axis=1) - 0.5), -1, resolution - 1).astype(np.int64)
+    spans = np.maximum(upper - lower + 1, 0)
+    counts = spans.prod(axis=1)
+    candidates = np.repeat(np.arange(len(triangles)), counts)
+    local = np.arange(len(candidates)) - np.repeat(np.cumsum(counts) - counts, counts)
+    x = lower[candidates, 0] + local % spans[candidates, 0]
+    y = lower[candidates, 1] + local // spans[candidates, 0]
+
+    first = corners[candidates, 0]
+    to_second = corners[candidates, 1] - first
+    to_third = corners[candidates, 2] - first
+    to_center = np.column_stack((x + 0.5, y + 0.5)) - first
+    area = to_second[:, 0] * to_third[:, 1] - to_third[:, 0] * to_second[:, 1]
+    valid = np.abs(area) > EPSILON
+    area[~valid] = 1.0
+    second_weight = (to_center[:, 0] * to_third[:, 1] - to_third[:, 0] * to_center[:, 1]) / area
+    third_weight = (to_second[:, 0] * to_center[:, 1] - to_center[:, 0] * to_second[:, 1]) / area
+    weights = np.column_stack((1 - second_weight - third_weight, second_weight, third_weight))
+    inside = valid & (weights >= -EPSILON).all(axis=1)
+
+    # Image rows go from the top, while V goes up.
+    texels = (resolution - 1 - y[inside]) * resolution + x[inside]
+    texels, first_covering = np.unique(texels, return_index=True)
+    return texels, candidates[inside][first_covering], weights[inside][first_covering]
+
+
+def triangle_tangents(corner_points, corner_uvs):
+    """Returns per-triangle tangents and bitangents, the directions of increasing U and V on the surface, given
+    (T, 3, 3) positions and (T, 3, 2) UVs of triangle corners. They are not normalized and are zero for triangles
+    with degenerate UVs.
+    :type corner_points: numpy.ndarray
+    :type corner_uvs: numpy.ndarray
+    :rtype: (numpy.ndarray, numpy.ndarray)"""
+    positions = corner_points.astype(np.float64)
+    coordinates = corner_uvs.astype(np.float64)
+    edge1, edge2 = positions[:, 1] - positions[:, 0], positions[:, 2] - positions[:, 0]
+    uv1, uv2 = coordinates[:, 1] - coordinates[:, 0], coordinates[:, 2] - coordinates[:, 0]
+    determinant = uv1[:, 0] * uv2[:, 1] - uv2[:, 0] * uv1[:, 1]
+    valid = np.abs(determinant) > EPSILON
+    inverse = np.where(valid, 1.0 / np.where(valid, determinant, 1.0), 0.0)[:, np.newaxis]
+    tangents = (edge1 * uv2[:, 1, np.newaxis] - edge2 * uv1[:, 1, np.newaxis]) * inverse
+    bitangents = (edge2 * uv1[:, 0, np.newaxis] - edge1 * uv2[:, 0, np.newaxis]) * inverse
+    return tangents, bitangents
+
+
+def sample_texels(retopo, cage_points, resolution):
+    """Returns texels of a preview bake of the retopo bundle, which must have UVs, with rays from the matching cage
+    points.
+    :type retopo: mesh.Bundle
+    :type cage_points: numpy.ndarray
+    :type resolution: int
+    :rtype: PreviewSamples"""
+    if retopo.vertex_normals is not None:
+        vertex_normals = retopo.vertex_normals
+    else:
+        normals = retopo.normals
+        if normals is None:
+            normals = mesh.point_normals(retopo.points, retopo.vertices, retopo.face_counts)
+        vertex_normals = normals[retopo.vertices]
+    triangles = triangulate.fan(retopo.face_counts)
+    texels, texel_triangles, weights = rasterize(retopo.uvs, triangles, resolution)
+    corners = triangles[texel_triangles]
+
+    def interpolate(values):
+        return np.einsum('ij,ijk->ik', weights, values[corners].astype(np.float64))
+
+    retopo_positions = interpolate(retopo.points[retopo.vertices])
+    cage_positions = interpolate(cage_points[retopo.vertices])
+    normals = mesh.normalize(interpolate(vertex_normals))
+
+    # Tangent frames are orthogonalized against the interpolated normal, keeping the handedness of the UVs.
+    tangents, bitangents = triangle_tangents(retopo.points[retopo.vertices[triangles]], retopo.uvs[triangles])
+    tangents, bitangents = tangents[texel_triangles], bitangents[texel_triangles]
+    tangents = mesh.normalize(tangents - normals * np.einsum('ij,ij->i', normals, tangents)[:, np.newaxis])
+    handedness = np.where(np.einsum('ij,ij->i', np.cross(normals, tangents), bitangents) < 0, -1.0, 1.0)
+    bitangents = np.cross(normals, tangents) * handedness[:, np.newaxis]
+    return PreviewSamples(resolution, texels, cage_positions, 2.0 * (retopo_positions - cage_positions), normals,
+                          tangents, bitangents)
+
+
+def encode_normal_map(samples, hit_normals):
+    """Returns an RGB tangent-space normal map (OpenGL convention, green pointing up in UV space) and a grayscale
+    mask of missed texels. Hit normals of missed rays are zero. Uncovered and missed pixels get a flat normal.
+    :type samples: PreviewSamples
+    :type hit_normals: numpy.ndarray
+    :rtype: (numpy.ndarray, numpy.ndarray)"""
+    hit_normals = hit_normals.astype(np.float64)
+    missed = ~np.any(hit_normals != 0, axis=1)
+    tangent_normals = np.column_stack([np.einsum('ij,ij->i', hit_normals, axes)
+                                       for axes in (samples.tangents, samples.bitangents, samples.normals)])
+    colors = np.clip(np.round((tangent_normals + 1.0) * 127.5), 0, 255).astype(np.uint8)
+    colors[missed] = FLAT_NORMAL
+
+    pixel_count = samples.resolution * samples.resolution
+    normal_map = np.empty((pixel_count, 3), dtype=np.uint8)
+    normal_map[:] = FLAT_NORMAL
+    normal_map[samples.texels] = colors
+    mask = np.zeros(pixel_count, dtype=np.uint8)
+    mask[samples.texels[missed]] = 255
+    shape = (samples.resolution, samples.resolution)
+    return normal_map.reshape(shape + (3,)), mask.reshape(shape)
+
+
+def write_preview(normal_map_path, mask_path, samples, hit_normals):
+    """Writes the normal map and miss mask of a preview bake to PNG files and returns the ratio of missed texels.
+    :type normal_map_path: str
+    :type mask_path: str
+    :type samples: PreviewSamples
+    :type hit_normals: numpy.ndarray
+    :rtype: float"""
+    normal_map, mask = encode_normal_map(samples, hit_normals)
+    writers.write_png(normal_map_path, normal_map)
+    writers.write_png(mask_path, mask)
+    return float(np.count_nonzero(mask)) / max(len(samples.texels), 1)
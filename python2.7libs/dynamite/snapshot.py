@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# ===== snapshot.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module reads and writes cage state snapshots: compressed .npz files with the cage work of all bundles
+(peak distance, translation, subdivision iterations, relax settings and per-point offsets), so that it can be
+restored in another network or HIP file. Offsets of every bundle are quantized to int16 with their own scale, and
+every bundle keeps the topology digest of its cage, so that offsets are never applied to a different topology.
+"""
+import numpy as np
+
+VERSION = 1
+QUANTIZATION_STEPS = 32767
+
+
+class CageState(object):
+    """Cage work of one bundle.
+    Arguments:
+        name - name of the bake bundle.
+        topology - topology digest of the cage (see mesh.topology_hash()).
+        peak_dist - peak distance.
+        translate - translation of the bundle.
+        iterations - subdivision iterations.
+        offsets - (N, 3) array of per-point offsets or None if the cage has no edits.
+        relax_iterations - relax iterations.
+        relax_strength - relax strength."""
+    __slots__ = ('name', 'topology', 'peak_dist', 'translate', 'iterations', 'offsets', 'relax_iterations',
+                 'relax_strength')
+
+    def __init__(self, name, topology, peak_dist=0.0, translate=(0.0, 0.0, 0.0), iterations=0, offsets=None,
+                 relax_iterations=0, relax_strength=0.5):
+        self.name = name
+        self.topology = topology
+        self.peak_dist = float(peak_dist)
+        self.translate = tuple(float(value) for value in translate)
+        self.iterations = int(iterations)
+        self.offsets = None if offsets is None else np.asarray(offsets, dtype=np.float32).reshape(-1, 3)
+        self.relax_iterations = int(relax_iterations)
+        self.relax_strength = float(relax_strength)
+
+
+def quantize(offsets):
+    """Returns int16 offsets and the scale which restores them.
+    :type offsets: numpy.ndarray
+    :rtype: (numpy.ndarray, float)"""
+    magnitude = float(np.abs(offsets).max()) if len(offsets) else 0.0
+    scale = magnitude / QUANTIZATION_STEPS if magnitude > 0 else 1.0
+    return np.round(offsets / scale).astype(np.int16), scale
+
+
+def write_snapshot(path, states):
+    """Writes cage states to a compressed .npz file.
+    :type path: str
+    :type states: list[CageState]"""
+    offsets = [state.offsets if state.offsets is not None else np.zeros((0, 3)) for state in states]
+    quantized = [quantize(bundle_offsets) for bundle_offsets in offsets]
+    with open(path, 'wb') as snapshot_file:
+        np.savez_compressed(
+            snapshot_file, version=np.int32(VERSION),
+            names=np.array([state.name for state in states], dtype=np.str_),
+            topologies=np.array([state.topology for state in states], dtype=np.str_),
+            peak_dists=np.array([state.peak_dist for state in states], dtype=np.float32),
+            translates=np.array([state.translate for state in states], dtype=np.float32).reshape(-1, 3),
+            iterations=np.array([state.iterations for state in states], dtype=np.int32),
+            relax_iterations=np.array([state.relax_iterations for state in states], dtype=np.int32),
+            relax_strengths=np.array([state.relax_strength for state in states], dtype=np.float32),
+            offset_counts=np.array([len(bundle_offsets) for bundle_offsets in offsets], dtype=np.int64),
+            offset_scales=np.array([scale for _, scale in quantized], dtype=np.float64),
+            offsets=np.concatenate([values for values, _ in quantized]) if states else np.zeros((0, 3), np.int16))
+
+
+def read_snapshot(path):
+    """Returns cage states stored in a snapshot file.
+    :type path: str
+    :rtype: list[CageState]"""
+    with np.load(path) as archive:
+        if int(archive['version']) > VERSION:
+            raise ValueError('%s was written by a newer version of Dynamite.' % path)
+        counts = archive['offset_counts']
+        offsets = np.split(archive['offsets'], np.cumsum(counts)[:-1]) if len(counts) else []
+        return [CageState(str(name), str(topology), peak_dist, translate, iterations,
+                          bundle_offsets * scale if len(bundle_offsets) else None, relax_iteration_count,
+                          relax_strength)
+                for (name, topology, peak_dist, translate, iterations, bundle_offsets, scale, relax_iteration_count,
+                     relax_strength) in zip(archive['names'], archive['topologies'], archive['peak_dists'],
+                                            archive['translates'], archive['iterations'], offsets,
+                                            archive['offset_scales'], archive['relax_iterations'],
+                                            archive['relax_strengths'])]
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# ===== triangulate.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module triangulates polygons of a bake bundle. Three modes are available:
+    fan - triangles share the first vertex of the polygon. Only correct for convex polygons.
+    ear_clipping - reflex vertices are respected, so concave polygons are triangulated correctly.
+    delaunay - constrained Delaunay triangulation of every polygon, which avoids slivers where possible.
+Triangles and quads, which make up nearly all of retopo meshes, are processed with vectorized NumPy code;
+only polygons with more sides are triangulated one by one. Triangles are returned as indices into the vertex
+array, polygon after polygon, with the winding of their polygons.
+"""
+import hashlib
+import cache
+import mesh
+import numpy as np
+
+FAN = 'fan'
+EAR_CLIPPING = 'ear_clipping'
+DELAUNAY = 'delaunay'
+MODES = (FAN, EAR_CLIPPING, DELAUNAY)
+
+# Local corners of both ways to split a quad.
+_QUAD_SPLIT_02 = np.array([[0, 1, 2], [0, 2, 3]])
+_QUAD_SPLIT_13 = np.array([[1, 2, 3], [1, 3, 0]])
+
+
+def triangle_offsets(face_counts):
+    """Returns the number of triangles of every polygon and the index of its first triangle.
+    :type face_counts: numpy.ndarray
+    :rtype: (numpy.ndarray, numpy.ndarray)"""
+    triangle_counts = np.maximum(face_counts.astype(np.int64) - 2, 0)
+    offsets = np.zeros(len(face_counts), dtype=np.int64)
+    np.cumsum(triangle_counts[:-1], out=offsets[1:])
+    return triangle_counts, offsets
+
+
+def triangle_slots(face_counts, triangles):
+    """Returns local corners of triangles given by indices into the vertex array, stored at the vertices of their
+    polygons: the k-th triangle of a polygon at its k-th vertex. Slots of the last two vertices, which have no
+    triangle, are -1.
+    :type face_counts: numpy.ndarray
+    :type triangles: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    triangle_counts, offsets = triangle_offsets(face_counts)
+    if len(triangles) != triangle_counts.sum():
+        raise ValueError('Expected %d triangles, got %d.' % (triangle_counts.sum(), len(triangles)))
+    faces = np.repeat(np.arange(len(face_counts)), triangle_counts)
+    starts = mesh.face_starts(face_counts)[faces]
+    slots = np.full((int(face_counts.sum()), 3), -1, dtype=np.int64)
+    slots[starts + np.arange(len(faces)) - offsets[faces]] = triangles - starts[:, np.newaxis]
+    return slots
+
+
+def fan(face_counts):
+    """Returns fan triangles of all polygons.
+    :type face_counts: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    triangle_counts, offsets = triangle_offsets(face_counts)
+    faces = np.repeat(np.arange(len(face_counts)), triangle_counts)
+    starts = mesh.face_starts(face_counts)[faces]
+    local = np.arange(len(faces)) - offsets[faces] + 1
+    return np.column_stack((starts, starts + local, starts + local + 1))
+
+
+def triangulate(points, vertices, face_counts, mode=EAR_CLIPPING):
+    """Returns triangles of all polygons.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type mode: str
+    :rtype: numpy.ndarray"""
+    if mode not in MODES:
+        raise ValueError('Unknown triangulation mode: %s.' % mode)
+    if mode == FAN:
+        return fan(face_counts)
+
+    triangles = np.empty((int(np.maximum(face_counts.astype(np.int64) - 2, 0).sum()), 3), dtype=np.int64)
+    _, offsets = triangle_offsets(face_counts)
+    starts = mesh.face_starts(face_counts)
+
+    faces = np.flatnonzero(face_counts == 3)
+    triangles[offsets[faces]] = starts[faces, np.newaxis] + np.arange(3)
+
+    faces = np.flatnonzero(face_counts == 4)
+    if len(faces):
+        corners = starts[faces, np.newaxis] + np.arange(4)
+        split_13 = _split_quads_13(points[vertices[corners]].astype(np.float64), mode == DELAUNAY)
+        local = np.where(split_13[:, np.newaxis, np.newaxis], _QUAD_SPLIT_13, _QUAD_SPLIT_02)
+        quad_triangles = corners[np.arange(len(faces))[:, np.newaxis], local.reshape(-1, 6)].reshape(-1, 2, 3)
+        triangles[offsets[faces]] = quad_triangles[:, 0]
+        triangles[offsets[faces] + 1] = quad_triangles[:, 1]
+
+    for face in np.flatnonzero(face_counts > 4):
+        count = int(face_counts[face])
+        xy = _project(points[vertices[starts[face]:starts[face] + count]].astype(np.float64))
+        local = _ear_clip(xy)
+        if mode == DELAUNAY:
+            local = _flip_to_delaunay(xy, local)
+        triangles[offsets[face]:offsets[face] + count - 2] = starts[face] + np.array(local)
+    return triangles
+
+
+def cached_triangles(points, vertices, face_counts, mode=EAR_CLIPPING):
+    """Returns triangles of all polygons from the geometry cache, triangulating on a miss. Fan triangles only
+    depend on the topology. Other modes also depend on the shape of polygons, which is hashed after normalizing
+    the bundle's position and size, so that translating or scaling a bundle keeps its triangles cached.
+    :type points: numpy.ndarray
+    :type vertices: numpy.ndarray
+    :type face_counts: numpy.ndarray
+    :type mode: str
+    :rtype: numpy.ndarray"""
+    digest = hashlib.sha1(mesh.topology_hash(len(points), vertices, face_counts))
+    if mode != FAN and len(points):
+        normalized = points - points.min(axis=0)
+        normalized /= max(float(normalized.max()), 1e-12)
+        digest.update(np.round(normalized * 1e5).astype(np.int32).tostring())
+    key = 'triangles_%s_%s' % (mode, digest.hexdigest())
+    entry = cache.shared_cache().get(key)
+    if entry is None:
+        entry = {'triangles': triangulate(points, vertices, face_counts, mode).astype(np.int32)}
+        cache.shared_cache().set(key, entry)
+    return entry['triangles']
+
+
+def _split_quads_13(quads, delaunay):
+    """Returns whether quads are split along the diagonal between their second and fourth vertex.
+    :type quads: numpy.ndarray
+    :type delaunay: bool
+    :rtype: numpy.ndarray"""
+    following = np.roll(quads, -1, axis=1)
+    preceding = np.roll(quads, 1, axis=1)
+    normals = np.cross(quads, following).sum(axis=1)
+    turns = np.einsum('qij,qj->qi', np.cross(quads - preceding, following - quads), normals)
+    # A reflex vertex must be an end of the diagonal.
+    split_13 = (turns[:, 1] <= 0) | (turns[:, 3] <= 0)
+    if delaunay:
+        convex = (turns > 0).all(axis=1)
+        to_preceding = preceding - quads
+        to_following = following - quads
+        cosines = np.einsum('qij,qij->qi', to_preceding, to_following)
+        sines = np.sqrt(np.square(np.cross(to_preceding, to_following)).sum(axis=2))
+        angles = np.arctan2(sines, cosines)
+        # The 0-2 diagonal is locally Delaunay if the angles opposite to it sum up to at most 180 degrees.
+        split_13 = np.where(convex, angles[:, 1] + angles[:, 3] > np.pi, split_13)
+    return split_13
+
+
+def _project(polygon):
+    """Projects a 3D polygon onto the plane of its dominant normal axis, so that its vertices go
+    counter-clockwise.
+    :type polygon: numpy.ndarray
+    :rtype: numpy.ndarray"""
+    normal = np.cross(polygon, np.roll(polygon, -1, axis=0)).sum(axis=0)
+    axis = int(np.argmax(np.abs(normal)))
+    xy = polygon[:, [(axis + 1) % 3, (axis + 2) % 3]]
+    if normal[axis] < 0:
+        xy[:, 0] = -xy[:, 0]
+    return xy
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _ear_clip(xy):
+    """Returns local triangles of a counter-clockwise 2D polygon.
+    :type xy: numpy.ndarray
+    :rtype: list[tuple[int]]"""
+    remaining = list(range(len(xy)))
+    triangles = []
+    while len(remaining) > 3:
+        for index in range(len(remaining)):
+            previous, current, following = remaining[index - 1], remaining[index], \
+                remaining[(index + 1) % len(remaining)]
+            if _cross(xy[previous], xy[current], xy[following]) <= 0:
+                continue
+            if any(_cross(xy[previous], xy[current], xy[other]) >= 0 and
+                   _cross(xy[current], xy[following], xy[other]) >= 0 and
+                   _cross(xy[following], xy[previous], xy[other]) >= 0
+                   for other in remaining if other not in (previous, current, following)):
+                continue
+            triangles.append((previous, current, following))
+            del remaining[index]
+            break
+        else:
+            # Degenerate (e.g. self-intersecting) polygon. Fan out whatever is left.
+            triangles.extend((remaining[0], remaining[k], remaining[k + 1]) for k in range(1, len(remaining) - 1))
+            return triangles
+    triangles.append(tuple(remaining))
+    return triangles
+
+
+def _in_circumcircle(a, b, c, d):
+    """Returns True if point d lies inside the circumcircle of counter-clockwise triangle abc."""
+    matrix = np.array([[a[0] - d[0], a[1] - d[1], (a[0] - d[0]) ** 2 + (a[1] - d[1]) ** 2],
+                       [b[0] - d[0], b[1] - d[1], (b[0] - d[0]) ** 2 + (b[1] - d[1]) ** 2],
+                       [c[0] - d[0], c[1] - d[1], (c[0] - d[0]) ** 2 + (c[1] - d[1]) ** 2]])
+    return np.linalg.det(matrix) > 1e-12
+
+
+def _flip_to_delaunay(xy, triangles):
+    """Flips diagonals of a triangulated 2D polygon until it is constrained Delaunay. Polygon edges are the
+    constraints, so only diagonals are flipped.
+    :type xy: numpy.ndarray
+    :type triangles: list[tuple[int]]
+    :rtype: list[tuple[int]]"""
+    triangles = [list(triangle) for triangle in triangles]
+    for _ in range(len(xy) ** 2):
+        edges = {}
+        for index, triangle in enumerate(triangles):
+            for k in range(3):
+                edges[(triangle[k], triangle[(k + 1) % 3])] = index
+        flipped = False
+        for (a, b), first in edges.items():
+            second = edges.get((b, a))
+            if second is None or first > second:
+                continue
+            c = [vertex for vertex in triangles[first] if vertex not in (a, b)][0]
+            d = [vertex for vertex in triangles[second] if vertex not in (a, b)][0]
+            if not _in_circumcircle(xy[a], xy[b], xy[c], xy[d]):
+                continue
+            if _cross(xy[c], xy[a], xy[d]) <= 0 or _cross(xy[d], xy[b], xy[c]) <= 0:
+                continue
+            triangles[first] = [c, a, d]
+            triangles[second] = [d, b, c]
+            flipped = True
+            break
+        if not flipped:
+            break
+    return [tuple(triangle) for triangle in triangles]
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+
+# ===== writers.py
+#
+# Copyright (c) 2018 Artur J. Żarek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module writes mesh.Bundle arrays to Wavefront OBJ and FilmBox FBX (7.4, binary or ASCII) files
+directly, without ROPs or temporary nodes. Every bundle becomes one named object, so that name
+correspondence baking works the same as with files exported by Houdini. Polygon winding is reversed
+to the counter-clockwise order both formats expect. OBJ files are streamed one bundle at a time and can be
+gzip compressed. The module also writes 8-bit PNG images of preview bakes.
+"""
+import gzip
+import os
+import struct
+import zlib
+import mesh
+import numpy as np
+
+BUFFER_SIZE = 1 << 20
+GZIP_LEVEL = 6
+FBX_VERSION = 7400
+# Binary FBX readers expect this FileId and CreationTime pair, and the footer magic below.
+FBX_FILE_ID = b'\x28\xb3\x2a\xeb\xb6\x24\xcc\xc2\xbf\xc8\xb0\x2a\xa9\x2b\xfc\xf1'
+FBX_CREATION_TIME = '1970-01-01 10:00:00:000'
+FBX_FOOTER_ID = b'\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e'
+FBX_FOOTER_MAGIC = b'\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b'
+FBX_CREATOR = 'Dynamite'
+
+
+def export_arrays(bundle):
+    """Returns arrays of a bundle as they are written to files: points, vertices, face counts, vertex normals
+    and UVs (or None), with the polygon winding reversed. Point normals are used where vertex normals are missing,
+    and computed where both are.
+    :type bundle: mesh.Bundle
+    :rtype: tuple"""
+    order = mesh.reversed_vertex_order(bundle.face_counts)
+    if bundle.vertex_normals is not None:
+        vertex_normals = bundle.vertex_normals[order]
+    else:
+        normals = bundle.normals
+        if normals is None:
+            normals = mesh.point_normals(bundle.points, bundle.vertices, bundle.face_counts)
+        vertex_normals = normals[bundle.vertices[order]]
+    uvs = bundle.uvs[order] if bundle.uvs is not None else None
+    return bundle.points, bundle.vertices[order], bundle.face_counts, vertex_normals, uvs
+
+
+def prepare_directory(path):
+    """Creates the parent directory of a file path if it doesn't exist.
+    :type path: str"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+
+# ===== OBJ
+
+def format_rows(row_format, array):
+    """Formats all rows of a 2D array with a printf-style row format in one operation.
+    :type row_format: str
+    :type array: numpy.ndarray
+    :rtype: str"""
+    if not len(array):
+        return ''
+    return (row_format * len(array)) % tuple(array.ravel().tolist())
+
+
+def format_obj(bundle, point_offset=0, vertex_offset=0):
+    """Returns the OBJ text of a bundle. Offsets are numbers of points and vertices (i.e. of 'v' and of 'vt' and
+    'vn' records) written to the file before the bundle.
+    :type bundle: mesh.Bundle
+    :type point_offset: int
+    :type vertex_offset: int
+    :rtype: str"""
+    points, vertices, face_counts, vertex_normals, uvs = export_arrays(bundle)
+    chunks = ['g %s\n' % bundle.name, format_rows('v %.9g %.9g %.9g\n', points)]
+    columns = [vertices.astype(np.int64) + point_offset + 1]
+    vertex_numbers = np.arange(len(vertices), dtype=np.int64) + vertex_offset + 1
+    if uvs is not None:
+        chunks.append(format_rows('vt %.7g %.7g\n', uvs))
+        columns.append(vertex_numbers)
+        corner_format = ' %d/%d/%d'
+    else:
+        corner_format = ' %d//%d'
+    chunks.append(format_rows('vn %.6g %.6g %.6g\n', vertex_normals))
+    columns.append(vertex_numbers)
+    corners = np.column_stack(columns)
+
+    # Polygons are formatted in runs of equal vertex counts, which keeps their order.
+    run_starts = np.concatenate(([0], np.flatnonzero(face_counts[1:] != face_counts[:-1]) + 1))
+    run_ends = np.append(run_starts[1:], len(face_counts))
+    first_corners = mesh.face_starts(face_counts)
+    for run_start, run_end in zip(run_starts, run_ends):
+        if run_start == run_end:
+            continue
+        count = int(face_counts[run_start])
+        corner_end = first_corners[run_end - 1] + count
+        chunks.append(format_rows('f%s\n' % (corner_format * count), corners[first_corners[run_start]:corner_end]
+                                  .reshape(run_end - run_start, -1)))
+    return ''.join(chunks)
+
+
+def is_obj_path(path):
+    """Returns True if a path is an OBJ file, optionally gzip compressed (.obj.gz).
+    :type path: str
+    :rtype: bool"""
+    return path.lower().endswith(('.obj', '.obj.gz'))
+
+
+def open_output(path):
+    """Opens a file for buffered binary writing. Paths ending with .gz are gzip compressed.
+    :type path: str
+    :rtype: file"""
+    prepare_directory(path)
+    if path.lower().endswith('.gz'):
+        return gzip.open(path, 'wb', GZIP_LEVEL)
+    return open(path, 'wb', BUFFER_SIZE)
+
+
+def write_obj(path, bundles):
+    """Writes bundles to an OBJ file, formatting and writing one bundle at a time. Bundles may be a generator
+    (e.g. reading geometry from hou), so that only one bundle is held in memory.
+    :type path: str
+    :type bundles: collections.Iterable[mesh.Bundle]"""
+    with open_output(path) as obj_file:
+        obj_file.write('# %s\n' % FBX_CREATOR)
+        point_offset = 0
+        vertex_offset = 0
+        for bundle in bundles:
+            obj_file.write(format_obj(bundle, point_offset, vertex_offset))
+            point_offset += bundle.point_count()
+            vertex_offset += len(bundle.vertices)
+
+
+# ===== FBX
+
+class FbxNode(object):
+    """Node of the FBX document tree. Properties are (type code, value) pairs, where type codes are those of
+    the binary format: 'I' int32, 'L' int64, 'D' double, 'C' bool, 'S' string, 'R' raw bytes, and 'i', 'd'
+    for int32 and double arrays."""
+    __slots__ = ('name', 'properties', 'children')
+
+    def __init__(self, name, properties=(), children=()):
+        self.name = name
+        self.properties = list(properties)
+        self.children = list(children)
+
+    def add(self, name, *properties):
+        """Appends a child node and returns it.
+        :type name: str
+        :rtype: FbxNode"""
+        child = FbxNode(name, properties)
+        self.children.append(child)
+        return child
+
+
+def _fbx_properties70(node, properties):
+    """Appends a Properties70 block of (name, type, label, flags, value) entries."""
+    block = node.add('Properties70')
+    for name, property_type, label, value_type, value in properties:
+        block.add('P', ('S', name), ('S', property_type), ('S', label), ('S', ''), (value_type, value))
+    return block
+
+
+def _fbx_name(name, class_name, binary):
+    return '%s\x00\x01%s' % (name, class_name) if binary else '%s::%s' % (class_name, name)
+
+
+def fbx_document(bundles, binary=True):
+    """Returns top-level nodes of an FBX document with one mesh model per bundle.
+    :type bundles: collections.Iterable[mesh.Bundle]
+    :type binary: bool
+    :rtype: list[FbxNode]"""
+    header = FbxNode('FBXHeaderExtension')
+    header.add('FBXHeaderVersion', ('I', 1003))
+    header.add('FBXVersion', ('I', FBX_VERSION))
+    header.add('EncryptionType', ('I', 0))
+    header.add('Creator', ('S', FBX_CREATOR))
+
+    settings = FbxNode('GlobalSettings')
+    settings.add('Version', ('I', 1000))
+    _fbx_properties70(settings, (('UpAxis', 'int', 'Integer', 'I', 1), ('UpAxisSign', 'int', 'Integer', 'I', 1),
+                                 ('FrontAxis', 'int', 'Integer', 'I', 2), ('FrontAxisSign', 'int', 'Integer', 'I', 1),
+                                 ('CoordAxis', 'int', 'Integer', 'I', 0), ('CoordAxisSign', 'int', 'Integer', 'I', 1),
+                                 ('UnitScaleFactor', 'double', 'Number', 'D', 1.0)))
+
+    objects = FbxNode('Objects')
+    connections = FbxNode('Connections')
+    count = 0
+    for count, bundle in enumerate(bundles, 1):
+        points, vertices, face_counts, vertex_normals, uvs = export_arrays(bundle)
+        geometry_id, model_id = 2 * count + 1000000, 2 * count + 1000001
+        # The last vertex of every polygon is stored as a bitwise negation.
+        polygon_vertices = vertices.astype(np.int32)
+        last_vertices = mesh.face_starts(face_counts) + face_counts - 1
+        polygon_vertices[last_vertices] = ~polygon_vertices[last_vertices]
+
+        geometry = objects.add('Geometry', ('L', geometry_id), ('S', _fbx_name(bundle.name, 'Geometry', binary)),
+                               ('S', 'Mesh'))
+        geometry.add('Vertices', ('d', points))
+        geometry.add('PolygonVertexIndex', ('i', polygon_vertices))
+        geometry.add('GeometryVersion', ('I', 124))
+        layer = FbxNode('Layer', [('I', 0)])
+        layer.add('Version', ('I', 100))
+
+        normals = geometry.add('LayerElementNormal', ('I', 0))
+        normals.add('Version', ('I', 101))
+        normals.add('Name', ('S', ''))
+        normals.add('MappingInformationType', ('S', 'ByPolygonVertex'))
+        normals.add('ReferenceInformationType', ('S', 'Direct'))
+        normals.add('Normals', ('d', vertex_normals))
+        layer_element = layer.add('LayerElement')
+        layer_element.add('Type', ('S', 'LayerElementNormal'))
+        layer_element.add('TypedIndex', ('I', 0))
+
+        if uvs is not None:
+            uv_element = geometry.add('LayerElementUV', ('I', 0))
+            uv_element.add('Version', ('I', 101))
+            uv_element.add('Name', ('S', 'uv'))
+            uv_element.add('MappingInformationType', ('S', 'ByPolygonVertex'))
+            uv_element.add('ReferenceInformationType', ('S', 'IndexToDirect'))
+            uv_element.add('UV', ('d', uvs))
+            uv_element.add('UVIndex', ('i', np.arange(len(uvs), dtype=np.int32)))
+            layer_element = layer.add('LayerElement')
+            layer_element.add('Type', ('S', 'LayerElementUV'))
+            layer_element.add('TypedIndex', ('I', 0))
+        geometry.children.append(layer)
+
+        model = objects.add('Model', ('L', model_id), ('S', _fbx_name(bundle.name, 'Model', binary)), ('S', 'Mesh'))
+        model.add('Version', ('I', 232))
+        _fbx_properties70(model, ())
+        model.add('Shading', ('C', True))
+        model.add('Culling', ('S', 'CullingOff'))
+
+        connections.add('C', ('S', 'OO'), ('L', geometry_id), ('L', model_id))
+        connections.add('C', ('S', 'OO'), ('L', model_id), ('L', 0))
+
+    definitions = FbxNode('Definitions')
+    definitions.add('Version', ('I', 100))
+    definitions.add('Count', ('I', 2 * count + 1))
+    for object_type, object_count in (('GlobalSettings', 1), ('Model', count), ('Geometry', count)):
+        definitions.add('ObjectType', ('S', object_type)).add('Count', ('I', object_count))
+
+    nodes = [header]
+    if binary:
+        nodes += [FbxNode('FileId', [('R', FBX_FILE_ID)]), FbxNode('CreationTime', [('S', FBX_CREATION_TIME)]),
+                  FbxNode('Creator', [('S', FBX_CREATOR)])]
+    return nodes + [settings, definitions, objects, connections]
+
+
+_FBX_SCALARS = {'I': '<i', 'L': '<q', 'D': '<d', 'C': '<?'}
+_FBX_ARRAYS = {'i': '<i4', 'd': '<f8'}
+_FBX_NULL_RECORD = b'\x00' * 13
+
+
+def _encode_fbx_property(type_code, value):
+    if type_code in _FBX_SCALARS:
+        return type_code + struct.pack(_FBX_SCALARS[type_code], value)
+    if type_code in ('S', 'R'):
+        return type_code + struct.pack('<I', len(value)) + value
+    array = np.ascontiguousarray(value, dtype=_FBX_ARRAYS[type_code]).ravel()
+    data = zlib.compress(array.tostring(), 1)
+    return type_code + struct.pack('<III', len(array), 1, len(data)) + data
+
+
+def _encode_fbx_node(node, offset):
+    """Returns bytes of a binary FBX node record which starts at a given file offset.
+    :type node: FbxNode
+    :type offset: int
+    :rtype: str"""
+    properties = ''.join(_encode_fbx_property(type_code, value) for type_code, value in node.properties)
+    children_offset = offset + 13 + len(node.name) + len(properties)
+    children = []
+    for child in node.children:
+        children.append(_encode_fbx_node(child, children_offset))
+        children_offset += len(children[-1])
+    if node.children or not node.properties:
+        children.append(_FBX_NULL_RECORD)
+        children_offset += len(_FBX_NULL_RECORD)
+    return struct.pack('<IIIB', children_offset, len(node.properties), len(properties), len(node.name)) + \
+        node.name + properties + ''.join(children)
+
+
+def _format_fbx_value(type_code, value):
+    if type_code == 'S':
+        return '"%s"' % value.replace('"', '&quot;')
+    if type_code == 'C':
+        return 'T' if value else 'F'
+    if type_code == 'D':
+        return '%.17g' % value
+    return str(value)
+
+
+def _write_fbx_ascii_node(fbx_file, node, depth):
+    indent = '\t' * depth
+    array = [value for type_code, value in node.properties if type_code in _FBX_ARRAYS]
+    if array:
+        array = np.asarray(array[0]).ravel()
+        row_format = '%d,' if array.dtype.kind in 'iu' else '%.9g,'
+        fbx_file.write('%s%s: *%d {\n%s\ta: %s\n%s}\n' % (indent, node.name, len(array), indent,
+                                                         format_rows(row_format, array)[:-1], indent))
+        return
+    properties = ', '.join(_format_fbx_value(type_code, value) for type_code, value in node.properties)
+    if node.children or not node.properties:
+        fbx_file.write('%s%s: %s {\n' % (indent, node.name, properties))
+        for child in node.children:
+            _write_fbx_ascii_node(fbx_file, child, depth + 1)
+        fbx_file.write('%s}\n' % indent)
+    else:
+        fbx_file.write('%s%s: %s\n' % (indent, node.name, properties))
+
+
+def write_fbx(path, bundles, ascii=False):
+    """Writes bundles to an FBX 7.4 file, which can be read by FBX SDK 2014 and later.
+    :type path: str
+    :type bundles: collections.Iterable[mesh.Bundle]
+    :type ascii: bool"""
+    prepare_directory(path)
+    nodes = fbx_document(bundles, binary=not ascii)
+    with open(path, 'wb', BUFFER_SIZE) as fbx_file:
+        if ascii:
+            fbx_file.write('; FBX %d.%d.0 project file\n' % (FBX_VERSION // 1000, FBX_VERSION % 1000 // 100))
+            for node in nodes:
+                _write_fbx_ascii_node(fbx_file, node, 0)
+            return
+
+        fbx_file.write(b'Kaydara FBX Binary  \x00\x1a\x00' + struct.pack('<I', FBX_VERSION))
+        offset = fbx_file.tell()
+        for node in nodes:
+            record = _encode_fbx_node(node, offset)
+            fbx_file.write(record)
+            offset += len(record)
+        fbx_file.write(_FBX_NULL_RECORD)
+        fbx_file.write(FBX_FOOTER_ID + b'\x00' * 4)
+        padding = (16 - fbx_file.tell() % 16) or 16
+        fbx_file.write(b'\x00' * padding + struct.pack('<I', FBX_VERSION) + b'\x00' * 120 + FBX_FOOTER_MAGIC)
+
+
+# ===== PNG
+
+def _png_chunk(chunk_type, data):
+    """Returns a PNG chunk with its length and checksum.
+    :type chunk_type: bytes
+    :type data: bytes
+    :rtype: bytes"""
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) &
+                                                                          0xffffffff)
+
+
+def write_png(path, pixels):
+    """Writes an 8-bit grayscale (H, W) or RGB (H, W, 3) array to a PNG file. The first row is the top of the image.
+    :type path: str
+    :type pixels: numpy.ndarray"""
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    color_type = 2 if pixels.ndim == 3 else 0
+    # Every row starts with the filter type byte, 0 meaning no filtering.
+    rows = np.zeros((height, 1 + pixels[0].size), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, -1)
+    prepare_directory(path)
+    with open(path, 'wb') as png_file:
+        png_file.write(b'\x89PNG\r\n\x1a\n')
+        png_file.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+        png_file.write(_png_chunk(b'IDAT', zlib.compress(rows.tostring(), GZIP_LEVEL)))
+        png_file.write(_png_chunk(b'IEND', b''))
@@ -0,0 +1,9 @@
+"""Tests of modules which don't depend on hou. Run them with Python 2.7 and NumPy from the repository root:
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python2.7libs',
+                                'dynamite'))
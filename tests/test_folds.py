@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+import tests  # noqa: F401 (puts Dynamite modules on the path)
+import folds
+
+# Two triangles piercing each other, and a third one far away from both.
+POINTS = np.array([[0, 0, 0], [2, 0, 0], [0, 2, 0],
+                   [0.5, 0.5, -1], [0.5, 0.5, 1], [1.5, 1.5, 0],
+                   [10, 10, 10], [11, 10, 10], [10, 11, 10]], dtype=np.float32)
+
+
+class FoldsTest(unittest.TestCase):
+    def test_intersecting_triangles(self):
+        triangles = np.arange(9).reshape(3, 3)
+        np.testing.assert_array_equal(folds.intersecting_triangles(POINTS, triangles), [0, 1])
+
+    def test_adjacent_triangles_are_not_intersections(self):
+        triangles = np.array([[0, 1, 2], [1, 2, 4]])
+        self.assertEqual(len(folds.intersecting_triangles(POINTS, triangles)), 0)
+
+    def test_candidate_pairs_skip_distant_triangles(self):
+        pairs = folds.candidate_pairs(POINTS[np.arange(9).reshape(3, 3)].astype(np.float64))
+        np.testing.assert_array_equal(pairs, [[0, 1]])
+
+    def test_candidate_pairs_of_an_oversized_triangle(self):
+        small = np.random.RandomState(0).uniform(0, 100, (1000, 1, 3)) + [[0, 0, 0], [0.1, 0, 0], [0, 0.1, 0]]
+        large = np.array([[[0, 0, 0], [100, 0, 0], [0, 100, 100]]])
+        pairs = folds.candidate_pairs(np.concatenate((small, large)))
+        lower, upper = small.min(axis=1), small.max(axis=1)
+        expected = np.flatnonzero((lower <= large.max(axis=1)).all(axis=1) & (upper >= 0).all(axis=1))
+        np.testing.assert_array_equal(pairs[pairs[:, 1] == 1000, 0], expected)
+
+    def test_candidate_pairs_of_degenerate_triangles(self):
+        # Degenerate triangles along a diagonal, and one covering the first third of them.
+        corners = np.repeat(np.arange(3000, dtype=np.float64).reshape(-1, 1, 3), 3, axis=1)
+        corners[0] = [[0, 0, 0], [3000, 0, 0], [0, 3000, 3000]]
+        pairs = folds.candidate_pairs(corners)
+        np.testing.assert_array_equal(pairs, np.column_stack((np.zeros(999), np.arange(1, 1000))))
+
+    def test_flipped_faces(self):
+        vertices, counts = np.array([0, 1, 2, 6, 7, 8]), np.array([3, 3])
+        flipped_points = POINTS.copy()
+        flipped_points[[7, 8]] = flipped_points[[8, 7]]
+        np.testing.assert_array_equal(folds.flipped_faces(flipped_points, vertices, counts, POINTS), [1])
+
+    def test_detect_folds(self):
+        vertices = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8])
+        counts = np.array([3, 3, 3])
+        np.testing.assert_array_equal(folds.detect_folds(POINTS, vertices, counts, POINTS), [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
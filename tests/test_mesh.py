@@ -0,0 +1,104 @@
+import unittest
+import numpy as np
+import tests  # noqa: F401 (puts Dynamite modules on the path)
+import mesh
+
+CUBE_POINTS = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=np.float32)
+# Point numbers are 4x + 2y + z; polygons are wound clockwise seen from outside, like in Houdini.
+CUBE_VERTICES = np.array([[2, 3, 1, 0], [5, 7, 6, 4], [1, 5, 4, 0], [6, 7, 3, 2], [4, 6, 2, 0], [3, 7, 5, 1]])
+
+
+def cube(name='cube'):
+    return mesh.Bundle(name, CUBE_POINTS, CUBE_VERTICES.ravel(), np.full(6, 4), group_names=(name,))
+
+
+class BundleTest(unittest.TestCase):
+    def test_face_counts_must_add_up(self):
+        with self.assertRaises(ValueError):
+            mesh.Bundle('broken', CUBE_POINTS, CUBE_VERTICES.ravel(), np.full(5, 4))
+
+    def test_topology_hash_ignores_points(self):
+        moved = cube().copy(points=CUBE_POINTS * 2)
+        self.assertEqual(cube().topology_hash(), moved.topology_hash())
+        self.assertNotEqual(cube().content_hash(), moved.content_hash())
+
+    def test_content_hash_covers_winding(self):
+        reversed_vertices = CUBE_VERTICES[:, ::-1].ravel()
+        self.assertNotEqual(mesh.content_hash(CUBE_POINTS, CUBE_VERTICES.ravel(), np.full(6, 4)),
+                            mesh.content_hash(CUBE_POINTS, reversed_vertices, np.full(6, 4)))
+        self.assertEqual(cube().content_hash(), mesh.content_hash(CUBE_POINTS.astype(np.float64),
+                                                                  CUBE_VERTICES.ravel(), np.full(6, 4)))
+
+
+class NormalsTest(unittest.TestCase):
+    def test_face_normals_point_outwards(self):
+        normals = mesh.face_normals(CUBE_POINTS, CUBE_VERTICES.ravel(), np.full(6, 4))
+        centers = CUBE_POINTS[CUBE_VERTICES].mean(axis=1)
+        np.testing.assert_allclose(normals, centers, atol=1e-6)
+
+    def test_point_normals_are_corner_diagonals(self):
+        normals = mesh.point_normals(CUBE_POINTS, CUBE_VERTICES.ravel(), np.full(6, 4))
+        np.testing.assert_allclose(normals, CUBE_POINTS / np.sqrt(3), atol=1e-6)
+
+    def test_reversed_vertex_order(self):
+        order = mesh.reversed_vertex_order(np.array([3, 4]))
+        np.testing.assert_array_equal(order, [2, 1, 0, 6, 5, 4, 3])
+
+
+class TopologyTest(unittest.TestCase):
+    def test_topology_mismatch(self):
+        vertices, counts = CUBE_VERTICES.ravel(), np.full(6, 4)
+        self.assertIsNone(mesh.topology_mismatch((8, vertices, counts), (8, vertices.copy(), counts.copy())))
+        self.assertEqual(mesh.topology_mismatch((8, vertices, counts), (9, vertices, counts)),
+                         '9 cage points, 8 retopo points')
+        swapped = vertices.copy()
+        swapped[[4, 5]] = swapped[[5, 4]]
+        self.assertEqual(mesh.topology_mismatch((8, vertices, counts), (8, swapped, counts)),
+                         'polygon 1 has different points')
+
+    def test_point_edges(self):
+        self.assertEqual(len(mesh.point_edges(CUBE_VERTICES.ravel(), np.full(6, 4))), 12)
+
+    def test_relax_keeps_uniform_offsets(self):
+        edges = mesh.point_edges(CUBE_VERTICES.ravel(), np.full(6, 4))
+        offsets = np.tile([0.0, 1.0, 0.0], (8, 1))
+        np.testing.assert_allclose(mesh.relax_offsets(offsets, edges, 10, 0.5), offsets, atol=1e-9)
+
+    def test_relax_smooths_a_spike(self):
+        edges = mesh.point_edges(CUBE_VERTICES.ravel(), np.full(6, 4))
+        offsets = np.zeros((8, 3))
+        offsets[7] = 1.0
+        relaxed = mesh.relax_offsets(offsets, edges, 5, 0.5)
+        self.assertLess(relaxed[7, 0], 1.0)
+        self.assertGreater(relaxed[3, 0], 0.0)
+
+
+class SignatureTest(unittest.TestCase):
+    def test_group_signature_ignores_other_points(self):
+        points = np.vstack((CUBE_POINTS, CUBE_POINTS + 5))
+        vertices = np.concatenate((CUBE_VERTICES.ravel(), CUBE_VERTICES.ravel() + 8))
+        counts = np.full(12, 4)
+        first = mesh.group_signature(points, vertices, counts, np.arange(6))
+        second = mesh.group_signature(points, vertices, counts, np.arange(6, 12))
+        self.assertEqual(first['polygons'], 6)
+        self.assertEqual(first['topology'], second['topology'])
+        self.assertNotEqual(first['digest'], second['digest'])
+        np.testing.assert_allclose(second['centroid'], [5, 5, 5])
+        np.testing.assert_allclose(second['size'], [2, 2, 2])
+
+    def test_match_renames(self):
+        signature = mesh.group_signature(CUBE_POINTS, CUBE_VERTICES.ravel(), np.full(6, 4), np.arange(6))
+        far = dict(signature, centroid=[50.0, 0.0, 0.0])
+        renames, uncertain = mesh.match_renames({'old': signature}, {'new': signature, 'other': far})
+        self.assertEqual(renames, [('old', 'new')])
+        self.assertEqual(uncertain, [])
+
+    def test_match_renames_reports_ambiguous_pairs(self):
+        signature = mesh.group_signature(CUBE_POINTS, CUBE_VERTICES.ravel(), np.full(6, 4), np.arange(6))
+        renames, uncertain = mesh.match_renames({'old': signature}, {'a': signature, 'b': signature})
+        self.assertEqual(renames, [])
+        self.assertEqual(len(uncertain), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+import tests  # noqa: F401 (puts Dynamite modules on the path)
+import mesh
+import preview
+
+# A unit quad facing down (-Y) with the Houdini winding, whose UVs are its X and Z coordinates.
+POINTS = np.array([[0, 0, 0], [0, 0, 1], [1, 0, 1], [1, 0, 0]], dtype=np.float32)
+VERTICES = np.array([0, 1, 2, 3])
+UVS = POINTS[VERTICES][:, [0, 2]]
+
+
+class RasterizeTest(unittest.TestCase):
+    def test_quad_covers_every_texel(self):
+        triangles = np.array([[0, 1, 2], [0, 2, 3]])
+        texels, covering, weights = preview.rasterize(UVS, triangles, 8)
+        np.testing.assert_array_equal(texels, np.arange(64))
+        np.testing.assert_allclose(weights.sum(axis=1), 1.0)
+        self.assertTrue(set(covering.tolist()) <= {0, 1})
+
+    def test_half_covered_image(self):
+        texels, _, _ = preview.rasterize(np.array([[0, 0], [0, 0.5], [1, 0.5], [1, 0]]), np.array([[0, 1, 2],
+                                                                                                  [0, 2, 3]]), 4)
+        # Image rows start at the top, so the lower half of UV space is the second half of the texels.
+        np.testing.assert_array_equal(texels, np.arange(8, 16))
+
+
+class TangentTest(unittest.TestCase):
+    def test_tangents_follow_uv_directions(self):
+        tangents, bitangents = preview.triangle_tangents(POINTS[np.array([[0, 1, 2]])], UVS[np.array([[0, 1, 2]])])
+        np.testing.assert_allclose(tangents, [[1, 0, 0]])
+        np.testing.assert_allclose(bitangents, [[0, 0, 1]])
+
+    def test_degenerate_uvs(self):
+        tangents, bitangents = preview.triangle_tangents(POINTS[np.array([[0, 1, 2]])], np.zeros((1, 3, 2)))
+        np.testing.assert_array_equal(tangents, [[0, 0, 0]])
+        np.testing.assert_array_equal(bitangents, [[0, 0, 0]])
+
+
+class NormalMapTest(unittest.TestCase):
+    def setUp(self):
+        self.retopo = mesh.Bundle('plane', POINTS, VERTICES, [4], uvs=UVS)
+        self.samples = preview.sample_texels(self.retopo, POINTS - [0, 0.1, 0], 4)
+
+    def test_rays_go_from_the_cage_through_the_retopo(self):
+        np.testing.assert_allclose(self.samples.origins[:, 1], -0.1, atol=1e-6)
+        np.testing.assert_allclose(self.samples.directions, np.tile([0, 0.2, 0], (16, 1)), atol=1e-6)
+
+    def test_matching_normals_are_flat(self):
+        normal_map, mask = preview.encode_normal_map(self.samples, self.samples.normals)
+        self.assertTrue((normal_map.reshape(-1, 3) == preview.FLAT_NORMAL).all())
+        self.assertFalse(mask.any())
+
+    def test_missed_texels_are_masked(self):
+        hit_normals = self.samples.normals.copy()
+        hit_normals[:3] = 0.0
+        _, mask = preview.encode_normal_map(self.samples, hit_normals)
+        self.assertEqual(np.count_nonzero(mask), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import tests  # noqa: F401 (puts Dynamite modules on the path)
+import snapshot
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cages.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        offsets = np.random.RandomState(0).uniform(-0.3, 0.3, (50, 3))
+        states = [snapshot.CageState('body', 'abc', 0.25, (1, 2, 3), 2, offsets, 4, 0.75),
+                  snapshot.CageState('head', 'def')]
+        snapshot.write_snapshot(self.path, states)
+        body, head = snapshot.read_snapshot(self.path)
+        self.assertEqual((body.name, body.topology, body.iterations, body.relax_iterations), ('body', 'abc', 2, 4))
+        self.assertAlmostEqual(body.peak_dist, 0.25)
+        self.assertAlmostEqual(body.relax_strength, 0.75)
+        self.assertEqual(body.translate, (1.0, 2.0, 3.0))
+        np.testing.assert_allclose(body.offsets, offsets, atol=0.3 / snapshot.QUANTIZATION_STEPS)
+        self.assertIsNone(head.offsets)
+
+    def test_newer_versions_are_rejected(self):
+        with open(self.path, 'wb') as snapshot_file:
+            np.savez(snapshot_file, version=np.int32(snapshot.VERSION + 1))
+        with self.assertRaises(ValueError):
+            snapshot.read_snapshot(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+import tests  # noqa: F401 (puts Dynamite modules on the path)
+import cache
+import triangulate
+
+# An L-shaped hexagon in the XZ plane with the area of 3. Fan triangles from its first point overlap.
+L_SHAPE = np.array([[0, 0, 0], [0, 0, 1], [1, 0, 1], [1, 0, 2], [2, 0, 2], [2, 0, 0]], dtype=np.float32)
+
+
+def triangle_areas(points, vertices, triangles):
+    """Signed areas of triangles projected to the XZ plane."""
+    corners = points[vertices[triangles]][:, :, [0, 2]].astype(np.float64)
+    first, second = corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    return 0.5 * (first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0])
+
+
+class TriangulateTest(unittest.TestCase):
+    def setUp(self):
+        cache._shared_cache = cache.GeometryCache()
+
+    def tearDown(self):
+        cache._shared_cache = None
+
+    def test_fan(self):
+        triangles = triangulate.fan(np.array([3, 5, 4]))
+        np.testing.assert_array_equal(triangles, [[0, 1, 2], [3, 4, 5], [3, 5, 6], [3, 6, 7], [8, 9, 10],
+                                                  [8, 10, 11]])
+
+    def test_ear_clipping_respects_reflex_vertices(self):
+        vertices = np.arange(6)
+        self.assertAlmostEqual(np.abs(triangle_areas(L_SHAPE, vertices, triangulate.fan(np.array([6])))).sum(), 4.0)
+        for mode in (triangulate.EAR_CLIPPING, triangulate.DELAUNAY):
+            triangles = triangulate.triangulate(L_SHAPE, vertices, np.array([6]), mode)
+            areas = triangle_areas(L_SHAPE, vertices, triangles)
+            self.assertEqual(len(triangles), 4)
+            self.assertTrue((areas < 0).all())
+            self.assertAlmostEqual(areas.sum(), -3.0)
+
+    def test_delaunay_splits_quads_along_the_short_diagonal(self):
+        points = np.array([[0, 0, 0], [1, 0, 0.2], [4, 0, 0], [1, 0, -0.2]], dtype=np.float32)
+        triangles = triangulate.triangulate(points, np.arange(4), np.array([4]), triangulate.DELAUNAY)
+        self.assertTrue(all(1 in triangle and 3 in triangle for triangle in triangles.tolist()))
+
+    def test_degenerate_polygons_have_no_triangles(self):
+        points = np.zeros((5, 3), dtype=np.float32)
+        triangles = triangulate.triangulate(points, np.array([0, 1, 2, 3, 4]), np.array([2, 3]))
+        np.testing.assert_array_equal(triangles, [[2, 3, 4]])
+
+    def test_cached_triangles_survive_translation(self):
+        vertices, counts = np.arange(6), np.array([6])
+        first = triangulate.cached_triangles(L_SHAPE, vertices, counts)
+        second = triangulate.cached_triangles(L_SHAPE + 10, vertices, counts)
+        self.assertIs(first, second)
+        np.testing.assert_array_equal(first, triangulate.triangulate(L_SHAPE, vertices, counts))
+
+    def test_triangle_slots(self):
+        counts = np.array([3, 2, 5])
+        triangles = triangulate.triangulate(np.zeros((10, 3), dtype=np.float32), np.arange(10), counts,
+                                            triangulate.FAN)
+        slots = triangulate.triangle_slots(counts, triangles)
+        np.testing.assert_array_equal(slots, [[0, 1, 2], [-1, -1, -1], [-1, -1, -1], [-1, -1, -1], [-1, -1, -1],
+                                              [0, 1, 2], [0, 2, 3], [0, 3, 4], [-1, -1, -1], [-1, -1, -1]])
+        with self.assertRaises(ValueError):
+            triangulate.triangle_slots(counts, triangles[1:])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            triangulate.triangulate(L_SHAPE, np.arange(6), np.array([6]), 'strip')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+import numpy as np
+import tests  # noqa: F401 (puts Dynamite modules on the path)
+import mesh
+import writers
+
+# A quad and a triangle sharing an edge, facing down (-Y) with the Houdini winding.
+POINTS = np.array([[0, 0, 0], [0, 0, 1], [1, 0, 1], [1, 0, 0], [2, 0, 0]], dtype=np.float32)
+VERTICES = np.array([0, 1, 2, 3, 3, 2, 4])
+FACE_COUNTS = np.array([4, 3])
+UVS = POINTS[VERTICES][:, [0, 2]]
+
+
+def read_obj(text):
+    """Returns point positions and polygons of an OBJ file as lists of 1-based point numbers."""
+    points, polygons, groups = [], [], []
+    for line in text.splitlines():
+        fields = line.split()
+        if fields and fields[0] == 'v':
+            points.append([float(value) for value in fields[1:]])
+        elif fields and fields[0] == 'f':
+            polygons.append([int(corner.split('/')[0]) for corner in fields[1:]])
+        elif fields and fields[0] == 'g':
+            groups.append(fields[1])
+    return np.array(points), polygons, groups
+
+
+class ObjTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_format_obj_reverses_winding(self):
+        bundle = mesh.Bundle('plane', POINTS, VERTICES, FACE_COUNTS, uvs=UVS)
+        text = writers.format_obj(bundle)
+        points, polygons, groups = read_obj(text)
+        np.testing.assert_allclose(points, POINTS)
+        self.assertEqual(polygons, [[4, 3, 2, 1], [5, 3, 4]])
+        self.assertEqual(groups, ['plane'])
+        self.assertEqual(text.count('\nvt '), 7)
+        self.assertEqual(text.count('vn 0 -1 0\n'), 7)
+
+    def test_write_obj_offsets_bundles(self):
+        bundles = [mesh.Bundle(name, POINTS + index, VERTICES, FACE_COUNTS) for index, name in enumerate('ab')]
+        path = os.path.join(self.directory, 'bundles.obj.gz')
+        writers.write_obj(path, iter(bundles))
+        with gzip.open(path, 'rb') as obj_file:
+            points, polygons, groups = read_obj(obj_file.read())
+        self.assertEqual(groups, ['a', 'b'])
+        np.testing.assert_allclose(points, np.vstack((POINTS, POINTS + 1)))
+        self.assertEqual(polygons[2:], [[9, 8, 7, 6], [10, 8, 9]])
+        self.assertTrue(writers.is_obj_path(path))
+
+
+class FbxTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.bundle = mesh.Bundle('plane', POINTS, VERTICES, FACE_COUNTS, uvs=UVS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_binary_header_and_footer(self):
+        path = os.path.join(self.directory, 'plane.fbx')
+        writers.write_fbx(path, [self.bundle])
+        with open(path, 'rb') as fbx_file:
+            data = fbx_file.read()
+        self.assertTrue(data.startswith(b'Kaydara FBX Binary  \x00\x1a\x00'))
+        self.assertEqual(struct.unpack('<I', data[23:27])[0], writers.FBX_VERSION)
+        self.assertTrue(data.endswith(writers.FBX_FOOTER_MAGIC))
+        self.assertIn(b'plane\x00\x01Model', data)
+
+    def test_ascii_polygon_vertex_index(self):
+        path = os.path.join(self.directory, 'plane.fbx')
+        writers.write_fbx(path, [self.bundle], ascii=True)
+        with open(path, 'rb') as fbx_file:
+            text = fbx_file.read()
+        self.assertIn('Model::plane', text)
+        # Last vertices of polygons are stored bitwise negated.
+        self.assertIn('a:3,2,1,-1,4,2,-4', text.replace(' ', ''))
+
+
+class PngTest(unittest.TestCase):
+    def test_write_png(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'nested', 'image.png')
+            pixels = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+            writers.write_png(path, pixels)
+            with open(path, 'rb') as png_file:
+                data = png_file.read()
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(struct.unpack('>II', data[16:24]), (3, 2))
+        length = struct.unpack('>I', data[33:37])[0]
+        self.assertEqual(data[37:41], b'IDAT')
+        rows = np.frombuffer(zlib.decompress(data[41:41 + length]), dtype=np.uint8).reshape(2, 10)
+        np.testing.assert_array_equal(rows[:, 0], [0, 0])
+        np.testing.assert_array_equal(rows[:, 1:].reshape(2, 3, 3), pixels)
+
+
+if __name__ == '__main__':
+    unittest.main()